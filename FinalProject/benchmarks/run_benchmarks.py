@@ -0,0 +1,198 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from src.synthetic_data import write_eeg_data
+from src.data_cleaning import load_and_check_data, clean_and_save_data
+from src.data_analysis import check_normality, align_data, perform_t_tests, train_and_evaluate_decision_tree, cross_validate_decision_tree
+from src.data_visualisation import plot_histograms, plot_boxplot, plot_paired_lines
+
+# The dataset sizes to benchmark - the arguments of generate_eeg_data.
+# 'small' is the size of the real recordings, the larger ones have fewer rows per video to stay on disk.
+SIZES = {
+    'small': {'n_subjects': 10, 'n_videos': 10, 'rows_per_video': 128},
+    'medium': {'n_subjects': 1_000, 'n_videos': 10, 'rows_per_video': 128},
+    'large': {'n_subjects': 10_000, 'n_videos': 10, 'rows_per_video': 16},
+    'xlarge': {'n_subjects': 100_000, 'n_videos': 10, 'rows_per_video': 2},
+}
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), "history.jsonl")
+COLUMNS_TO_EXCLUDE = ['VideoID', 'SubjectID', 'predefinedlabel', 'user-definedlabeln']
+
+def measure(function, repeat=3):
+    """
+    Time a stage and measure its memory. The timing runs are separate from the memory run,
+    because tracing every allocation slows the code down. The output of the stage is hidden.
+
+    Args:
+        function (callable): The stage, without arguments.
+        repeat (int): Number of timing runs.
+
+    Returns:
+        result: What the last run of the stage returned.
+        measurement (dict): The fastest and median run time in seconds, and the peak memory allocated in MB.
+    """
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, {'seconds_min': min(times), 'seconds_median': statistics.median(times), 'peak_mb': peak / 2 ** 20}
+
+def _git_commit():
+    """
+    The commit the benchmarks run on, or None outside a git repository.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(size, repeat=3, n_experiments=10, work_dir=None):
+    """
+    Benchmark every stage of the pipeline on a synthetic dataset.
+
+    Args:
+        size (str or dict): A name from SIZES, or the arguments of generate_eeg_data.
+        repeat (int): Number of timing runs per stage.
+        n_experiments (int): Number of decision tree experiments.
+        work_dir (str): Folder for the data files and plots. None uses a temporary folder.
+
+    Returns:
+        records (list): One record per stage - its times, peak memory, the dataset size and the environment.
+    """
+    size_name, size_args = (size, SIZES[size]) if isinstance(size, str) else ('custom', size)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = work_dir or temp_dir
+        raw_path = os.path.join(work_dir, "EEG_data.csv")
+        clean_path = os.path.join(work_dir, "clean_eeg_data.csv")
+        plot_dir = os.path.join(work_dir, "plots")
+        n_raw_rows = write_eeg_data(raw_path, **size_args)
+
+        # Every stage runs on the output of the stage before it, like in main.py.
+        measurements = {}
+        raw, measurements['load_and_check_data'] = measure(lambda: load_and_check_data(raw_path), repeat)
+        clean, measurements['clean_and_save_data'] = measure(lambda: clean_and_save_data(raw, clean_path), repeat)
+        not_confusing = clean[clean['predefinedlabel'] == 0]
+        confusing = clean[clean['predefinedlabel'] == 1]
+        _, measurements['check_normality'] = measure(lambda: check_normality(not_confusing, confusing, COLUMNS_TO_EXCLUDE), repeat)
+        (not_confusing_sorted, confusing_sorted), measurements['align_data'] = measure(lambda: align_data(not_confusing, confusing), repeat)
+        # All the numeric columns, so the t-tests don't depend on which ones happen to be normal.
+        columns = [column for column in clean.columns if column not in COLUMNS_TO_EXCLUDE]
+        t_test_results, measurements['perform_t_tests'] = measure(lambda: perform_t_tests(not_confusing_sorted, confusing_sorted, columns), repeat)
+        _, measurements['train_and_evaluate_decision_tree'] = measure(lambda: train_and_evaluate_decision_tree(clean, 'predefinedlabel', COLUMNS_TO_EXCLUDE, n_experiments=n_experiments, random_state=0), repeat)
+        _, measurements['cross_validate_decision_tree'] = measure(lambda: cross_validate_decision_tree(clean, 'predefinedlabel', COLUMNS_TO_EXCLUDE, n_splits=5, n_repeats=2, random_state=0), repeat)
+        _, measurements['plot_histograms'] = measure(lambda: plot_histograms(clean, not_confusing, confusing, os.path.join(plot_dir, "histograms"), COLUMNS_TO_EXCLUDE), repeat)
+        t_stat, p_value = t_test_results['Theta']['t_stat'], t_test_results['Theta']['p_value']
+        _, measurements['plot_boxplot'] = measure(lambda: plot_boxplot(confusing_sorted, not_confusing_sorted, 'Theta', t_stat, p_value, os.path.join(plot_dir, "boxplots")), repeat)
+        _, measurements['plot_paired_lines'] = measure(lambda: plot_paired_lines(confusing_sorted, not_confusing_sorted, 'Theta', t_stat, p_value, os.path.join(plot_dir, "paired_lines")), repeat)
+
+    # What every record has in common - which run, which code, which data and which machine.
+    run = {
+        'run_id': datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ'),
+        'commit': _git_commit(),
+        'size': size_name,
+        'n_raw_rows': n_raw_rows,
+        'n_clean_rows': len(clean),
+        'repeat': repeat,
+        'n_experiments': n_experiments,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+    }
+    return [dict(run, stage=stage, **measurement) for stage, measurement in measurements.items()]
+
+def load_history(history_path=HISTORY_PATH):
+    """
+    Load the benchmark history - one record per line. Returns an empty list if there is none yet.
+    """
+    if not os.path.exists(history_path):
+        return []
+    with open(history_path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def append_history(records, history_path=HISTORY_PATH):
+    """
+    Add benchmark records to the end of the history.
+    """
+    with open(history_path, 'a') as file:
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+
+def compare_with_baseline(records, history, baseline=None, tolerance=1.25, min_difference=0.01):
+    """
+    Compare benchmark records with a baseline run of the same size.
+
+    Args:
+        records (list): The new records.
+        history (list): The earlier records.
+        baseline (str): The run_id or commit of the baseline run. None uses the last earlier run of the same size.
+        tolerance (float): A stage is a regression when it is slower than the baseline by more than this ratio.
+        min_difference (float): ...and by more than this many seconds, so timer noise in very fast stages is not a regression.
+
+    Returns:
+        comparison (pd.DataFrame): For every stage with a baseline - the baseline and new fastest time, their ratio,
+                                   and whether it is a regression.
+    """
+    rows = []
+    for record in records:
+        earlier = [old for old in history if old['size'] == record['size'] and old['stage'] == record['stage'] and old['run_id'] != record['run_id']]
+        if baseline is not None:
+            earlier = [old for old in earlier if baseline in (old['run_id'], old['commit'])]
+        if not earlier:
+            continue
+        reference = earlier[-1]
+        ratio = record['seconds_min'] / reference['seconds_min'] if reference['seconds_min'] > 0 else float('inf')
+        rows.append({'size': record['size'], 'stage': record['stage'], 'baseline_seconds': reference['seconds_min'],
+                     'seconds': record['seconds_min'], 'ratio': ratio, 'regression': ratio > tolerance and record['seconds_min'] - reference['seconds_min'] > min_difference})
+    return pd.DataFrame(rows, columns=['size', 'stage', 'baseline_seconds', 'seconds', 'ratio', 'regression'])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the EEG pipeline stages on synthetic data.")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small'], help="Dataset sizes to benchmark.")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of timing runs per stage.")
+    parser.add_argument('--n-experiments', type=int, default=10, help="Number of decision tree experiments.")
+    parser.add_argument('--history', default=HISTORY_PATH, help="Path of the benchmark history.")
+    parser.add_argument('--baseline', default=None, help="run_id or commit to compare with. The last earlier run by default.")
+    parser.add_argument('--tolerance', type=float, default=1.25, help="Slowdown ratio that counts as a regression.")
+    parser.add_argument('--fail-on-regression', action='store_true', help="Exit with an error if any stage regressed.")
+    args = parser.parse_args(argv)
+
+    history = load_history(args.history)
+    records = []
+    for size in args.sizes:
+        print(f"--- Benchmarking the {size} dataset ---")
+        size_records = run_benchmarks(size, repeat=args.repeat, n_experiments=args.n_experiments)
+        print(pd.DataFrame(size_records)[['stage', 'seconds_min', 'seconds_median', 'peak_mb']].to_string(index=False, float_format='{:.4f}'.format))
+        records += size_records
+    append_history(records, args.history)
+    print(f"--- Results added to {args.history} ---")
+
+    comparison = compare_with_baseline(records, history, args.baseline, args.tolerance)
+    if not comparison.empty:
+        print("Compared with the baseline:")
+        print(comparison.to_string(index=False, float_format='{:.4f}'.format))
+    if args.fail_on_regression and comparison['regression'].any():
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
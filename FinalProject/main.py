@@ -1,76 +1,152 @@
-from src.data_cleaning import load_and_check_data, clean_and_save_data
-from src.data_analysis import load_and_prepare_data, check_normality, align_data, perform_t_tests, train_and_evaluate_decision_tree
-from src.data_visualisation import plot_histograms, plot_boxplot, plot_paired_lines
+import argparse
+import logging
+import os
 
-def main():
-    file_path = "./EEG_data.csv"
-    output_file_path = "./Clean_EEG_Data.csv"
+# Only the standard library is imported here - every subcommand imports the parts of src it needs,
+# so a short job (or --help) never pays for scipy, sklearn or matplotlib unless it uses them.
+
+logger = logging.getLogger("main")
+
+LABEL_COLS = ['predefinedlabel', 'user-definedlabeln']
+
+def run_clean(args):
+    """
+    Load the raw data, check it for missing and duplicate values, and save the cleaned data.
+    """
+    from src.data_cleaning import load_and_check_data, clean_and_save_data
     # Loading the data and checking for missing and duplicate values.
-    eeg_data = load_and_check_data(file_path)
+    eeg_data = load_and_check_data(args.raw_data, cache_dir=args.cache_dir)
     # Cleaning the data, displaying its overview, counting events, and saving it.
-    clean_and_save_data(eeg_data, output_file_path)
-
-    clean_file_path = "./clean_eeg_data.csv"
-    
-    # Pre-defined labels.
-    print("\n--- Analyzing by Predefined Labels ---")
-    # Load and divide data by pre-defined labels.
-    print("\n Loading and Dividing Data ")
-    eeg_data, not_confusing_predefined, confusing_predefined = load_and_prepare_data(clean_file_path, label_col='predefinedlabel')
-    print("\n Visualizing Predefined Labels")
-    plot_histograms(eeg_data, not_confusing_predefined, confusing_predefined, plot_dir="./plots/predefined/histograms", columns_to_exclude=['VideoID', 'SubjectID', 'predefinedlabel', 'user-definedlabeln', 'level_0', 'index'])
-    # Checking normality for predefined labels - to see what colums we can analyse.
-    print("\n Checking normality for predefined labels")
-    predefined_normal_columns = check_normality(not_confusing_predefined, confusing_predefined, columns_to_exclude=['VideoID', 'SubjectID', 'predefinedlabel', 'user-definedlabeln', 'level_0', 'index'])
-    # Aligning data - both datasets to be the same shape
-    print("\n Aligning data in preperation for t-test")
-    not_confusing_predefined,confusing_predefined = align_data(not_confusing_predefined,confusing_predefined)
-    # Running paired t-tests for predefined labels. 
-    print("\n Performing paired t-tests for predefined labels")
-    predefined_t_test_results = perform_t_tests(not_confusing_predefined, confusing_predefined, predefined_normal_columns)
-    # Visualisation of the results. 
-    print("\n Visualizations for predefined labels")
-    for column in predefined_normal_columns:
-        t_stat = predefined_t_test_results[column]["t_stat"]
-        p_value = predefined_t_test_results[column]["p_value"]
-        # Box plot. 
-        plot_boxplot(confusing_predefined, not_confusing_predefined, column=column, t_stat=t_stat, p_value=p_value, plot_dir="./plots/predefined/boxplots")
-        # Paired line plot for each column.
-        plot_paired_lines(confusing_predefined, not_confusing_predefined, column=column, t_stat=t_stat, p_value=p_value, plot_dir="./plots/predefined/paired_lines")
-    # Train and evaluate decision tree model for predefined labels.
-    print("\n Training and evaluating decision tree for predefined labels")
-    train_and_evaluate_decision_tree(eeg_data, target_col='predefinedlabel',columns_to_exclude=['VideoID', 'SubjectID', 'index', 'user-definedlabeln', 'level_0'])
-
-    # User-defined labels.
-    print("\n--- Analyzing by User-Defined Labels ---")
-    # Load and divide data by user-defined labels.
-    print("\nLoading and Dividing Data ")
-    eeg_data, not_confusing_user, confusing_user = load_and_prepare_data(clean_file_path, label_col='user-definedlabeln')
-    print("\n Visualizing User-Defined Labels")
-    plot_histograms(eeg_data, not_confusing_user, confusing_user, plot_dir="./plots/user_defined/histograms", columns_to_exclude=['VideoID', 'SubjectID', 'predefinedlabel', 'user-definedlabeln', 'level_0', 'index'])
-    # Checking normality for user-defined labels - to see what colums we can analyze.
-    print("\n Checking normality for user-defined labels")
-    user_normal_columns = check_normality(not_confusing_user,confusing_user,columns_to_exclude=['VideoID', 'SubjectID', 'predefinedlabel', 'user-definedlabeln', 'level_0', 'index'])
-    # Aligning data - both datasets to be the same shape.
-    print("\n Aligning data in preperation for t-test")
-    not_confusing_user,confusing_user = align_data(not_confusing_user,confusing_user)
-    # Running paired t-tests for user-defined labels. 
-    print("\n Performing paired t-tests for user-defined labels")
-    user_t_test_results = perform_t_tests(not_confusing_user, confusing_user, user_normal_columns)
-    # Visualisation of the results. 
-    print("\n Visualizations for user defined labels")
-    for column in user_normal_columns:
-        t_stat = user_t_test_results[column]["t_stat"]
-        p_value = user_t_test_results[column]["p_value"]
-        # Box plot. 
-        plot_boxplot(confusing_user, not_confusing_user, column=column, t_stat=t_stat, p_value=p_value, plot_dir="./plots/user_defined/boxplots")
-        # Paired line plot for each column.
-        plot_paired_lines(confusing_user, not_confusing_user, column=column, t_stat=t_stat, p_value=p_value, plot_dir="./plots/user_defined/paired_lines")
-    # Train and evaluate decision tree model for user-defined labels.
-    print("\n Training and evaluating decision tree for user-defined labels")
-    train_and_evaluate_decision_tree(eeg_data, target_col='user-definedlabeln',columns_to_exclude=['VideoID', 'SubjectID', 'index', 'predefinedlabel', 'level_0'])
-
-    print("\n--- Analysis Complete ---")
+    clean_and_save_data(eeg_data, args.clean_output, cache_dir=args.cache_dir)
+
+def run_analysis(args, stages):
+    """
+    Run some parts of the analysis - the statistical tests, the decision tree or the plots - for every label.
+    """
+    from src.analysis_pipeline import run_label_analyses
+    # Analyzing by the pre-defined and the user-defined labels, loading the data once for both.
+    return run_label_analyses(args.data, label_cols=args.labels, plot_root=args.plot_root, cache_dir=args.cache_dir,
+                              n_workers=args.workers, plot_manifest=os.path.join(args.cache_dir, "plot_manifest.json"), stages=stages,
+                              model_dir=args.model_dir)
+
+def run_all(args):
+    """
+    The whole project - cleaning, then the statistical tests, the decision tree and the plots - as a graph of stages.
+    The output of every stage is kept in the artifact store, and the next run only computes what changed.
+    """
+    from src.analysis_pipeline import run_incremental_analysis
+    _, report = run_incremental_analysis(args.raw_data, args.clean_output, label_cols=args.labels, extra_exclude=args.exclude, plot_root=args.plot_root,
+                                         cache_dir=args.cache_dir, n_workers=args.workers, plot_manifest=os.path.join(args.cache_dir, "plot_manifest.json"),
+                                         artifact_dir=None if args.no_memo else os.path.join(args.cache_dir, "artifacts"),
+                                         max_artifact_bytes=int(args.max_artifact_mb * 2 ** 20), model_dir=args.model_dir)
+    logger.info("Computed: %s", ", ".join(report['computed']) or "nothing")
+
+def run_batch_command(args):
+    """
+    Clean and analyze every recording of a folder or glob, one per worker process, and merge them into a cohort table.
+    """
+    from src.batch import run_batch
+    report = run_batch(args.source, args.output_dir, label_cols=args.labels, stages=tuple(args.stages), n_workers=args.workers,
+                       resume=not args.no_resume, merge=not args.no_merge)
+    if report['failed']:
+        logger.warning("Failed recordings: %s", ", ".join(report['failed']))
+    for path, failed_stages in report['failed_stages'].items():
+        logger.warning("Cleaned %s, but could not run: %s", path, ", ".join(failed_stages))
+
+def run_score(args):
+    """
+    Predict the labels of new cleaned EEG tables with a saved decision tree - the model is loaded once for all of them.
+    """
+    from src.model_scoring import load_model, score_file
+    # Next to every table by default. --output is a folder when there are several tables (or it is one already).
+    if args.output is None:
+        output_paths = [os.path.splitext(file_path)[0] + "_predictions.csv" for file_path in args.tables]
+    elif len(args.tables) > 1 or os.path.isdir(args.output):
+        output_paths = [os.path.join(args.output, os.path.splitext(os.path.basename(file_path))[0] + "_predictions.csv") for file_path in args.tables]
+        if len(set(output_paths)) < len(output_paths):
+            raise ValueError(f"Several tables have the same name - their predictions can't all be saved in {args.output}.")
+        os.makedirs(args.output, exist_ok=True)
+    else:
+        output_paths = [args.output]
+    bundle = load_model(args.model)
+    for file_path, output_path in zip(args.tables, output_paths):
+        _, report = score_file(bundle, file_path, output_path=output_path, chunksize=args.chunksize)
+        logger.info("Predictions of %s (%d rows) saved to %s", file_path, report['rows'], output_path)
+
+def build_parser():
+    """
+    The command line of the project - one subcommand per stage, and 'all' (the default) for everything.
+    """
+    parser = argparse.ArgumentParser(description="EEG confusion analysis.")
+    # The raw and cleaned tables are parsed once, and kept here in a columnar format for the next runs.
+    parser.add_argument('--cache-dir', default="./.eeg_cache", help="Directory of the columnar cache, the plot manifest, the folds and the artifact store.")
+    subparsers = parser.add_subparsers(dest='command')
+
+    clean = argparse.ArgumentParser(add_help=False)
+    clean.add_argument('--raw-data', default="./EEG_data.csv", help="The raw EEG data.")
+    clean.add_argument('--clean-output', default="./Clean_EEG_Data.csv", help="Where to save the cleaned data.")
+
+    data = argparse.ArgumentParser(add_help=False)
+    data.add_argument('--data', default="./clean_eeg_data.csv", help="The cleaned EEG data.")
+
+    analysis = argparse.ArgumentParser(add_help=False)
+    analysis.add_argument('--labels', nargs='+', default=LABEL_COLS, help="Label columns to analyze by.")
+    analysis.add_argument('--plot-root', default="./plots", help="Folder of the plots.")
+    analysis.add_argument('--workers', type=int, default=1, help="Number of worker processes.")
+    analysis.add_argument('--model-dir', default="./models", help="Where the decision tree of every label is saved, for 'score'.")
+
+    subparsers.add_parser('clean', parents=[clean], help="Clean the raw data.").set_defaults(handler=run_clean)
+    # 'all' analyzes the data it cleans, and keeps the output of every stage for the next run.
+    memo = argparse.ArgumentParser(add_help=False)
+    memo.add_argument('--exclude', nargs='*', default=[], help="More columns to leave out of the analysis.")
+    memo.add_argument('--max-artifact-mb', type=float, default=2048, help="Size limit of the artifact store - the least recently used outputs are removed above it.")
+    memo.add_argument('--no-memo', action='store_true', help="Compute every stage, without the artifact store.")
+
+    subparsers.add_parser('stats', parents=[data, analysis], help="Normality checks and paired t-tests.").set_defaults(handler=lambda args: run_analysis(args, ('stats',)))
+    subparsers.add_parser('model', parents=[data, analysis], help="Subject-grouped evaluation of the decision tree.").set_defaults(handler=lambda args: run_analysis(args, ('model',)))
+    subparsers.add_parser('plots', parents=[data, analysis], help="Histograms and t-test plots.").set_defaults(handler=lambda args: run_analysis(args, ('plots',)))
+    batch = subparsers.add_parser('batch', help="Clean and analyze many recordings in parallel.")
+    batch.add_argument('source', help="A folder of raw EEG CSV files, or a glob pattern such as 'incoming/*.csv'.")
+    batch.add_argument('--output-dir', default="./batch_output", help="Where every recording gets its own folder, and the cohort table is saved.")
+    batch.add_argument('--labels', nargs='+', default=LABEL_COLS, help="Label columns to analyze by.")
+    batch.add_argument('--stages', nargs='*', default=['stats', 'model'], choices=['stats', 'model', 'plots'], help="The parts of the analysis to run for every recording.")
+    batch.add_argument('--workers', type=int, default=None, help="Number of worker processes. All CPUs by default.")
+    batch.add_argument('--no-resume', action='store_true', help="Process every recording again, even the finished ones.")
+    batch.add_argument('--no-merge', action='store_true', help="Don't merge the recordings into a cohort table.")
+    batch.set_defaults(handler=run_batch_command)
+    score = subparsers.add_parser('score', help="Predict the labels of new cleaned tables with a saved decision tree.")
+    score.add_argument('tables', nargs='+', help="Cleaned EEG tables (CSV) to score.")
+    score.add_argument('--model', default="./models/decision_tree_predefined.pkl", help="The saved decision tree - 'model' and 'all' save one per label.")
+    score.add_argument('--output', default=None, help="Where to save the predictions - a file for one table, a folder of <table>_predictions.csv files for several. Next to every table by default.")
+    score.add_argument('--chunksize', type=int, default=100_000, help="Number of rows scored at a time.")
+    score.set_defaults(handler=run_score)
+    subparsers.add_parser('all', parents=[clean, analysis, memo], help="Everything, rerunning only what changed (the default).").set_defaults(handler=run_all)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        # No subcommand runs everything, with the default paths.
+        args = parser.parse_args(['--cache-dir', args.cache_dir, 'all'])
+
+    from src.log_config import configure_logging, LazyTable
+    from src.instrumentation import enable_tracing, disable_tracing, save_trace, summarize_trace
+    # EEG_LOG_LEVEL=DEBUG shows the data tables and every plot, WARNING only the problems.
+    configure_logging(os.environ.get("EEG_LOG_LEVEL", "INFO"), log_file=os.environ.get("EEG_LOG_FILE"))
+    # Set EEG_TRACE_FILE to record the time and memory of every stage, as a trace file for a flamegraph viewer.
+    trace_path = os.environ.get("EEG_TRACE_FILE")
+    if trace_path:
+        enable_tracing(trace_memory=os.environ.get("EEG_TRACE_MEMORY") == "1")
+
+    args.handler(args)
+    logger.info("--- %s Complete ---", "Analysis" if args.command == 'all' else args.command.capitalize())
+
+    if trace_path:
+        disable_tracing()
+        n_events = save_trace(trace_path)
+        logger.info("Saved %d trace events to %s", n_events, trace_path)
+        logger.info("Time per stage (ms):\n%s", LazyTable(summarize_trace(), float_format='{:.1f}'.format))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,291 @@
+import logging
+import os
+from src import data_analysis, data_cleaning, data_visualisation, model_scoring, sketches
+from src.data_storage import load_table
+from src.instrumentation import instrumented, trace_stage
+from src.stage_graph import DEFAULT_MAX_BYTES, add_stage, run_stages
+from src.data_cleaning import load_and_check_data, clean_and_save_data
+from src.data_analysis import check_normality_by_label, align_label_positions, perform_t_tests_by_label, take_rows, train_and_evaluate_decision_tree, cross_validate_decision_tree
+from src.data_visualisation import sketch_histogram_jobs, boxplot_job, paired_lines_job, render_plots
+from src.sketches import summarize_table
+from src.model_scoring import train_final_model, save_model
+
+# Columns that identify the event (and its recording, in a merged cohort table), and index columns left over from earlier exports.
+ID_COLUMNS = ['VideoID', 'SubjectID', 'Session']
+INDEX_COLUMNS = ['level_0', 'index']
+
+# Plot folder of each label scheme. Other label columns use their own name.
+LABEL_PLOT_DIRS = {'predefinedlabel': 'predefined', 'user-definedlabeln': 'user_defined'}
+# The parts of the analysis - the statistical tests, the decision tree and the plots.
+ANALYSIS_STAGES = ('stats', 'model', 'plots')
+
+logger = logging.getLogger(__name__)
+
+def model_path(model_dir, label_col):
+    """
+    Path of the saved decision tree of a label column.
+    """
+    return os.path.join(model_dir, f"decision_tree_{LABEL_PLOT_DIRS.get(label_col, label_col)}.pkl")
+
+@instrumented
+def run_label_analyses(file_path, label_cols, plot_root="./plots", cache_dir=None, n_experiments=1000, n_workers=1, plot_manifest=None,
+                       evaluation='grouped', n_splits=5, n_repeats=10, stages=ANALYSIS_STAGES, model_dir=None):
+    """
+    Run the analysis for several label columns in one pass.
+    The data is loaded once, and whatever doesn't depend on the label - the numeric column list and the
+    columns to exclude - is computed once. The normality checks, alignment and paired t-tests of all the labels
+    are batched together, so another label adds columns to the same passes instead of a pass of its own.
+    Then each label gets its own plots and decision tree. The plots of all the labels are rendered
+    together at the end, as one batch.
+
+    Args:
+        file_path (str): Path to the clean dataset file.
+        label_cols (list): Label columns to analyze by, for example ['predefinedlabel', 'user-definedlabeln'].
+        plot_root (str): Directory under which each label gets its own plot folders.
+        cache_dir (str): Directory of the columnar cache. None parses the CSV file.
+        n_experiments (int): Number of decision tree experiments per label, for the 'random' evaluation.
+        n_workers (int): Number of worker processes for the decision tree experiments and the plots.
+        plot_manifest (str): Path of the plot manifest. Plots whose data didn't change are not rendered again.
+                             None renders every plot.
+        evaluation (str): How the decision tree is evaluated - 'grouped' for subject-grouped cross-validation
+                          (n_repeats times n_splits folds, with the folds cached in cache_dir),
+                          or 'random' for n_experiments random 75/25 splits.
+        n_splits (int): Number of folds, for the 'grouped' evaluation.
+        n_repeats (int): Number of repeats of the folds, for the 'grouped' evaluation.
+        stages (tuple): The parts of the analysis to run, from ANALYSIS_STAGES. The plots need the
+                        statistical tests, so 'plots' runs them too.
+        model_dir (str): With the 'model' stage - also train the decision tree of every label on all the data,
+                         and save it here for scoring new sessions (see model_path). None saves no models.
+
+    Returns:
+        results (dict): For every label column - its 'normal_columns' and 't_test_results' (stats and plots),
+                        and its 'model_results' (model).
+    """
+
+    # Loading the data once for all the labels.
+    data = load_table(file_path, cache_dir)
+    logger.info("Data loaded successfully. Number of rows: %d", len(data))
+
+    # The ids, every label column and the index columns are never analyzed - whatever the label is.
+    columns_to_exclude = ID_COLUMNS + list(label_cols) + INDEX_COLUMNS
+    numeric_cols = data.drop(columns=columns_to_exclude, errors='ignore').columns.to_list()
+
+    run_stats = 'stats' in stages or 'plots' in stages
+    results = {label_col: {} for label_col in label_cols}
+    plot_jobs = []
+    if 'plots' in stages:
+        # The histograms are drawn from sketches of every column, for the groups of every label - made in one pass over the data.
+        summary = summarize_table([data], label_cols, numeric_cols)
+    if run_stats:
+        # The statistics of all the labels at once - one batched pass of Shapiro-Wilk tests over the groups of every label,
+        # one alignment of every label's pairs, and one vectorized pass of paired t-tests.
+        logger.info("Checking normality")
+        normal_columns = check_normality_by_label(data, label_cols, numeric_cols)
+        logger.info("Aligning data in preperation for t-test")
+        pairs = align_label_positions(data, label_cols)
+        logger.info("Performing paired t-tests")
+        t_test_results = perform_t_tests_by_label(data, pairs, normal_columns)
+        for label_col in label_cols:
+            results[label_col].update(normal_columns=normal_columns[label_col], t_test_results=t_test_results[label_col])
+
+    for label_col in label_cols:
+        # Every label is one stage in the trace, with the calls it makes nested under it.
+        with trace_stage(f"analyze {label_col}", label_col=label_col):
+            logger.info("--- Analyzing by %s ---", label_col)
+            plot_dir = os.path.join(plot_root, LABEL_PLOT_DIRS.get(label_col, label_col))
+
+            if 'plots' in stages:
+                # Visualisation of the results.
+                plot_jobs += label_plot_jobs(data, summary, pairs[label_col], normal_columns[label_col], t_test_results[label_col], label_col, plot_dir)
+
+            if 'model' in stages:
+                # Train and evaluate decision tree model. The other label columns are excluded, the target is dropped by the function.
+                logger.info("Training and evaluating decision tree")
+                if evaluation == 'grouped':
+                    # A fixed seed, so the folds are the same - and cached - in every run.
+                    model_results = cross_validate_decision_tree(data, target_col=label_col, columns_to_exclude=columns_to_exclude, n_splits=n_splits, n_repeats=n_repeats, n_workers=n_workers, random_state=0, cache_dir=cache_dir)
+                else:
+                    model_results = train_and_evaluate_decision_tree(data, target_col=label_col, columns_to_exclude=columns_to_exclude, n_experiments=n_experiments, n_workers=n_workers)
+                results[label_col]['model_results'] = model_results
+                if model_dir is not None:
+                    # The final model, trained on all the data, with its evaluation.
+                    save_model(train_final_model(data, label_col, columns_to_exclude, evaluation=model_results), model_path(model_dir, label_col))
+
+    if 'plots' in stages:
+        # Rendering the histograms and the t-test plots of all the labels.
+        logger.info("Rendering the plots")
+        render_plots(plot_jobs, n_workers=n_workers, manifest_path=plot_manifest)
+
+    return results
+
+def _clean_stage(raw_file_path, clean_file_path):
+    """
+    Load, check and clean the raw data - the first stage of the graph.
+    """
+    return clean_and_save_data(load_and_check_data(raw_file_path), clean_file_path)
+
+def _normality_stage(data, label_cols, columns_to_exclude):
+    numeric_cols = data.drop(columns=columns_to_exclude, errors='ignore').columns.to_list()
+    return check_normality_by_label(data, label_cols, numeric_cols)
+
+def _t_test_stage(data, pairs, normal_columns):
+    return perform_t_tests_by_label(data, pairs, normal_columns)
+
+def _model_stage(data, label_col, columns_to_exclude, n_splits, n_repeats, n_workers=1, cache_dir=None):
+    # A fixed seed, so the folds - and the result - are the same in every run.
+    return cross_validate_decision_tree(data, target_col=label_col, columns_to_exclude=columns_to_exclude, n_splits=n_splits,
+                                        n_repeats=n_repeats, n_workers=n_workers, random_state=0, cache_dir=cache_dir)
+
+def _summary_stage(data, label_cols, columns_to_exclude):
+    """
+    Sketches of every analyzed column, for the groups of every label.
+    """
+    numeric_cols = data.drop(columns=columns_to_exclude, errors='ignore').columns.to_list()
+    return summarize_table([data], label_cols, numeric_cols)
+
+def _final_model_stage(data, evaluation, label_col, columns_to_exclude):
+    return train_final_model(data, label_col, columns_to_exclude, evaluation=evaluation)
+
+def label_plot_jobs(data, summary, label_pairs, normal_columns, t_test_results, label_col, plot_dir):
+    """
+    The histogram, boxplot and paired lines jobs of one label. Only the normal columns of its paired rows are taken from the data.
+
+    Args:
+        data (DataFrame): Full clean dataset.
+        summary (dict): Sketches of every column for the groups of every label, from summarize_table.
+        label_pairs (tuple): The paired row positions of the label, from align_label_positions.
+        normal_columns (list): The normal columns of the label - they get a boxplot and a paired lines plot.
+        t_test_results (dict): The t-tests of the label.
+        label_col (str): The label column.
+        plot_dir (str): The plot folder of the label.
+
+    Returns:
+        jobs (list): The render jobs.
+    """
+    jobs = sketch_histogram_jobs(summary, label_col, plot_dir=os.path.join(plot_dir, "histograms"))
+    not_confusing_sorted = take_rows(data, label_pairs[0], normal_columns)
+    confusing_sorted = take_rows(data, label_pairs[1], normal_columns)
+    for column in normal_columns:
+        t_stat = t_test_results[column]["t_stat"]
+        p_value = t_test_results[column]["p_value"]
+        jobs.append(boxplot_job(confusing_sorted, not_confusing_sorted, column=column, t_stat=t_stat, p_value=p_value, plot_dir=os.path.join(plot_dir, "boxplots")))
+        jobs.append(paired_lines_job(confusing_sorted, not_confusing_sorted, column=column, t_stat=t_stat, p_value=p_value, plot_dir=os.path.join(plot_dir, "paired_lines")))
+    return jobs
+
+def _plot_job_stage(data, summary, pairs, normal_columns, t_test_results, label_col, plot_dir):
+    return label_plot_jobs(data, summary, pairs[label_col], normal_columns[label_col], t_test_results[label_col], label_col, plot_dir)
+
+def _render_stage(*job_lists, n_workers=1, manifest_path=None):
+    return render_plots([job for jobs in job_lists for job in jobs], n_workers=n_workers, manifest_path=manifest_path)
+
+def build_analysis_graph(raw_file_path, clean_file_path, label_cols, extra_exclude=(), plot_root="./plots", cache_dir=None,
+                         n_workers=1, plot_manifest=None, n_splits=5, n_repeats=10):
+    """
+    Declare the whole project - cleaning, the statistical tests, the decision tree and the plots - as a graph of stages,
+    for run_stages. Every stage names the stages it needs, so a change only reruns what depends on it: the cleaning
+    depends on the raw file alone, so changing the columns to exclude never cleans the data again.
+
+    Stages:
+        'clean': the clean data.
+        'normality', 't_tests': the normal columns and t-tests of every label, by label.
+        'pairs': the paired rows of every label.
+        'model <label>': the decision tree evaluation of every label.
+        'final model <label>': the decision tree trained on all the data, bundled for scoring.
+        'summary': sketches of every column for the groups of every label, for the histograms.
+        'plots': renders the plots of all the labels. Its output is the plot files, which have their own manifest,
+                 so it runs every time and only renders the plots whose data changed.
+
+    Args:
+        raw_file_path (str): Path to the raw dataset file.
+        clean_file_path (str): Where to save the cleaned data.
+        label_cols (list): Label columns to analyze by.
+        extra_exclude (tuple): More columns to leave out of the analysis, besides the ids, labels and index columns.
+        plot_root (str): Directory under which each label gets its own plot folders.
+        cache_dir (str): Directory of the cached folds.
+        n_workers (int): Number of worker processes for the decision tree and the plots.
+        plot_manifest (str): Path of the plot manifest. None renders every plot.
+        n_splits (int): Number of folds of the decision tree evaluation.
+        n_repeats (int): Number of repeats of the folds.
+
+    Returns:
+        graph (dict): The stages, by name.
+    """
+    graph = {}
+    columns_to_exclude = ID_COLUMNS + list(label_cols) + INDEX_COLUMNS + [column for column in extra_exclude if column not in label_cols]
+    # The cleaned file is read by the other subcommands and by 'score' - it is cleaned again if it was deleted or changed.
+    add_stage(graph, 'clean', _clean_stage, params={'raw_file_path': raw_file_path, 'clean_file_path': clean_file_path},
+              file_params=('raw_file_path',), output_params=('clean_file_path',), code=(data_cleaning,))
+    # The sketches are small, and are saved - the histograms don't need the data.
+    add_stage(graph, 'summary', _summary_stage, inputs=('clean',), params={'label_cols': list(label_cols), 'columns_to_exclude': columns_to_exclude}, code=(sketches,))
+    # The statistics of all the labels are batched - one stage each. Aligning is quick, and its output is as big as the data - it is not saved.
+    add_stage(graph, 'normality', _normality_stage, inputs=('clean',), params={'label_cols': list(label_cols), 'columns_to_exclude': columns_to_exclude},
+              code=(data_analysis,))
+    add_stage(graph, 'pairs', align_label_positions, inputs=('clean',), params={'label_cols': list(label_cols)}, code=(data_analysis,), persist=False)
+    add_stage(graph, 't_tests', _t_test_stage, inputs=('clean', 'pairs', 'normality'), code=(data_analysis,))
+    plot_stages = []
+    for label_col in label_cols:
+        add_stage(graph, f'model {label_col}', _model_stage, inputs=('clean',),
+                  params={'label_col': label_col, 'columns_to_exclude': columns_to_exclude, 'n_splits': n_splits, 'n_repeats': n_repeats},
+                  options={'n_workers': n_workers, 'cache_dir': cache_dir}, code=(data_analysis,))
+        add_stage(graph, f'final model {label_col}', _final_model_stage, inputs=('clean', f'model {label_col}'),
+                  params={'label_col': label_col, 'columns_to_exclude': columns_to_exclude}, code=(model_scoring,))
+        add_stage(graph, f'plot jobs {label_col}', _plot_job_stage,
+                  inputs=('clean', 'summary', 'pairs', 'normality', 't_tests'),
+                  params={'label_col': label_col, 'plot_dir': os.path.join(plot_root, LABEL_PLOT_DIRS.get(label_col, label_col))},
+                  code=(label_plot_jobs, data_analysis, data_visualisation), persist=False)
+        plot_stages.append(f'plot jobs {label_col}')
+    add_stage(graph, 'plots', _render_stage, inputs=plot_stages, options={'n_workers': n_workers, 'manifest_path': plot_manifest},
+              code=(data_visualisation,), persist=False)
+    return graph
+
+@instrumented
+def run_incremental_analysis(raw_file_path, clean_file_path, label_cols, extra_exclude=(), plot_root="./plots", cache_dir=None,
+                             n_workers=1, plot_manifest=None, n_splits=5, n_repeats=10, stages=ANALYSIS_STAGES,
+                             artifact_dir=None, max_artifact_bytes=DEFAULT_MAX_BYTES, model_dir=None):
+    """
+    The whole project as a graph of stages, whose outputs are kept in an artifact store between runs.
+    Only the stages downstream of what changed since the last run - the raw file, the code of a stage, or a
+    parameter such as the columns to exclude - are computed again. The others are loaded from the store.
+
+    Args:
+        raw_file_path (str): Path to the raw dataset file.
+        clean_file_path (str): Where to save the cleaned data.
+        label_cols (list): Label columns to analyze by.
+        extra_exclude (tuple): More columns to leave out of the analysis.
+        plot_root (str): Directory under which each label gets its own plot folders.
+        cache_dir (str): Directory of the cached folds.
+        n_workers (int): Number of worker processes for the decision tree and the plots.
+        plot_manifest (str): Path of the plot manifest. None renders every plot.
+        n_splits (int): Number of folds of the decision tree evaluation.
+        n_repeats (int): Number of repeats of the folds.
+        stages (tuple): The parts of the analysis to run, from ANALYSIS_STAGES.
+        artifact_dir (str): Folder of the artifact store. None computes every stage.
+        max_artifact_bytes (int): The size limit of the artifact store - the least recently used artifacts are removed above it.
+        model_dir (str): With the 'model' stage - save the final decision tree of every label here, for scoring. None saves no models.
+
+    Returns:
+        results (dict): For every label column - its 'normal_columns' and 't_test_results' (stats),
+                        and its 'model_results' (model).
+        report (dict): The stages that were 'computed' and 'loaded' from the store, and the 'evicted' artifacts.
+    """
+    graph = build_analysis_graph(raw_file_path, clean_file_path, label_cols, extra_exclude=extra_exclude, plot_root=plot_root, cache_dir=cache_dir,
+                                 n_workers=n_workers, plot_manifest=plot_manifest, n_splits=n_splits, n_repeats=n_repeats)
+    targets = ['normality', 't_tests'] if 'stats' in stages else []
+    for label_col in label_cols:
+        if 'model' in stages:
+            targets.append(f'model {label_col}')
+            if model_dir is not None:
+                targets.append(f'final model {label_col}')
+    if 'plots' in stages:
+        targets.append('plots')
+    outputs, report = run_stages(graph, targets, store_dir=artifact_dir, max_bytes=max_artifact_bytes)
+
+    results = {label_col: {} for label_col in label_cols}
+    for label_col in label_cols:
+        if 'stats' in stages:
+            results[label_col].update(normal_columns=outputs['normality'][label_col], t_test_results=outputs['t_tests'][label_col])
+        if 'model' in stages:
+            results[label_col]['model_results'] = outputs[f'model {label_col}']
+            if model_dir is not None:
+                save_model(outputs[f'final model {label_col}'], model_path(model_dir, label_col))
+    return results, report
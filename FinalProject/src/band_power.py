@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from src.instrumentation import instrumented
+
+# The sampling rate of the raw signal of the NeuroSky MindSet headset the data was recorded with, in Hz.
+NEUROSKY_SAMPLING_RATE = 512
+# The frequency bands of the headset's power columns - (low, high) in Hz, both included.
+BAND_EDGES = {
+    'Delta': (0.5, 2.75),
+    'Theta': (3.5, 6.75),
+    'Alpha1': (7.5, 9.25),
+    'Alpha2': (10.0, 11.75),
+    'Beta1': (13.0, 16.75),
+    'Beta2': (18.0, 29.75),
+    'Gamma1': (31.0, 39.75),
+    'Gamma2': (41.0, 49.75),
+}
+
+def _band_masks(freqs, bands):
+    """
+    A (frequencies x bands) 0/1 matrix - which frequency bins are in which band.
+    """
+    masks = np.zeros((len(freqs), len(bands)), dtype=freqs.dtype)
+    for band, (low, high) in enumerate(bands.values()):
+        masks[(freqs >= low) & (freqs <= high), band] = 1
+    return masks
+
+def _segment_band_powers(signal, fs, nperseg, hop, bands, dtype, batch_segments):
+    """
+    The band powers of every Welch segment of the signal - the segments are a strided view of the signal,
+    spectra are computed for batch_segments segments of all the channels at once, and summed into bands right away,
+    so only (channels x segments x bands) values are kept.
+
+    Returns:
+        powers (np.ndarray): (channels x segments x bands) band powers.
+    """
+    # Zero-copy view of all the segments - (channels x segments x nperseg).
+    segments = sliding_window_view(signal, nperseg, axis=-1)[:, ::hop]
+    window = np.hanning(nperseg + 1)[:-1].astype(dtype)  # The periodic Hann window, like scipy.signal.welch.
+    freqs = np.fft.rfftfreq(nperseg, 1 / fs).astype(dtype)
+    # The one-sided power spectral density - every bin but DC (and Nyquist) holds the power of two frequencies.
+    scale = np.full(len(freqs), 2 / (fs * np.sum(window ** 2)), dtype=dtype)
+    scale[0] /= 2
+    if nperseg % 2 == 0:
+        scale[-1] /= 2
+    # Summing the PSD over a band (times the bin width) gives its power - one matrix product for all the bands.
+    weights = _band_masks(freqs, bands) * scale[:, None] * (fs / nperseg)
+
+    n_segments = segments.shape[1]
+    powers = np.empty((signal.shape[0], n_segments, len(bands)), dtype=dtype)
+    for first in range(0, n_segments, batch_segments):
+        batch = segments[:, first:first + batch_segments]
+        # Removing the mean of every segment, then windowing - the view is only copied here, one batch at a time.
+        batch = (batch - batch.mean(axis=-1, keepdims=True)) * window
+        spectra = np.fft.rfft(batch, axis=-1)
+        powers[:, first:first + batch_segments] = (spectra.real ** 2 + spectra.imag ** 2) @ weights
+    return powers
+
+@instrumented
+def band_powers(signal, fs=NEUROSKY_SAMPLING_RATE, window_seconds=1.0, step_seconds=1.0, bands=None, nperseg=None,
+                dtype=np.float32, batch_segments=4096):
+    """
+    Compute the power of every frequency band in sliding windows of a raw signal, with Welch's method -
+    every window is split into overlapping Hann-windowed segments, and their spectra are averaged.
+    All the windows and channels are computed together: the segment spectra are computed once over the whole
+    signal, and shared by the windows that overlap, so overlapping windows cost nothing extra.
+
+    Args:
+        signal (np.ndarray): The raw samples - one channel (samples,) or several (channels x samples).
+        fs (float): The sampling rate in Hz.
+        window_seconds (float): Length of every window.
+        step_seconds (float): Distance between the starts of two windows. The headset gives one row per second.
+        bands (dict): The (low, high) edges of every band in Hz. None uses BAND_EDGES.
+        nperseg (int): Length of the Welch segments in samples, with 50% overlap. The frequency resolution is
+                       fs / nperseg, and the bands are only 1.75 Hz wide - so None uses one-second segments
+                       (1 Hz bins), or the whole window if it is shorter.
+        dtype (np.dtype): Precision of the computation. float32 halves the memory and is enough for powers.
+        batch_segments (int): Number of segments of every channel whose spectra are held in memory at once.
+
+    Returns:
+        powers (np.ndarray): The band powers - (windows x bands) for one channel, (channels x windows x bands) for several.
+    """
+    bands = BAND_EDGES if bands is None else bands
+    signal = np.asarray(signal, dtype=dtype)
+    single_channel = signal.ndim == 1
+    signal = np.atleast_2d(signal)
+
+    window = int(round(window_seconds * fs))
+    step = int(round(step_seconds * fs))
+    nperseg = min(window, int(round(fs))) if nperseg is None else nperseg
+    hop = nperseg - nperseg // 2
+    if nperseg > window:
+        raise ValueError(f"Segments of {nperseg} samples don't fit in windows of {window} samples.")
+    if step % hop != 0:
+        raise ValueError(f"The window step ({step} samples) must be a multiple of the segment step ({hop} samples).")
+
+    n_windows = (signal.shape[-1] - window) // step + 1 if signal.shape[-1] >= window else 0
+    if n_windows == 0:
+        powers = np.empty((signal.shape[0], 0, len(bands)), dtype=dtype)
+        return powers[0] if single_channel else powers
+
+    # Only the samples of complete windows.
+    signal = signal[:, :(n_windows - 1) * step + window]
+    segment_powers = _segment_band_powers(signal, fs, nperseg, hop, bands, dtype, batch_segments)
+    # Every window averages the segments that fit in it - a moving average over the segments, with a cumulative sum.
+    per_window = (window - nperseg) // hop + 1
+    totals = np.concatenate([np.zeros_like(segment_powers[:, :1]), np.cumsum(segment_powers, axis=1, dtype=np.float64)], axis=1)
+    starts = np.arange(n_windows) * (step // hop)
+    powers = ((totals[:, starts + per_window] - totals[:, starts]) / per_window).astype(dtype)
+    return powers[0] if single_channel else powers
+
+@instrumented
+def band_power_table(signal, fs=NEUROSKY_SAMPLING_RATE, window_seconds=1.0, step_seconds=1.0, bands=None, **kwargs):
+    """
+    The band powers of one raw signal as a table, with the columns of the EEG data ('Delta', 'Theta', ... 'Gamma2') -
+    one row per window, like the rows the headset exports. The 'Raw' column of EEG_data.csv holds one sample per row,
+    so this needs the full-rate recording of the raw signal.
+
+    Args:
+        signal (np.ndarray): The raw samples of one channel.
+        fs (float): The sampling rate in Hz.
+        window_seconds (float): Length of every window.
+        step_seconds (float): Distance between the starts of two windows.
+        bands (dict): The (low, high) edges of every band in Hz. None uses BAND_EDGES.
+        **kwargs: The other arguments of band_powers.
+
+    Returns:
+        powers (pd.DataFrame): One row per window, one column per band, and the 'Time' of the start of the window in seconds.
+    """
+    bands = BAND_EDGES if bands is None else bands
+    powers = band_powers(signal, fs=fs, window_seconds=window_seconds, step_seconds=step_seconds, bands=bands, **kwargs)
+    table = pd.DataFrame(powers, columns=list(bands))
+    table.insert(0, 'Time', np.arange(len(table)) * step_seconds)
+    return table
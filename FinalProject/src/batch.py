@@ -0,0 +1,287 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from src.instrumentation import instrumented
+from src.data_cleaning import load_and_check_data, clean_and_save_data
+from src.analysis_pipeline import ANALYSIS_STAGES, ID_COLUMNS, INDEX_COLUMNS, LABEL_PLOT_DIRS, run_label_analyses
+from src.sketches import summarize_table, merge_summaries
+from src.data_visualisation import sketch_histogram_jobs, render_plots
+
+# The completion manifest of a batch, in its output folder.
+MANIFEST_NAME = "batch_manifest.json"
+# The files every recording gets in its own output folder.
+CLEAN_FILE_NAME = "clean_eeg_data.csv"
+RESULTS_FILE_NAME = "results.json"
+SUMMARY_FILE_NAME = "summary.pkl"
+
+logger = logging.getLogger(__name__)
+
+def find_recordings(source):
+    """
+    Find the raw EEG files of a batch.
+
+    Args:
+        source (str): A folder - all the CSV files in it - or a glob pattern such as "incoming/*/session_*.csv".
+
+    Returns:
+        paths (list): The files, sorted.
+    """
+    pattern = os.path.join(source, "*.csv") if os.path.isdir(source) else source
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+def _file_signature(file_path):
+    """
+    The size and modification time of a file - a changed file is processed again, even if it was finished before.
+    """
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def _output_name(file_path):
+    """
+    Name of the output folder of a recording - its file name, plus a short hash of its folder, so files with
+    the same name from different folders don't share an output folder.
+    """
+    folder_hash = hashlib.sha256(os.path.dirname(os.path.abspath(file_path)).encode()).hexdigest()[:8]
+    return f"{os.path.splitext(os.path.basename(file_path))[0]}-{folder_hash}"
+
+def load_batch_manifest(output_root):
+    """
+    Load the completion manifest of a batch - the signature, output folder and run time of every finished recording,
+    by its path. Returns an empty manifest if there is none yet.
+    """
+    manifest_path = os.path.join(output_root, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as file:
+        return json.load(file)
+
+def _save_batch_manifest(output_root, manifest):
+    """
+    Save the completion manifest atomically. It is saved after every finished recording, so a crashed batch
+    loses at most the recordings that were running.
+    """
+    manifest_path = os.path.join(output_root, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def _json_value(value):
+    """
+    Convert the numpy values of the results to plain Python, for JSON.
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Can't save {type(value).__name__} as JSON")
+
+@instrumented
+def process_recording(raw_file_path, output_dir, label_cols, stages=ANALYSIS_STAGES, n_splits=5, n_repeats=10):
+    """
+    Clean and analyze one recording, and save everything under its own output folder:
+    the cleaned table, the results of every label as JSON, the sketches of its columns for the cohort histograms, and the plots.
+    Runs in a worker process of run_batch, so the analysis itself runs in one process.
+    Only a failure to clean fails the recording - every part of the analysis runs on its own, and the ones that can't run
+    on this recording (too few subjects for the folds, a label with one class) are reported in 'failed_stages'.
+
+    Args:
+        raw_file_path (str): Path of the raw EEG file.
+        output_dir (str): The output folder of the recording.
+        label_cols (list): Label columns to analyze by.
+        stages (tuple): The parts of the analysis to run, from ANALYSIS_STAGES.
+        n_splits (int): Number of folds of the decision tree evaluation - at most the number of subjects of the recording.
+        n_repeats (int): Number of repeats of the folds.
+
+    Returns:
+        summary (dict): The number of raw rows and events, the run time in seconds, and the error of every part of the analysis that failed.
+    """
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    clean_file_path = os.path.join(output_dir, CLEAN_FILE_NAME)
+    eeg_data = load_and_check_data(raw_file_path)
+    clean_data = clean_and_save_data(eeg_data, clean_file_path)
+    # Sketches of every analyzed column for the groups of every label - merged with the other recordings for the cohort histograms.
+    numeric_cols = clean_data.drop(columns=ID_COLUMNS + list(label_cols) + INDEX_COLUMNS, errors='ignore').columns.to_list()
+    with open(os.path.join(output_dir, SUMMARY_FILE_NAME), 'wb') as file:
+        pickle.dump(summarize_table([clean_data], label_cols, numeric_cols), file)
+
+    results = {label_col: {} for label_col in label_cols} if stages else {}
+    failed_stages = {}
+    n_subjects = clean_data['SubjectID'].nunique()
+    for stage in (stage for stage in ANALYSIS_STAGES if stage in stages):
+        if stage == 'model' and n_subjects < 2:
+            # Subject-grouped folds need a subject to train on and another to test on.
+            failed_stages[stage] = f"Too few subjects for the decision tree evaluation ({n_subjects})."
+            logger.warning("Skipping the model of %s: %s", raw_file_path, failed_stages[stage])
+            continue
+        try:
+            stage_results = run_label_analyses(clean_file_path, label_cols, plot_root=os.path.join(output_dir, "plots"), n_workers=1,
+                                               n_splits=min(n_splits, n_subjects), n_repeats=n_repeats, stages=(stage,))
+        except Exception as error:
+            failed_stages[stage] = f"{type(error).__name__}: {error}"
+            logger.warning("The %s stage of %s failed: %s", stage, raw_file_path, failed_stages[stage])
+            continue
+        for label_col, label_results in stage_results.items():
+            # The fold indices are only needed to reproduce the folds - they are left out of the saved results.
+            label_results.get('model_results', {}).pop('splits', None)
+            results[label_col].update(label_results)
+    with open(os.path.join(output_dir, RESULTS_FILE_NAME), 'w') as file:
+        json.dump(results, file, indent=2, default=_json_value)
+    return {'raw_rows': len(eeg_data), 'events': len(clean_data), 'seconds': time.perf_counter() - start, 'failed_stages': failed_stages}
+
+def _merged_entries(output_root, manifest, recordings):
+    """
+    The manifest entries of the recordings to merge, by path - all the finished ones, or only those of recordings.
+    """
+    manifest = load_batch_manifest(output_root) if manifest is None else manifest
+    if recordings is None:
+        return {path: manifest[path] for path in sorted(manifest)}
+    paths = sorted(os.path.abspath(path) for path in recordings)
+    return {path: manifest[path] for path in paths if path in manifest}
+
+@instrumented
+def merge_clean_tables(output_root, cohort_file_path, manifest=None, recordings=None):
+    """
+    Combine the cleaned tables of the finished recordings of a batch into one cohort table, for the group statistics.
+    Every row gets the name of its recording's output folder in a 'Session' column - it doesn't change when other
+    recordings are added. SubjectID is kept as it is, so the events of one subject in several sessions are paired together.
+
+    Args:
+        output_root (str): The output folder of the batch.
+        cohort_file_path (str): Where to save the cohort table.
+        manifest (dict): The completion manifest. None loads it from output_root.
+        recordings (list): Paths of the raw files to merge - the ones of this batch. None merges every finished recording in the manifest.
+
+    Returns:
+        cohort (pd.DataFrame): The cohort table.
+    """
+    tables = []
+    for entry in _merged_entries(output_root, manifest, recordings).values():
+        table = pd.read_csv(os.path.join(output_root, entry['output_dir'], CLEAN_FILE_NAME))
+        table.insert(0, 'Session', entry['output_dir'])
+        tables.append(table)
+    if not tables:
+        raise ValueError(f"No finished recordings in {output_root} to merge.")
+    cohort = pd.concat(tables, ignore_index=True)
+    cohort.to_csv(cohort_file_path, index=False)
+    logger.info("Merged %d recordings into %s - %d events", len(tables), cohort_file_path, len(cohort))
+    return cohort
+
+def merge_recording_summaries(output_root, manifest=None, recordings=None):
+    """
+    Merge the sketches of the finished recordings of a batch into the sketches of the cohort - without reading their tables.
+
+    Args:
+        output_root (str): The output folder of the batch.
+        manifest (dict): The completion manifest. None loads it from output_root.
+        recordings (list): Paths of the raw files to merge - the ones of this batch. None merges every finished recording in the manifest.
+
+    Returns:
+        summary (dict): The merged sketches, like summarize_table.
+    """
+    summary = {}
+    for raw_file_path, entry in _merged_entries(output_root, manifest, recordings).items():
+        summary_path = os.path.join(output_root, entry['output_dir'], SUMMARY_FILE_NAME)
+        if not os.path.exists(summary_path):
+            # Recordings finished by an older version have no sketches - rerun them with resume=False to include them.
+            logger.warning("No sketches for %s - left out of the cohort histograms", raw_file_path)
+            continue
+        with open(summary_path, 'rb') as file:
+            summary = merge_summaries(summary, pickle.load(file))
+    return summary
+
+@instrumented
+def run_batch(source, output_root, label_cols, stages=ANALYSIS_STAGES, n_workers=None, resume=True, merge=True, n_splits=5, n_repeats=10):
+    """
+    Clean and analyze many recordings, one per worker process. Every recording gets its own output folder, and is
+    recorded in the completion manifest when it is finished - so a batch that crashed, or gets new files, only
+    processes the recordings that are not finished yet. A recording that fails is logged and tried again in the next run.
+
+    Args:
+        source (str): A folder of raw EEG CSV files, or a glob pattern.
+        output_root (str): The output folder of the batch.
+        label_cols (list): Label columns to analyze by.
+        stages (tuple): The parts of the analysis to run for every recording, from ANALYSIS_STAGES.
+        n_workers (int): Number of worker processes. 1 runs in this process, None uses all CPUs.
+        resume (bool): Skip the recordings that the manifest lists as finished, unless their file changed.
+        merge (bool): Merge the cleaned tables of the finished recordings of source into a cohort table, and run the statistical tests on it.
+                      With 'plots' in stages, the cohort histograms are drawn too, from the merged sketches of the recordings.
+                      Recordings of earlier batches into the same output_root, that aren't in source, are left out.
+        n_splits (int): Number of folds of the decision tree evaluation.
+        n_repeats (int): Number of repeats of the folds.
+
+    Returns:
+        report (dict): The recordings that were 'processed', 'skipped' and 'failed', the parts of the analysis that failed
+                       for every processed recording ('failed_stages' - the recording itself is finished and merged),
+                       the 'files_per_minute', and the 'cohort_results' of the merged table (if merge).
+    """
+    os.makedirs(output_root, exist_ok=True)
+    paths = find_recordings(source)
+    manifest = load_batch_manifest(output_root) if resume else {}
+    todo, skipped = [], []
+    for path in paths:
+        entry = manifest.get(os.path.abspath(path))
+        if entry is not None and {'size': entry['size'], 'mtime_ns': entry['mtime_ns']} == _file_signature(path):
+            skipped.append(path)
+        else:
+            todo.append(path)
+    logger.info("Batch of %d recordings: %d to process, %d already finished", len(paths), len(todo), len(skipped))
+
+    processed, failed = [], []
+    failed_stages = {}
+    start = time.perf_counter()
+
+    def finish(path, summary):
+        # Recording the recording as finished right away, so a crash later doesn't lose it.
+        manifest[os.path.abspath(path)] = dict(_file_signature(path), output_dir=_output_name(path), **summary)
+        _save_batch_manifest(output_root, manifest)
+        processed.append(path)
+        if summary['failed_stages']:
+            failed_stages[path] = summary['failed_stages']
+        minutes = (time.perf_counter() - start) / 60
+        logger.info("Finished %s (%d/%d) - %.1f files per minute", path, len(processed), len(todo), len(processed) / minutes if minutes > 0 else float('inf'))
+
+    arguments = {path: (path, os.path.join(output_root, _output_name(path)), label_cols, stages, n_splits, n_repeats) for path in todo}
+    if n_workers == 1 or len(todo) <= 1:
+        for path in todo:
+            try:
+                finish(path, process_recording(*arguments[path]))
+            except Exception:
+                logger.exception("Failed to process %s", path)
+                failed.append(path)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = {pool.submit(process_recording, *arguments[path]): path for path in todo}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    finish(path, future.result())
+                except Exception:
+                    logger.exception("Failed to process %s", path)
+                    failed.append(path)
+
+    minutes = (time.perf_counter() - start) / 60
+    files_per_minute = len(processed) / minutes if processed else 0.0
+    logger.info("Processed %d recordings (%.1f files per minute), skipped %d, failed %d", len(processed), files_per_minute, len(skipped), len(failed))
+    report = {'processed': processed, 'skipped': skipped, 'failed': failed, 'failed_stages': failed_stages, 'files_per_minute': files_per_minute}
+
+    # The cohort is the recordings of this batch that are finished - now or in an earlier run.
+    finished = [path for path in paths if os.path.abspath(path) in manifest and path not in failed]
+    if merge and finished:
+        # The group statistics of the whole cohort, on the merged cleaned tables.
+        cohort_file_path = os.path.join(output_root, "cohort_eeg_data.csv")
+        merge_clean_tables(output_root, cohort_file_path, manifest, recordings=finished)
+        report['cohort_results'] = run_label_analyses(cohort_file_path, label_cols, plot_root=os.path.join(output_root, "cohort_plots"), stages=('stats',))
+        if 'plots' in stages:
+            summary = merge_recording_summaries(output_root, manifest, recordings=finished)
+            jobs = [job for label_col in label_cols
+                    for job in sketch_histogram_jobs(summary, label_col, plot_dir=os.path.join(output_root, "cohort_plots", LABEL_PLOT_DIRS.get(label_col, label_col), "histograms"))]
+            render_plots(jobs, n_workers=n_workers)
+    return report
@@ -1,12 +1,22 @@
 # Imports.
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-from scipy.stats import shapiro , ttest_rel
-from sklearn.model_selection import train_test_split
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.metrics import precision_score, accuracy_score, recall_score
+from src.data_storage import load_table
+from src.instrumentation import instrumented
+from src.log_config import LazyTable
+
+logger = logging.getLogger(__name__)
+
+# scipy and sklearn take seconds to import, so they are imported inside the functions that use them -
+# loading or cleaning the data, and every worker process, never pay for them.
 
 # Load, preprocess, and divide data by column.
-def load_and_prepare_data(file_path, label_col):
+@instrumented
+def load_and_prepare_data(file_path, label_col, cache_dir=None):
     """
     Load the dataset, and divide into two groups: 
     'confusing' and 'not confusing' based on a the specified column:
@@ -15,14 +25,15 @@ def load_and_prepare_data(file_path, label_col):
     Args:
         file_path (str): Path to the dataset file.
         label_col (str): Column name to divide the data by ('predefinedlabel' or 'user-definedlabeln').
+        cache_dir (str): Directory of the columnar cache. None parses the CSV file every time.
 
     Returns:
         tuple: Full dataset, not_confusing dataset, confusing dataset
     """
 
     # Load clean data set.
-    data = pd.read_csv(file_path)
-    print("Data loaded successfully.")
+    data = load_table(file_path, cache_dir)
+    logger.info("Data loaded successfully. Number of rows: %d", len(data))
 
     # Dividing the events based on their lables -
     # Confusing or not. 
@@ -31,8 +42,93 @@ def load_and_prepare_data(file_path, label_col):
 
     return data, not_confusing, confusing
 
+def _shapiro_block(values):
+    """
+    Run the Shapiro-Wilk test on every column of a 2-D array.
+
+    Args:
+        values (np.ndarray): Samples x columns.
+
+    Returns:
+        tuple: W statistics and p-values, one per column.
+    """
+    from scipy.stats import shapiro
+    result = shapiro(values, axis=0)
+    return np.atleast_1d(result.statistic), np.atleast_1d(result.pvalue)
+
+def _shapiro_groups(groups, columns, n_workers=1):
+    """
+    Run the Shapiro-Wilk test on the columns of many groups in one pass. Groups with the same number of rows are
+    put side by side in one array, and with several workers the arrays are split into blocks of columns that are tested in parallel.
+
+    Args:
+        groups (dict): The rows of every group, by its key - DataFrames or (rows x columns) arrays.
+        columns (list): Columns to test, in every group.
+        n_workers (int): Number of worker processes. 1 runs in this process.
+
+    Returns:
+        tuple: W statistics and p-values, a (columns,) array for every group key.
+    """
+    arrays = {key: group[columns].to_numpy(dtype=np.float64) if hasattr(group, 'columns') else np.asarray(group, dtype=np.float64)
+              for key, group in groups.items()}
+    by_size = {}
+    for key, values in arrays.items():
+        by_size.setdefault(len(values), []).append(key)
+    # Blocks of columns - one per worker for each size of group.
+    n_blocks = max(1, min(n_workers, len(columns)))
+    jobs = []
+    for keys in by_size.values():
+        values = np.hstack([arrays[key] for key in keys])
+        jobs += [(tuple(keys), values[:, block]) for block in np.array_split(np.arange(values.shape[1]), n_blocks) if len(block)]
+
+    if n_workers == 1:
+        outputs = [_shapiro_block(values) for _, values in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            outputs = list(pool.map(_shapiro_block, [values for _, values in jobs]))
+
+    # Joining the blocks of every size of group, and cutting them back into its groups - len(columns) values each.
+    joined = {}
+    for (keys, _), (statistic, p_value) in zip(jobs, outputs):
+        parts = joined.setdefault(keys, ([], []))
+        parts[0].append(statistic)
+        parts[1].append(p_value)
+    statistics = {key: np.empty(0) for key in groups}
+    p_values = {key: np.empty(0) for key in groups}
+    for keys, (statistic_parts, p_value_parts) in joined.items():
+        all_statistics, all_p_values = np.concatenate(statistic_parts), np.concatenate(p_value_parts)
+        for number, key in enumerate(keys):
+            statistics[key] = all_statistics[number * len(columns):(number + 1) * len(columns)]
+            p_values[key] = all_p_values[number * len(columns):(number + 1) * len(columns)]
+    return statistics, p_values
+
+@instrumented
+def batched_normality(not_confusing, confusing, columns, alpha=0.05, n_workers=1):
+    """
+    Run the Shapiro-Wilk test on all the columns of both groups in one batched pass.
+    Each group is taken as one 2-D array (events x columns), and with several workers
+    the columns are split into blocks that are tested in parallel.
+
+    Args:
+        not_confusing (DataFrame): dataset where label=0.
+        confusing (DataFrame): dataset where label=1.
+        columns (list): Columns to test.
+        alpha (float): Significance level - a column is normal when its p-value is above it.
+        n_workers (int): Number of worker processes. 1 runs in this process.
+
+    Returns:
+        results (DataFrame): One row per column and group, with 'column', 'group', 'statistic', 'p_value' and 'normal'.
+    """
+    groups = {'not_confusing': not_confusing, 'confusing': confusing}
+    statistics, p_values = _shapiro_groups(groups, list(columns), n_workers=n_workers)
+    tables = [pd.DataFrame({'column': list(columns), 'group': name, 'statistic': statistics[name], 'p_value': p_values[name]}) for name in groups]
+    results = pd.concat(tables, ignore_index=True) if len(columns) else pd.DataFrame(columns=['column', 'group', 'statistic', 'p_value'])
+    results['normal'] = results['p_value'] > alpha
+    return results
+
 # Now, to know what we can do with our data - we need to check normality.
-def check_normality(not_confusing, confusing, columns_to_exclude):
+@instrumented
+def check_normality(not_confusing, confusing, columns_to_exclude, n_workers=1):
     """
     Check for normality in both datasets and return columns with normal distributions in both.
 
@@ -40,52 +136,125 @@ def check_normality(not_confusing, confusing, columns_to_exclude):
         not_confusing (DataFrame): dataset where label=0.
         confusing (DataFrame): dataset where label=1.
         columns_to_exclude (list): List of columns to exclude from normality check.
+        n_workers (int): Number of worker processes for the Shapiro-Wilk tests.
 
     Returns:
         normal_cols (list): Columns that are normally distributed in both datasets.
     """
 
-    # Creating empty lists for the normal and not normal columns we find. 
-    normal_confusing_columns = []
-    normal_not_confusing_columns = []
     # Dropping all non - numeric columns, and converting the relevent ones to a list. 
     # Axis = 1 is to specify that the right columns should be dropped.
     numeric_cols = not_confusing.drop(columns=columns_to_exclude, axis=1, errors='ignore').columns.to_list()
 
-    for col in numeric_cols:
-        # Making sure there is enough data.
-        if len(not_confusing[col]) < 3 or len(confusing[col]) < 3:
-            print(f"Skipping column {col} due to insufficient data for normality test.")
-            continue
-        # Perform Shapiro-Wilk test on each column to determine normality for not confusing dataset.
-        stat, p = shapiro(not_confusing[col])
-        # If data is normaly distributed: 
-        if p > 0.05:
-            # Adding the normal columns from the not confusing videos to the list.
-            normal_not_confusing_columns.append(col)
-
-        # Perform Shapiro-Wilk test on each column to determine normality for confusing dataset.
-        stat, p = shapiro(confusing[col])
-        # If data is normaly distributed: 
-        if p > 0.05:
-            # Adding the normal columns from the confusing videos to the list.
-            normal_confusing_columns.append(col)
+    # Making sure there is enough data.
+    if len(not_confusing) < 3 or len(confusing) < 3:
+        logger.warning("Skipping the normality test due to insufficient data.")
+        return []
+
+    # Perform Shapiro-Wilk test on all the columns of both datasets at once.
+    results = batched_normality(not_confusing, confusing, numeric_cols, n_workers=n_workers)
 
     # To know what data we can analyze - we need to know what data from each of the datasets is normal.
-    # We convert both lists to sets and then find the common columns between the two.
-    normal_cols = list(set(normal_not_confusing_columns).intersection(normal_confusing_columns))
-    print(f"Normal columns in both datasets: {normal_cols}")
+    # A column is kept if it is normal in both groups.
+    normal_in_both = results.groupby('column', sort=False)['normal'].all()
+    normal_cols = [col for col in numeric_cols if normal_in_both[col]]
+    logger.info("Normal columns in both datasets: %s", normal_cols)
     return normal_cols
 
+def _sequence_numbers(codes, order):
+    """
+    Number the rows of every subject 0, 1, 2... in their original order.
+
+    Args:
+        codes (np.ndarray): Subject code of every row.
+        order (np.ndarray): Stable sort order of the codes - of all the rows, or only of the rows to number.
+
+    Returns:
+        seq (np.ndarray): The sequence number of every row within its subject. Rows left out of order are not numbered.
+    """
+    sorted_codes = codes[order]
+    positions = np.arange(len(order))
+    # The position where each subject's run starts in the sorted order.
+    starts = np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]
+    run_start = np.maximum.accumulate(np.where(starts, positions, 0))
+    seq = np.empty(len(codes), dtype=np.int64)
+    seq[order] = positions - run_start
+    return seq
+
+def _pair_positions(first_codes, second_codes, n_keys):
+    """
+    Pair the rows of two groups by their key codes - the n-th row of a key in one group pairs with its n-th row
+    in the other group, so a key keeps as many pairs as its smaller group has rows. Rows with the code -1
+    (no key, like a missing SubjectID) are never paired.
+
+    Returns:
+        tuple: Row positions in both groups, ordered by key and then by sequence number, so the i-th positions form the i-th pair.
+    """
+    # How many rows each key has in each group - and so how many pairs it keeps.
+    n_pairs = np.minimum(np.bincount(first_codes[first_codes >= 0], minlength=n_keys), np.bincount(second_codes[second_codes >= 0], minlength=n_keys))
+
+    positions = []
+    for group_codes in (first_codes, second_codes):
+        # A stable sort keeps the rows of each key in their original order. The rows without a key are left out.
+        rows = np.flatnonzero(group_codes >= 0)
+        order = rows[np.argsort(group_codes[rows], kind='stable')]
+        seq = _sequence_numbers(group_codes, order)
+        # Keeping the rows whose (key, sequence number) exists in both groups.
+        keep = seq[order] < n_pairs[group_codes[order]]
+        positions.append(order[keep])
+    return positions[0], positions[1]
+
+@instrumented
+def align_positions(not_confusing, confusing, subject_col='SubjectID'):
+    """
+    Find the rows that pair up between the two groups, without merging or sorting the DataFrames.
+    Every row gets a (subject, sequence number) key. The n-th row of a subject in one group pairs with
+    its n-th row in the other group, so a subject keeps as many pairs as its smaller group has rows.
+    Rows without a subject are never paired.
+
+    Args:
+        not_confusing (DataFrame): dataset where label=0.
+        confusing (DataFrame): dataset where label=1.
+        subject_col (str): Column to pair the rows by.
+
+    Returns:
+        tuple: Row positions in not_confusing and in confusing, both ordered by subject
+               and then by sequence number, so the i-th positions form the i-th pair.
+    """
+    not_confusing_subjects = not_confusing[subject_col].to_numpy()
+    confusing_subjects = confusing[subject_col].to_numpy()
+
+    # One hash-based integer code per subject, shared by both groups. sort=True makes the codes follow the subject order.
+    # A missing subject gets the code -1, and its rows are dropped.
+    codes, subjects = pd.factorize(np.concatenate([not_confusing_subjects, confusing_subjects]), sort=True)
+    not_confusing_codes, confusing_codes = codes[:len(not_confusing_subjects)], codes[len(not_confusing_subjects):]
+
+    return _pair_positions(not_confusing_codes, confusing_codes, len(subjects))
+
+def take_rows(data, positions, columns=None):
+    """
+    The rows of a DataFrame at some positions, with a new index - every column is gathered once, only the given
+    columns are taken, and nothing is copied if the positions are all the rows in order.
+    """
+    columns = data.columns if columns is None else columns
+    in_order = len(positions) == len(data) and np.array_equal(positions, np.arange(len(data)))
+    taken = {column: data[column].to_numpy() if in_order else data[column].to_numpy()[positions] for column in columns}
+    return pd.DataFrame(taken, columns=columns, copy=False)
+
 # Align data.
-def align_data(not_confusing, confusing):
+@instrumented
+def align_data(not_confusing, confusing, columns=None):
     """
     Align the data to make sure its prepared for the paired t-test.
     Making sure both data sets - confused and not confused are the same shape. 
+    Gathering the paired rows copies them - a strided view can't pick arbitrary rows - so only the columns
+    that are needed are taken, and a group that is already in pair order is returned without copying.
+    To avoid the copy altogether, use the positions of align_positions (or align_label_positions) directly.
 
     Args:
         not_confusing (DataFrame): dataset where label=0.
         confusing (DataFrame): dataset where label=1.
+        columns (list): The columns to take. None takes all of them.
     
     Returns:
         not_confusing_sorted (DataFrame): dataset where label=0, sorted to be the same shape as the confused dataset.
@@ -93,38 +262,49 @@ def align_data(not_confusing, confusing):
     """
 
     # We need to make sure the data is arranged right for the test. 
-    # If they dont have the same shape - we need to align them.
-    #pd.options.mode.chained_assignment = None  # Turn off the SettingWithCopyWarning
-    if not_confusing.shape != confusing.shape:
-        print("Shapes are not aligned. Adjusting the datasets")
-        # By the results we see the shapes are not the same - 
-        # There is a different number of videos classified as confusing vs. not confusing. 
-        # We will drop the rows we dont need.
-        # How will we decide? 
-        # We want each Student to have the same number of videos they found confusing and not confusing. 
-        # We can check how many each of them have in every dataset and by that drop the rows.
-        # Copying the datasets to work on.
-        not_confusing = not_confusing.copy()
-        confusing = confusing.copy() 
-        # Adding within-group sequence numbers to both data sets.
-        not_confusing['_seq'] = not_confusing.groupby('SubjectID').cumcount()
-        confusing['_seq'] = confusing.groupby('SubjectID').cumcount()
-        # Makes a merge of SubjectID and sequence numbers to find common pairs.
-        common_pairs = pd.merge(not_confusing[['SubjectID', '_seq']],confusing[['SubjectID', '_seq']],on=['SubjectID', '_seq'],how='inner')
-        # Kepping only the rows that were in common_pairs, and dropping the 'seq' column.
-        not_confusing = not_confusing.merge(common_pairs, on=['SubjectID', '_seq']).drop('_seq', axis=1)
-        confusing = confusing.merge(common_pairs, on=['SubjectID', '_seq']).drop('_seq', axis=1)
-        if len(not_confusing) == 0 or len(confusing) == 0:
-            raise ValueError("Aligned datasets have no samples left after adjustment.")
+    # We want each Student to have the same number of videos they found confusing and not confusing,
+    # so the n-th video of a student in one group is paired with their n-th video in the other group.
+    not_confusing_positions, confusing_positions = align_positions(not_confusing, confusing)
+    if len(not_confusing_positions) == 0:
+        raise ValueError("Aligned datasets have no samples left after adjustment.")
+    if len(not_confusing_positions) != len(not_confusing) or len(confusing_positions) != len(confusing):
         # Verify alignment
-        print(f"Aligned shapes: Confusing - {confusing.shape}, Not Confusing - {not_confusing.shape}")
-    
-    # Sorting the videos by SubjectID, reseting the index and droping the old one.
-    not_confusing_sorted = not_confusing.sort_values(by='SubjectID').reset_index(drop=True)
-    confusing_sorted = confusing.sort_values(by='SubjectID').reset_index(drop=True)
+        logger.info("Aligned shapes: Confusing - %s, Not Confusing - %s", (len(confusing_positions), confusing.shape[1]), (len(not_confusing_positions), not_confusing.shape[1]))
+
+    # Taking the paired rows, sorted by SubjectID, with a new index.
+    not_confusing_sorted = take_rows(not_confusing, not_confusing_positions, columns)
+    confusing_sorted = take_rows(confusing, confusing_positions, columns)
     return (not_confusing_sorted,confusing_sorted)
 
+@instrumented
+def paired_t_tests(not_confusing, confusing, columns, alpha=0.05):
+    """
+    Perform paired t-tests on all the columns in one vectorized call.
+    Both groups are taken as 2-D arrays (events x columns), paired by row.
+
+    Args:
+        not_confusing (DataFrame): dataset where label=0, aligned with confusing.
+        confusing (DataFrame): dataset where label=1, aligned with not_confusing.
+        columns (list): Columns to perform t-tests on.
+        alpha (float): Significance level.
+
+    Returns:
+        results (DataFrame): One row per column, with 'column', 't_stat', 'p_value' and 'significant'.
+    """
+    confusing_values = confusing[columns].to_numpy(dtype=np.float64)
+    not_confusing_values = not_confusing[columns].to_numpy(dtype=np.float64)
+    if len(columns) == 0:
+        t_stats, p_values = np.empty(0), np.empty(0)
+    else:
+        # Comparing the mean of the two groups under different conditions, for every column at once.
+        from scipy.stats import ttest_rel
+        t_stats, p_values = ttest_rel(confusing_values, not_confusing_values, axis=0)
+    results = pd.DataFrame({'column': list(columns), 't_stat': np.atleast_1d(t_stats), 'p_value': np.atleast_1d(p_values)})
+    results['significant'] = results['p_value'] < alpha
+    return results
+
 # Perform paired t-tests
+@instrumented
 def perform_t_tests(not_confusing, confusing, normal_cols):
     """
     Perform paired t-tests on the specified columns.
@@ -139,70 +319,451 @@ def perform_t_tests(not_confusing, confusing, normal_cols):
         t_test_results (dict): A dictionary containing t-statistics and p-values for each column.
     """
 
-    
-    # Dictionary to store t-test results
+    # Perform the paired t-test on all the columns.
+    # Setting the significance level.
+    results = paired_t_tests(not_confusing, confusing, normal_cols, alpha=0.05)
+    # Display results - one table for all the columns, formatted only if it is shown.
+    if len(results):
+        logger.info("Paired t-test results (significant: p < 0.05):\n%s", LazyTable(results, index=False, formatters={'t_stat': '{:.4f}'.format, 'p_value': '{:.4f}'.format}))
+
+    # Store results in the dictionary.
+    t_test_results = {row.column: {"t_stat": row.t_stat, "p_value": row.p_value} for row in results.itertuples(index=False)}
+    return t_test_results
+
+@instrumented
+def check_normality_by_label(data, label_cols, columns, alpha=0.05, n_workers=1):
+    """
+    check_normality for several label columns in one batched pass - the Shapiro-Wilk tests of both groups of
+    every label are run together (groups of the same size as one array), instead of one label after the other.
+
+    Args:
+        data (DataFrame): Full clean dataset.
+        label_cols (list): Label columns to divide the data by.
+        columns (list): Columns to test.
+        alpha (float): Significance level - a column is normal when its p-value is above it.
+        n_workers (int): Number of worker processes for the Shapiro-Wilk tests.
+
+    Returns:
+        normal_columns (dict): For every label column - the columns that are normally distributed in both of its groups.
+    """
+    values = data[columns].to_numpy(dtype=np.float64)
+    groups = {}
+    for label_col in label_cols:
+        labels = data[label_col].to_numpy()
+        not_confusing, confusing = values[labels == 0], values[labels == 1]
+        # Making sure there is enough data.
+        if len(not_confusing) < 3 or len(confusing) < 3:
+            logger.warning("Skipping the normality test of %s due to insufficient data.", label_col)
+            continue
+        groups[(label_col, 'not_confusing')], groups[(label_col, 'confusing')] = not_confusing, confusing
+
+    statistics, p_values = _shapiro_groups(groups, list(columns), n_workers=n_workers)
+    normal_columns = {}
+    for label_col in label_cols:
+        if (label_col, 'confusing') not in groups:
+            normal_columns[label_col] = []
+            continue
+        # A column is kept if it is normal in both groups.
+        normal_in_both = (p_values[(label_col, 'not_confusing')] > alpha) & (p_values[(label_col, 'confusing')] > alpha)
+        normal_columns[label_col] = [column for column, normal in zip(columns, normal_in_both) if normal]
+        logger.info("Normal columns in both datasets of %s: %s", label_col, normal_columns[label_col])
+    return normal_columns
+
+@instrumented
+def align_label_positions(data, label_cols, subject_col='SubjectID'):
+    """
+    align_positions for several label columns in one pass. Every row of every label's group gets a
+    (label, subject) key, and all the labels are paired by one sort of the keys.
+
+    Args:
+        data (DataFrame): Full clean dataset.
+        label_cols (list): Label columns to divide the data by.
+        subject_col (str): Column to pair the rows by.
+
+    Returns:
+        pairs (dict): For every label column - the row positions in data of its not confusing and its confusing events,
+                      ordered by subject, so the i-th positions form the i-th pair.
+    """
+    subject_codes, subjects = pd.factorize(data[subject_col].to_numpy(), sort=True)
+    n_subjects = max(len(subjects), 1)
+    group_rows, group_codes = ([], []), ([], [])
+    for number, label_col in enumerate(label_cols):
+        labels = data[label_col].to_numpy()
+        for value in (0, 1):
+            rows = np.flatnonzero(labels == value)
+            group_rows[value].append(rows)
+            # Rows without a subject keep the code -1, and are never paired.
+            group_codes[value].append(np.where(subject_codes[rows] >= 0, number * n_subjects + subject_codes[rows], -1))
+    not_confusing_rows, confusing_rows = np.concatenate(group_rows[0]), np.concatenate(group_rows[1])
+    not_confusing_codes, confusing_codes = np.concatenate(group_codes[0]), np.concatenate(group_codes[1])
+    not_confusing_positions, confusing_positions = _pair_positions(not_confusing_codes, confusing_codes, len(label_cols) * n_subjects)
+
+    # The pairs are ordered by key, so by label first - cutting them into the pairs of every label.
+    n_pairs = np.bincount(not_confusing_codes[not_confusing_positions] // n_subjects, minlength=len(label_cols))
+    bounds = np.cumsum(n_pairs)[:-1]
+    pairs = {}
+    for label_col, first, second in zip(label_cols, np.split(not_confusing_rows[not_confusing_positions], bounds),
+                                        np.split(confusing_rows[confusing_positions], bounds)):
+        if len(first) == 0:
+            raise ValueError(f"Aligned datasets of {label_col} have no samples left after adjustment.")
+        pairs[label_col] = (first, second)
+    return pairs
+
+@instrumented
+def paired_t_tests_by_label(data, pairs, columns, alpha=0.05):
+    """
+    paired_t_tests for several label columns in one vectorized pass - the paired differences of all the labels
+    are stacked, and the mean and variance of every label and column come from one segmented sum each.
+
+    Args:
+        data (DataFrame): Full clean dataset.
+        pairs (dict): The paired row positions of every label, from align_label_positions.
+        columns (list): Columns to perform t-tests on.
+        alpha (float): Significance level.
+
+    Returns:
+        results (DataFrame): One row per label and column, with 'label', 'column', 't_stat', 'p_value' and 'significant'.
+    """
+    label_cols = list(pairs)
+    if len(columns) == 0 or len(label_cols) == 0:
+        return pd.DataFrame(columns=['label', 'column', 't_stat', 'p_value', 'significant'])
+    from scipy.stats import t as t_distribution
+    values = data[columns].to_numpy(dtype=np.float64)
+    # Confusing minus not confusing, like ttest_rel(confusing, not_confusing) - the labels one after the other.
+    differences = np.concatenate([values[pairs[label_col][1]] - values[pairs[label_col][0]] for label_col in label_cols])
+    counts = np.array([len(pairs[label_col][0]) for label_col in label_cols])
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.add.reduceat(differences, starts, axis=0) / counts[:, None]
+        # The variance from the differences around their mean, not from the sum of squares - which loses precision on large values.
+        variances = np.add.reduceat((differences - np.repeat(means, counts, axis=0)) ** 2, starts, axis=0) / (counts[:, None] - 1)
+        t_stats = means / np.sqrt(variances / counts[:, None])
+    p_values = 2 * t_distribution.sf(np.abs(t_stats), (counts - 1)[:, None])
+    results = pd.DataFrame({'label': np.repeat(label_cols, len(columns)), 'column': np.tile(list(columns), len(label_cols)),
+                            't_stat': t_stats.ravel(), 'p_value': p_values.ravel()})
+    results['significant'] = results['p_value'] < alpha
+    return results
+
+@instrumented
+def perform_t_tests_by_label(data, pairs, normal_columns):
+    """
+    perform_t_tests for several label columns - every label's paired t-tests on its own normal columns,
+    computed together by paired_t_tests_by_label.
+
+    Args:
+        data (DataFrame): Full clean dataset.
+        pairs (dict): The paired row positions of every label, from align_label_positions.
+        normal_columns (dict): The columns to test for every label, from check_normality_by_label.
+
+    Returns:
+        t_test_results (dict): For every label column - a dictionary of the t-statistic and p-value of each column, like perform_t_tests.
+    """
+    # Every column that is normal for any label is tested for all of them, in one pass.
+    columns = list(dict.fromkeys(column for label_col in pairs for column in normal_columns[label_col]))
+    results = paired_t_tests_by_label(data, pairs, columns, alpha=0.05)
     t_test_results = {}
-    # Perform the paired t-test.
-    # Comparing the mean of the two groups under different conditions. 
-    for col in normal_cols:
-        t_stat, p_value = ttest_rel(confusing[col],not_confusing[col])
-        # Display results.
-        print(f"T-test for {col}: t-statistic={t_stat:.4f}, p-value={p_value:.4f}")
-
-        # Setting the significance level.
-        alpha = 0.05 
-        # Interpret the results.
-        if p_value < alpha:
-            print(f"The difference in '{col}' is statistically significant (p < 0.05).")
-        else:
-            print(f"The difference in '{col}' is not statistically significant (p >= 0.05).")
-        # Store results in the dictionary.
-        t_test_results[col] = {"t_stat": t_stat, "p_value": p_value}
+    for label_col in pairs:
+        label_results = results[(results['label'] == label_col) & results['column'].isin(normal_columns[label_col])].drop(columns='label')
+        label_results = label_results.set_index('column').loc[normal_columns[label_col]].reset_index()
+        if len(label_results):
+            logger.info("Paired t-test results of %s (significant: p < 0.05):\n%s", label_col,
+                        LazyTable(label_results, index=False, formatters={'t_stat': '{:.4f}'.format, 'p_value': '{:.4f}'.format}))
+        t_test_results[label_col] = {row.column: {"t_stat": row.t_stat, "p_value": row.p_value} for row in label_results.itertuples(index=False)}
     return t_test_results
 
+# Per-process state for the decision tree experiments.
+# The feature matrix is handed to each worker once, instead of once per experiment.
+_experiment_state = {}
+
+def _init_experiment_worker(features, labels, n_test):
+    """
+    Store the shared feature matrix and labels in the worker process.
+
+    Args:
+        features (np.ndarray): Contiguous feature matrix (samples x features).
+        labels (np.ndarray): Target labels, one per sample.
+        n_test (int): Number of samples in every test set.
+    """
+    _experiment_state['features'] = features
+    _experiment_state['labels'] = labels
+    _experiment_state['n_test'] = n_test
+
+def _run_experiments(seeds):
+    """
+    Run one batch of decision tree experiments, one per seed.
+
+    Args:
+        seeds (np.ndarray): Seeds of the experiments in this batch.
+
+    Returns:
+        tuple: Test labels and predictions, both of shape (len(seeds), n_test).
+    """
+    from sklearn.tree import DecisionTreeClassifier
+    features = _experiment_state['features']
+    labels = _experiment_state['labels']
+    n_test = _experiment_state['n_test']
+
+    truths = np.empty((len(seeds), n_test), dtype=labels.dtype)
+    preds = np.empty((len(seeds), n_test), dtype=labels.dtype)
+    for row, seed in enumerate(seeds):
+        # The seed decides both the 75/25 split and the tree, so every experiment can be repeated on its own.
+        order = np.random.default_rng(seed).permutation(len(labels))
+        test_idx, train_idx = order[:n_test], order[n_test:]
+        model = DecisionTreeClassifier(random_state=seed)
+        model.fit(features[train_idx], labels[train_idx])
+        preds[row] = model.predict(features[test_idx])
+        truths[row] = labels[test_idx]
+    return truths, preds
+
+def _confusion_metrics(truths, preds):
+    """
+    Compute accuracy, precision and recall of many experiments in one confusion-matrix pass.
+    Label 1 is the positive class, and precision/recall are 0 when undefined (like zero_division=0).
+
+    Args:
+        truths (np.ndarray): True labels, one row per experiment.
+        preds (np.ndarray): Predicted labels, one row per experiment.
+
+    Returns:
+        tuple: Accuracy, precision and recall arrays, one value per experiment.
+    """
+    n_rows = truths.shape[0]
+    # Encoding every (true, predicted) pair as 0=TN, 1=FP, 2=FN, 3=TP, offset by the experiment row,
+    # so one bincount gives the confusion matrix of every experiment.
+    codes = 2 * (truths == 1) + (preds == 1) + 4 * np.arange(n_rows)[:, None]
+    counts = np.bincount(codes.ravel(), minlength=4 * n_rows).reshape(n_rows, 4)
+    return _metrics_from_counts(counts)
+
+def _metrics_from_counts(counts):
+    """
+    Accuracy, precision and recall from confusion matrices - one (TN, FP, FN, TP) row per experiment.
+    """
+    n_rows = len(counts)
+    tn, fp, fn, tp = counts.T
+    accuracy = (tp + tn) / counts.sum(axis=1)
+    precision = np.divide(tp, tp + fp, out=np.zeros(n_rows), where=(tp + fp) > 0)
+    recall = np.divide(tp, tp + fn, out=np.zeros(n_rows), where=(tp + fn) > 0)
+    return accuracy, precision, recall
+
 # Train and evaluate decision tree model.
-def train_and_evaluate_decision_tree(data, target_col, columns_to_exclude, n_experiments=1000):
+@instrumented
+def train_and_evaluate_decision_tree(data, target_col, columns_to_exclude, n_experiments=1000, n_workers=1, random_state=None):
     """
-    Train and evaluate a decision tree model for classification using cross-validation.
+    Train and evaluate a decision tree model for classification using repeated random 75/25 splits.
+    The experiments can be spread across a process pool, and each one gets its own seed,
+    so a run with a given random_state gives the same results for any number of workers.
 
     Args:
         data (DataFrame): Full clean dataset.
         target_col (str): Name of the target column for classification.
         columns_to_exclude (list): Columns to exclude from training features.
         n_experiments (int): Number of experiments for cross-validation.
+        n_workers (int): Number of worker processes. 1 runs in this process, None uses all CPUs.
+        random_state (int): Seed for the per-experiment seeds. None gives a different run every time.
+
+    Returns:
+        results (dict): For 'accuracy', 'precision' and 'recall' - a dictionary with the 'mean', 'std'
+                        and 'per_experiment' values. 'seeds' holds the seed of every experiment.
+    """
+
+    # Building the feature matrix once, as a contiguous float32 array (the dtype the tree trains on).
+    features = data.drop(columns=columns_to_exclude + [target_col], errors='ignore')
+    features = np.ascontiguousarray(features.to_numpy(dtype=np.float32))
+    labels = data[target_col].to_numpy()
+    # The test set is 25% of the data, rounded up - the same size train_test_split uses.
+    n_test = int(np.ceil(0.25 * len(labels)))
+
+    # One seed per experiment.
+    seeds = np.random.SeedSequence(random_state).generate_state(n_experiments)
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if n_workers == 1:
+        _init_experiment_worker(features, labels, n_test)
+        truths, preds = _run_experiments(seeds)
+    else:
+        # A few batches per worker keeps the pool busy without sending every experiment separately.
+        batches = [batch for batch in np.array_split(seeds, n_workers * 4) if len(batch)]
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_experiment_worker, initargs=(features, labels, n_test)) as pool:
+            outputs = list(pool.map(_run_experiments, batches))
+        truths = np.concatenate([output[0] for output in outputs])
+        preds = np.concatenate([output[1] for output in outputs])
+
+    # The % of correctly predicted samples,
+    # the % of true positives out of all the positive predictions,
+    # and the % of true positives out of all the positives overall.
+    accuracy, precision, recall = _confusion_metrics(truths, preds)
+    results = {'seeds': seeds}
+    for name, values in (('accuracy', accuracy), ('precision', precision), ('recall', recall)):
+        results[name] = {'mean': values.mean(), 'std': values.std(), 'per_experiment': values}
+
+    # Overall results, in one message:
+    # The average percent of accracy - how often did the model make correct predictions.
+    # The average percent of precision - how often was there a true positive from all positive predictions.
+    # The average percent of recall - how often was there a true positive from all the positive instinces.
+    logger.info("Average Accuracy: %.4f, Average Precision: %.4f, Average Recall: %.4f",
+                results['accuracy']['mean'], results['precision']['mean'], results['recall']['mean'])
+
+    return results
+
+# Fold assignments already computed in this process, by a hash of the groups and the split settings.
+_fold_cache = {}
+
+@instrumented
+def group_folds(groups, n_splits=5, n_repeats=1, test_size=None, random_state=None, cache_dir=None):
+    """
+    Split the rows into folds by group (SubjectID), so the rows of a subject are never in both the train and the test set.
+    The folds are one small matrix - the fold of every row in every repeat - computed once and cached,
+    in this process and optionally on disk, for every later run with the same groups and settings.
+
+    Args:
+        groups (array-like): The group of every row. A missing group raises a ValueError, as its rows can't be kept apart.
+        n_splits (int): Number of folds per repeat (GroupKFold). Every fold is the test set once.
+        n_repeats (int): Number of repeats, each with its own shuffle of the groups.
+        test_size (float): If given, make repeated group-shuffle splits instead - in every repeat, this share of
+                           the groups is the test set (fold 0) and the rest is only trained on (fold -1).
+        random_state (int): Seed of the shuffles. None gives different folds every time, and nothing is cached.
+        cache_dir (str): Directory to keep the folds in between runs. None keeps them only in this process.
+
+    Returns:
+        folds (np.ndarray): (n_repeats x rows) fold numbers. The test set of split (r, k) is the rows where folds[r] == k.
+    """
+    codes, uniques = pd.factorize(np.asarray(groups), sort=True)
+    n_groups = len(uniques)
+    # A row without a group (code -1) would take the fold of the last group - its subject is unknown, so it can't be in any fold.
+    if (codes < 0).any():
+        raise ValueError(f"{(codes < 0).sum()} rows have no group - drop them before splitting.")
+    if test_size is None and n_groups < n_splits:
+        raise ValueError(f"Cannot split {n_groups} groups into {n_splits} folds.")
+
+    key = None
+    if random_state is not None:
+        digest = hashlib.sha256(np.ascontiguousarray(codes).tobytes())
+        digest.update(repr((n_groups, n_splits, n_repeats, test_size, random_state)).encode())
+        key = digest.hexdigest()[:16]
+        if key in _fold_cache:
+            return _fold_cache[key]
+        cache_path = os.path.join(cache_dir, f"folds-{key}.npy") if cache_dir is not None else None
+        if cache_path is not None and os.path.exists(cache_path):
+            _fold_cache[key] = np.load(cache_path, mmap_mode='r')
+            return _fold_cache[key]
+
+    # The fold of every group in every repeat - a shuffle of the groups, dealt out to the folds in turn.
+    rng = np.random.default_rng(random_state)
+    group_order = rng.permuted(np.tile(np.arange(n_groups), (n_repeats, 1)), axis=1)
+    group_folds_ = np.empty((n_repeats, n_groups), dtype=np.int16)
+    if test_size is None:
+        np.put_along_axis(group_folds_, group_order, np.arange(n_groups) % n_splits, axis=1)
+    else:
+        n_test = max(1, int(np.ceil(test_size * n_groups)))
+        np.put_along_axis(group_folds_, group_order, np.where(np.arange(n_groups) < n_test, 0, -1), axis=1)
+    # ...and every row gets the fold of its group.
+    folds = group_folds_[:, codes]
+
+    if key is not None:
+        _fold_cache[key] = folds
+        if cache_path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Saved under a temporary name first, so an interrupted run never leaves half a file.
+            np.save(cache_path + '.tmp.npy', folds)
+            os.replace(cache_path + '.tmp.npy', cache_path)
+    return folds
+
+def _init_fold_worker(features, labels, folds):
     """
+    Store the shared feature matrix, labels and fold assignments in the worker process.
+    """
+    _experiment_state['features'] = features
+    _experiment_state['labels'] = labels
+    _experiment_state['folds'] = folds
+
+def _run_folds(tasks):
+    """
+    Train and test one decision tree per split.
+
+    Args:
+        tasks (list): (repeat, fold, seed) of every split in this batch.
+
+    Returns:
+        np.ndarray: The confusion matrix (TN, FP, FN, TP) of every split.
+    """
+    from sklearn.tree import DecisionTreeClassifier
+    features = _experiment_state['features']
+    labels = _experiment_state['labels']
+    folds = _experiment_state['folds']
+
+    counts = np.empty((len(tasks), 4), dtype=np.int64)
+    for row, (repeat, fold, seed) in enumerate(tasks):
+        is_test = np.asarray(folds[repeat]) == fold
+        model = DecisionTreeClassifier(random_state=seed)
+        model.fit(features[~is_test], labels[~is_test])
+        preds = model.predict(features[is_test])
+        truths = labels[is_test]
+        counts[row] = np.bincount(2 * (truths == 1) + (preds == 1), minlength=4)
+    return counts
+
+@instrumented
+def cross_validate_decision_tree(data, target_col, columns_to_exclude, group_col='SubjectID', n_splits=5, n_repeats=1, test_size=None,
+                                 n_workers=1, random_state=None, cache_dir=None):
+    """
+    Evaluate a decision tree with subject-grouped cross-validation - no subject is ever in both the train and the test set,
+    so the scores say how well the model generalizes to new subjects.
+    The folds come from group_folds (cached), the feature matrix is built once and handed to each worker once,
+    and the splits can be spread across a process pool. Every split gets its own seed, so the results are
+    the same for any number of workers.
+
+    Args:
+        data (DataFrame): Full clean dataset.
+        target_col (str): Name of the target column for classification.
+        columns_to_exclude (list): Columns to exclude from training features. The group column is always excluded.
+        group_col (str): The column to group the rows by. Rows without a group are left out.
+        n_splits (int): Number of folds per repeat.
+        n_repeats (int): Number of repeats with different folds.
+        test_size (float): If given, use repeated group-shuffle splits with this share of the subjects in the test set.
+        n_workers (int): Number of worker processes. 1 runs in this process, None uses all CPUs.
+        random_state (int): Seed of the folds and the trees. None gives a different run every time.
+        cache_dir (str): Directory to cache the folds in. None caches them only in this process.
+
+    Returns:
+        results (dict): For 'accuracy', 'precision' and 'recall' - a dictionary with the 'mean', 'std', 'var'
+                        and 'per_fold' values. 'splits' holds the (repeat, fold) of every split.
+    """
+    missing = data[group_col].isna()
+    if missing.any():
+        # Rows without a subject could belong to a test subject - they are left out of both sides of every split.
+        logger.warning("Leaving out %d rows without a %s from the cross-validation.", missing.sum(), group_col)
+        data = data[~missing]
+    features = data.drop(columns=columns_to_exclude + [target_col, group_col], errors='ignore')
+    features = np.ascontiguousarray(features.to_numpy(dtype=np.float32))
+    labels = data[target_col].to_numpy()
+    folds = group_folds(data[group_col].to_numpy(), n_splits, n_repeats, test_size, random_state, cache_dir)
+
+    # One task per split - shuffle splits have a single test fold per repeat.
+    n_test_folds = 1 if test_size is not None else n_splits
+    splits = [(repeat, fold) for repeat in range(n_repeats) for fold in range(n_test_folds)]
+    seeds = np.random.SeedSequence(random_state).generate_state(len(splits))
+    tasks = [(repeat, fold, seed) for (repeat, fold), seed in zip(splits, seeds)]
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if n_workers == 1:
+        _init_fold_worker(features, labels, folds)
+        counts = _run_folds(tasks)
+    else:
+        batches = [tasks[first::n_workers * 4] for first in range(min(len(tasks), n_workers * 4))]
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_fold_worker, initargs=(features, labels, np.asarray(folds))) as pool:
+            outputs = list(pool.map(_run_folds, batches))
+        # Putting the splits back in order - batch b holds splits b, b + n_batches, ...
+        counts = np.empty((len(tasks), 4), dtype=np.int64)
+        for first, output in enumerate(outputs):
+            counts[first::len(batches)] = output
+
+    accuracy, precision, recall = _metrics_from_counts(counts)
+    results = {'splits': splits}
+    for name, values in (('accuracy', accuracy), ('precision', precision), ('recall', recall)):
+        results[name] = {'mean': values.mean(), 'std': values.std(), 'var': values.var(), 'per_fold': values}
 
-    # Counts for accuracy, precision and recall.
-    acc, prec, recall = 0, 0, 0
-    # We will do 1000 experiments to ensure accuracy.
-    for exp in range(n_experiments):
-        # Splitting the data into a training set, and testing set. 
-        # Dropping columns not needed for prediction.
-        # The data is split 75% for training, and 25% for testing.
-        train_x, test_x, train_y, test_y = train_test_split(data.drop(columns=columns_to_exclude + [target_col],axis=1, errors = 'ignore'), data[target_col], test_size=0.25)
-        # Creating the decision tree model.
-        model = DecisionTreeClassifier()
-        # Training the model on the training data, with the right labels.
-        model.fit(train_x,train_y)
-        # Generating the prediction for the tarining data.
-        # model_pred_train = model.predict(train_x)
-        # Generating the prediction for the test data.
-        preds = model.predict(test_x)
-
-        # The % of correctly predicted samples.
-        acc += accuracy_score(test_y,preds)
-        # The % of the true positives predictions out of all the positive predictions.
-        prec += precision_score(test_y,preds, zero_division=0)
-        # The % of true positive predictions out all of the positives overall.
-        recall += recall_score(test_y,preds, zero_division=0)
-
-    # Overall results: 
-    # The average percent of accracy.
-    # How often did the model make correct predictions.
-    print(f"Average Accuracy: {acc / n_experiments:.4f}")
-    # The average percent of precision.
-    # How often was there a true positive from all positive predictions.
-    print(f"Average Precision: {prec / n_experiments:.4f}")
-    # The average percent of recall.
-    # How often was there a true positive from all the positive instinces.
-    print(f"Average Recall: {recall / n_experiments:.4f}")
\ No newline at end of file
+    logger.info("Subject-grouped CV (%d splits) - Accuracy: %.4f (std %.4f), Precision: %.4f (std %.4f), Recall: %.4f (std %.4f)",
+                len(splits), results['accuracy']['mean'], results['accuracy']['std'], results['precision']['mean'],
+                results['precision']['std'], results['recall']['mean'], results['recall']['std'])
+    return results
@@ -1,41 +1,59 @@
+import logging
+import os
+import tempfile
+import numpy as np
 import pandas as pd
-def load_and_check_data(file_path):
+from src.log_config import LazyTable
+from src.data_storage import load_table, write_table_cache
+from src.instrumentation import instrumented
+
+# The columns that identify an event - one student watching one video.
+GROUP_COLUMNS = ['VideoID', 'SubjectID', 'predefinedlabel', 'user-definedlabeln']
+# The fingerprints of the raw rows are spilled to this many bucket files, so duplicates can be counted a bucket at a time.
+FINGERPRINT_BUCKETS = 256
+
+logger = logging.getLogger(__name__)
+
+@instrumented
+def load_and_check_data(file_path, cache_dir=None):
     """
     Loads the EEG data from a CSV file, displays an overview, and checks for missing and duplicate rows.
     Returns the loaded DataFrame.
 
     Args:
         file_path (str): The file path to the CSV file containing the EEG data.
+        cache_dir (str): Directory of the columnar cache. None parses the CSV file every time.
 
     Returns:
         eeg_data (DataFrame): The loaded DataFrame containing the EEG data.
     """
     # Load the data
-    eeg_data = pd.read_csv(file_path)
-    print("Data loaded successfully.")
+    eeg_data = load_table(file_path, cache_dir)
+    logger.info("Data loaded successfully. Number of rows: %d", len(eeg_data))
     # Display the first few rows to ensure data was loaded correctly. 
-    print("First few rows of the dataset:")
-    print(eeg_data.head())
+    logger.debug("First few rows of the dataset:\n%s", LazyTable(eeg_data.head()))
 
     # Check for missing values in any of the columns.
     missing_values = eeg_data.isnull().sum()
     if missing_values.sum() == 0:
-        print("No missing values found in the dataset.")
+        logger.info("No missing values found in the dataset.")
     else:
-        print("Missing values per column:")
-        print(missing_values[missing_values > 0])
+        logger.warning("Missing values per column: %s", missing_values[missing_values > 0].to_dict())
 
-    # Check for duplicate rows
-    duplicates = eeg_data[eeg_data.duplicated()]
-    if duplicates.empty:
-        print("No duplicate rows found.")
+    # Check for duplicate rows - only their number, the rows themselves at DEBUG.
+    duplicated = eeg_data.duplicated()
+    n_duplicates = int(duplicated.sum())
+    if n_duplicates == 0:
+        logger.info("No duplicate rows found.")
     else:
-        print("Duplicate rows:")
-        print(duplicates)
+        logger.warning("Number of duplicate rows: %d", n_duplicates)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Duplicate rows:\n%s", LazyTable(eeg_data[duplicated]))
 
     return eeg_data
 
-def clean_and_save_data(data, output_file_path):
+@instrumented
+def clean_and_save_data(data, output_file_path, cache_dir=None):
     """
     Groups the clean data according to the events - by their 'VideoID', 'SubjectID', 'predefinedlabel', 'user-definedlabeln'.  cleans the data by calculating their numerical columns by the average.
     displays an overview of the cleaned data, counts events,
@@ -44,26 +62,179 @@ def clean_and_save_data(data, output_file_path):
     Args:
         data (DataFrame): The DataFrame containing the raw EEG data.
         output_file_path (str): The file path where the cleaned data should be saved.
+        cache_dir (str): Directory of the columnar cache. If given, the cleaned data is cached too,
+                         so loading it later doesn't parse the CSV file again.
 
     Returns:
         clean_data (DataFrame): The cleaned DataFrame, grouped by events.
     """
 
     # Group and clean the data
-    clean_data = data.groupby(['VideoID', 'SubjectID', 'predefinedlabel', 'user-definedlabeln']).mean().reset_index()
-    print("Data grouped and cleaned.")
+    clean_data = data.groupby(GROUP_COLUMNS).mean().reset_index()
+    logger.info("Data grouped and cleaned.")
 
     # Display the first few rows of the grouped and cleaned data.
-    print("First few rows of the cleaned data:")
-    print(clean_data.head())
+    logger.debug("First few rows of the cleaned data:\n%s", LazyTable(clean_data.head()))
 
     # Checking how many events (rows) we have.
     # We should have 100 - 10 students watching 10 videos.
-    print(f"Number of events (rows) in the cleaned data: {clean_data.shape[0]}")
+    logger.info("Number of events (rows) in the cleaned data: %d", clean_data.shape[0])
     # The output confirms we have 100 events.
 
     # Saving the data for futre analysing
     clean_data.to_csv(output_file_path, index=False)
-    print(f"--- Cleaned data saved to {output_file_path}. ---")
+    if cache_dir is not None:
+        write_table_cache(clean_data, output_file_path, cache_dir)
+    logger.info("Cleaned data saved to %s.", output_file_path)
+
+    return clean_data
+
+def _spill_fingerprints(fingerprints, folder, shift):
+    """
+    Append row fingerprints to the bucket files of a folder - the bucket of a fingerprint is 8 of its bits, from shift up.
+    Equal rows have equal fingerprints, so all the copies of a row end up in the same bucket.
+    """
+    buckets = (fingerprints >> np.uint64(shift)) & np.uint64(FINGERPRINT_BUCKETS - 1)
+    order = np.argsort(buckets, kind='stable')
+    fingerprints, buckets = fingerprints[order], buckets[order]
+    starts = np.flatnonzero(np.diff(buckets)) + 1
+    for bucket, part in zip(buckets[np.r_[0, starts]] if len(buckets) else [], np.split(fingerprints, starts)):
+        with open(os.path.join(folder, f"{bucket}.bin"), 'ab') as file:
+            part.tofile(file)
+
+def _count_duplicate_fingerprints(bucket_path, max_fingerprints, shift):
+    """
+    Count the fingerprints of a bucket file that appeared before - at most max_fingerprints of them are in memory at once.
+    A bucket that is too big is split again by the next 8 bits of its fingerprints. Once all 64 bits were used,
+    every fingerprint left in it is the same.
+    """
+    n_fingerprints = os.path.getsize(bucket_path) // 8
+    if n_fingerprints <= max_fingerprints:
+        return n_fingerprints - len(np.unique(np.fromfile(bucket_path, dtype=np.uint64)))
+    if shift >= 64:
+        return n_fingerprints - 1
+    folder = bucket_path[:-len('.bin')]
+    os.makedirs(folder)
+    for first in range(0, n_fingerprints, max_fingerprints):
+        _spill_fingerprints(np.fromfile(bucket_path, dtype=np.uint64, count=max_fingerprints, offset=first * 8), folder, shift)
+    os.remove(bucket_path)
+    return sum(_count_duplicate_fingerprints(os.path.join(folder, name), max_fingerprints, shift + 8) for name in os.listdir(folder))
+
+def _add_event_sums(sums, compensations, counts, codes, values):
+    """
+    Add the values of a chunk to the running sums of their events, with the same compensated (Kahan) summation as
+    groupby().mean(), row after row - so the sums, and the means, are exactly the ones of the whole file in memory.
+    The rows of different events are added together, the n-th row of every event in the chunk at a time.
+    """
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(sorted_codes)) + 1]
+    # How many rows of its event come before every row in the chunk.
+    ranks = np.arange(len(codes)) - np.repeat(starts, np.diff(np.r_[starts, len(codes)]))
+    order = order[np.argsort(ranks, kind='stable')]
+    for rows in np.split(order, np.cumsum(np.bincount(ranks))[:-1]):
+        events, value = codes[rows], values[rows]
+        present = ~np.isnan(value)
+        total, compensation = sums[events], compensations[events]
+        y = value - compensation
+        t = total + y
+        new_compensation = t - total - y
+        # An infinite value makes the compensation NaN - it is reset, so the mean is infinite and not NaN.
+        new_compensation[np.isnan(new_compensation)] = 0
+        sums[events] = np.where(present, t, total)
+        compensations[events] = np.where(present, new_compensation, compensation)
+        counts[events] += present
+
+@instrumented
+def stream_clean_and_save_data(file_path, output_file_path, chunksize=100_000, spill_dir=None):
+    """
+    The streaming version of load_and_check_data and clean_and_save_data, for raw files that don't fit in memory.
+    Reads the raw CSV file in chunks and keeps only running totals - missing values per column,
+    and the sum and count of every column per event. To count duplicates, a fingerprint (64-bit hash) of every row is
+    spilled to bucket files on disk, and the buckets are checked one at a time after the last chunk.
+    Memory is bounded by the chunk size and the number of events - never by the whole file.
+    The cleaned data is the same as clean_and_save_data gives, to the last bit.
+
+    Args:
+        file_path (str): The file path to the CSV file containing the raw EEG data.
+        output_file_path (str): The file path where the cleaned data should be saved.
+        chunksize (int): Number of rows to read at a time - and the most fingerprints in memory at once.
+        spill_dir (str): Directory for the fingerprint buckets, removed at the end. None uses the system temporary directory.
+
+    Returns:
+        clean_data (DataFrame): The cleaned DataFrame, grouped by events.
+    """
+    n_rows = 0
+    missing_values = None
+    key_dtypes = None
+    value_columns = None
+    # The events in the order they were first seen, and their running sums, Kahan compensations and counts per column.
+    events = {}
+    event_keys = []
+    sums = compensations = counts = None
+
+    with tempfile.TemporaryDirectory(dir=spill_dir) as fingerprint_dir:
+        for chunk in pd.read_csv(file_path, chunksize=chunksize):
+            if missing_values is None:
+                # Display the first few rows to ensure data was loaded correctly.
+                logger.debug("First few rows of the dataset:\n%s", LazyTable(chunk.head()))
+            n_rows += len(chunk)
+
+            # Counting missing values in this chunk.
+            chunk_missing = chunk.isnull().sum()
+            missing_values = chunk_missing if missing_values is None else missing_values.add(chunk_missing, fill_value=0)
+
+            # Spilling the fingerprints of the rows - duplicates are counted at the end, a bucket at a time.
+            _spill_fingerprints(pd.util.hash_pandas_object(chunk, index=False).to_numpy(), fingerprint_dir, shift=0)
+
+            # Events with a missing id or label are dropped, like groupby does.
+            chunk = chunk.dropna(subset=GROUP_COLUMNS)
+            # Every chunk uses the id and label types of the first one, so the same event always gets the same key.
+            if key_dtypes is None:
+                key_dtypes = chunk[GROUP_COLUMNS].dtypes.to_dict()
+                value_columns = chunk.columns.drop(GROUP_COLUMNS)
+            chunk = chunk.astype(key_dtypes)
+
+            # The number of every event in the chunk - new events get the next numbers.
+            chunk_codes, chunk_events = pd.MultiIndex.from_frame(chunk[GROUP_COLUMNS]).factorize()
+            n_known = len(events)
+            numbers = np.array([events.setdefault(event, len(events)) for event in chunk_events], dtype=np.int64)
+            event_keys.append(chunk_events.to_frame(index=False, name=GROUP_COLUMNS)[numbers >= n_known])
+            if sums is None or len(events) > len(sums):
+                # Growing the running totals - twice as big, so they are copied only a few times.
+                size = max(len(events), 2 * (0 if sums is None else len(sums)))
+                grown = [np.zeros((size, len(value_columns))) for _ in range(3)]
+                if sums is not None:
+                    for array, old in zip(grown, (sums, compensations, counts)):
+                        array[:len(old)] = old
+                sums, compensations, counts = grown
+            _add_event_sums(sums, compensations, counts, numbers[chunk_codes], chunk[value_columns].to_numpy(dtype=np.float64))
+
+        # Duplicates are rows whose fingerprint appeared before.
+        n_duplicates = sum(_count_duplicate_fingerprints(os.path.join(fingerprint_dir, name), chunksize, shift=8)
+                           for name in os.listdir(fingerprint_dir))
+
+    logger.info("Data loaded successfully. Number of rows: %d", n_rows)
+    if missing_values.sum() == 0:
+        logger.info("No missing values found in the dataset.")
+    else:
+        logger.warning("Missing values per column: %s", missing_values[missing_values > 0].astype(int).to_dict())
+    if n_duplicates == 0:
+        logger.info("No duplicate rows found.")
+    else:
+        logger.warning("Number of duplicate rows: %d", n_duplicates)
+
+    # The mean of each column per event. Events where a column is always missing get NaN, like mean() gives.
+    n_events = len(events)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts[:n_events] > 0, sums[:n_events] / counts[:n_events], np.nan)
+    clean_data = pd.concat([pd.concat(event_keys, ignore_index=True), pd.DataFrame(means, columns=value_columns)], axis=1)
+    clean_data = clean_data.sort_values(GROUP_COLUMNS, ignore_index=True)
+    logger.info("Data grouped and cleaned.")
+    logger.info("Number of events (rows) in the cleaned data: %d", clean_data.shape[0])
+
+    # Saving the data for futre analysing
+    clean_data.to_csv(output_file_path, index=False)
+    logger.info("Cleaned data saved to %s.", output_file_path)
 
-    return clean_data
\ No newline at end of file
+    return clean_data
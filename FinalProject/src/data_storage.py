@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Tables already opened in this process, by source path and fingerprint.
+_loaded_tables = {}
+
+def _file_sha256(file_path):
+    """
+    Hash a file in chunks, so even multi-gigabyte files are never read into memory at once.
+
+    Args:
+        file_path (str): Path of the file to hash.
+
+    Returns:
+        str: The SHA-256 hex digest of the file.
+    """
+    with open(file_path, 'rb') as file:
+        return hashlib.file_digest(file, 'sha256').hexdigest()
+
+def _cache_folder(file_path, cache_dir):
+    """
+    Return the cache folder of a source file - its name plus a short hash of its full path,
+    so files with the same name in different folders don't share a cache.
+    """
+    source = os.path.abspath(file_path)
+    path_hash = hashlib.sha256(source.encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{os.path.basename(source)}-{path_hash}")
+
+def _read_manifest(folder):
+    """
+    Read the manifest of a cache folder, or return None if the cache was never (fully) written.
+    """
+    manifest_path = os.path.join(folder, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as file:
+        return json.load(file)
+
+def _write_manifest(folder, manifest):
+    """
+    Write the manifest of a cache folder. It is written last, and atomically,
+    so a cache folder with a manifest is always complete.
+    """
+    manifest_path = os.path.join(folder, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def write_table_cache(data, file_path, cache_dir):
+    """
+    Write a table to the cache of its source file - one memory-mappable .npy file per column.
+    Every column keeps its dtype, so a cached table has the dtypes of pd.read_csv(file_path).
+    The cache is written to a temporary folder and moved into place, so a reader never sees half of it.
+
+    Args:
+        data (DataFrame): The table, as loaded from (or saved to) file_path.
+        file_path (str): The CSV file the table belongs to. Its size, mtime and hash validate the cache.
+        cache_dir (str): Directory holding all the cached tables.
+
+    Returns:
+        folder (str): The cache folder of the table.
+    """
+    folder = _cache_folder(file_path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_folder = tempfile.mkdtemp(dir=cache_dir, prefix=os.path.basename(folder) + '.tmp-')
+
+    columns = []
+    for i, col in enumerate(data.columns):
+        values = data[col].to_numpy()
+        column = {'name': col, 'file': f"{i}.npy"}
+        if values.dtype == object:
+            # Text columns are stored as fixed-width strings, since object arrays can't be memory-mapped.
+            # A missing value would become the string 'nan' - so where they are is saved in a mask of its own.
+            missing = pd.isnull(values)
+            values = values.astype(str)
+            if missing.any():
+                column['missing'] = f"{i}.missing.npy"
+                np.save(os.path.join(temp_folder, column['missing']), missing, allow_pickle=False)
+        np.save(os.path.join(temp_folder, column['file']), np.ascontiguousarray(values), allow_pickle=False)
+        column['dtype'] = str(values.dtype)
+        columns.append(column)
+
+    stat = os.stat(file_path)
+    _write_manifest(temp_folder, {
+        'source': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': _file_sha256(file_path),
+        'columns': columns,
+    })
+
+    # Moving the old version of the cache out of the way, and the new one in. Tables already mapped from the old
+    # version keep their files until the folder is removed, and the maps stay valid after that too.
+    old_folder = tempfile.mkdtemp(dir=cache_dir, prefix=os.path.basename(folder) + '.old-')
+    try:
+        os.replace(folder, os.path.join(old_folder, 'cache'))
+    except FileNotFoundError:
+        pass
+    try:
+        os.replace(temp_folder, folder)
+    except OSError:
+        # Another process put its version of the same cache in place first - it is just as good.
+        shutil.rmtree(temp_folder, ignore_errors=True)
+    shutil.rmtree(old_folder, ignore_errors=True)
+    return folder
+
+def _is_cache_valid(manifest, file_path, folder):
+    """
+    Check that a cache still matches its source file.
+    The size and mtime are checked first. If the file was touched but not changed,
+    its hash still matches - then the new mtime is saved and the cache is kept.
+    """
+    if manifest is None:
+        return False
+    stat = os.stat(file_path)
+    if stat.st_size != manifest['size']:
+        return False
+    if stat.st_mtime_ns == manifest['mtime_ns']:
+        return True
+    if _file_sha256(file_path) != manifest['sha256']:
+        return False
+    manifest['mtime_ns'] = stat.st_mtime_ns
+    _write_manifest(folder, manifest)
+    return True
+
+def _load_column(folder, column):
+    """
+    Memory-map one cached column, as a plain ndarray view so later stages see ordinary arrays.
+    A text column with missing values is copied to an object array instead, with NaN where the CSV had nothing.
+    """
+    values = np.load(os.path.join(folder, column['file']), mmap_mode='r').view(np.ndarray)
+    if 'missing' in column:
+        values = values.astype(object)
+        values[np.load(os.path.join(folder, column['missing']))] = np.nan
+    return values
+
+def load_table(file_path, cache_dir=None):
+    """
+    Load a CSV table through the columnar cache.
+    The CSV is parsed only when there is no valid cache for it. Otherwise the columns are
+    memory-mapped, and every caller gets a view of the same read-only arrays - nothing is copied.
+    Within one process, each version of a file is opened only once.
+
+    Args:
+        file_path (str): Path of the CSV file.
+        cache_dir (str): Directory holding the cached tables. None reads the CSV directly.
+
+    Returns:
+        data (DataFrame): The table.
+    """
+    if cache_dir is None:
+        return pd.read_csv(file_path)
+
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _loaded_tables:
+        folder = _cache_folder(file_path, cache_dir)
+        if not _is_cache_valid(_read_manifest(folder), file_path, folder):
+            write_table_cache(pd.read_csv(file_path), file_path, cache_dir)
+        manifest = _read_manifest(folder)
+        columns = {col['name']: _load_column(folder, col) for col in manifest['columns']}
+        _loaded_tables[key] = pd.DataFrame(columns, copy=False)
+
+    # A shallow copy - callers can add or replace columns without changing the shared table.
+    return _loaded_tables[key].copy(deep=False)
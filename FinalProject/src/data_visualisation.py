@@ -1,8 +1,337 @@
+import hashlib
+import logging
 import os
-import matplotlib.pyplot as plt
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from src import downsampling, sketches
+from src.downsampling import minmax_downsample
+from src.instrumentation import instrumented
+from src.sketches import sketch_histogram, sketch_quantile
+from src.plot_cache import plot_key, load_manifest, save_manifest, is_plot_cached, mark_plot_used, evict_stale_plots
+
+logger = logging.getLogger(__name__)
+
+# The source files the plots depend on - this file, the downsampling of the paired lines and the sketches of the histograms.
+PLOT_CODE_FILES = [__file__, downsampling.__file__, sketches.__file__]
+
+# The figures are built with the object-oriented API and drawn by the Agg canvas directly,
+# so rendering keeps no pyplot state and works the same in worker processes.
+# matplotlib is imported only when the first figure is drawn - building the plot jobs doesn't need it.
+def _new_figure(figsize):
+    """
+    Create a figure with its own Agg canvas, and one axes on it.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+def _draw_histogram(column, not_confusing_values, confusing_values, not_confusing_limit, confusing_limit, plt_path):
+    """
+    Draw and save the histogram of one column for both groups.
+    """
+    # Creating new figure for the plot.
+    fig, ax = _new_figure(figsize=(7, 5))
+    # Histogram of the not confusing videos.
+    # We take the data ranging from 0 to 0.99 percentile to exlude extreme outliers.
+    ax.hist(not_confusing_values, alpha=0.5,range=(0,not_confusing_limit), label='Not Confusing Videos', bins=50)
+    # The same Histogram for the confusing videos.
+    ax.hist(confusing_values, alpha=0.5,range=(0,confusing_limit), label='Confusing Videos', bins=50)
+    # Adding title.
+    ax.set_title(f'Histogram of {column}')
+    # Adding title for x-axis.
+    ax.set_xlabel(column)
+    # Adding title for y-axis.
+    ax.set_ylabel('Frequency')
+    # Adding a legend to explain the labels.
+    ax.legend(loc='upper right')
+    # Saving the plot.
+    fig.savefig(plt_path)
+
+def _draw_binned_histogram(column, not_confusing_counts, not_confusing_edges, confusing_counts, confusing_edges, plt_path):
+    """
+    Draw and save the histogram of one column for both groups, from counts that were binned already - the same plot as _draw_histogram.
+    """
+    fig, ax = _new_figure(figsize=(7, 5))
+    # Every bin is one value at its left edge, weighted by its count - so the bars are the same as with the rows.
+    ax.hist(not_confusing_edges[:-1], bins=not_confusing_edges, weights=not_confusing_counts, alpha=0.5, label='Not Confusing Videos')
+    ax.hist(confusing_edges[:-1], bins=confusing_edges, weights=confusing_counts, alpha=0.5, label='Confusing Videos')
+    ax.set_title(f'Histogram of {column}')
+    ax.set_xlabel(column)
+    ax.set_ylabel('Frequency')
+    ax.legend(loc='upper right')
+    fig.savefig(plt_path)
+
+def _draw_boxplot(column, confusing_values, not_confusing_values, t_stat, p_value, plt_path):
+    """
+    Draw and save the box plot of one column for both groups.
+    """
+    # Creating new figure.
+    fig, ax = _new_figure(figsize=(7, 5))
+    # Creating box plot showing the distribution for each group.
+    ax.boxplot([confusing_values, not_confusing_values],labels=['Confusing Videos', 'Not Confusing Videos'])
+    # Adding title.
+    ax.set_title(f'Distribution of {column} Between Groups (t-stat={t_stat:.2f}, p={p_value:.3f})')
+    # Adding title to y-axis.
+    ax.set_ylabel('Theta')
+    # Adding grid lines
+    ax.grid(axis='y')
+    # Saving the plot.
+    fig.savefig(plt_path)
+
+def _draw_paired_lines(column, confusing_values, not_confusing_values, t_stat, p_value, plt_path, max_lines=5000, decimate=None):
+    """
+    Draw and save the paired line plot of one column.
+    Up to max_lines pairs, every pair is drawn. Above it, the plot switches to a summary of the two groups -
+    their distributions and the line between their medians - with an optional sample of about decimate pairs drawn on top.
+
+    Returns:
+        fig (Figure): The saved figure.
+    """
+    # Creating the figure.
+    fig, ax = _new_figure(figsize=(10, 6))
+    labels = ['Confusing Videos', 'Not Confusing Videos']
+    n_pairs = len(confusing_values)
+    summary = n_pairs > max_lines
+
+    if not summary:
+        # Adding scatter points for both groups.
+        ax.scatter([labels[0]] * n_pairs, confusing_values, color='blue', label=labels[0], alpha=0.7, s=50)
+        ax.scatter([labels[1]] * n_pairs, not_confusing_values, color='orange', label=labels[1], alpha=0.7, s=50)
+        pairs = np.arange(n_pairs)
+    else:
+        # The distribution of each group, instead of one point per subject.
+        ax.set_xticks([0, 1], labels)
+        violins = ax.violinplot([confusing_values, not_confusing_values], positions=[0, 1], showextrema=False)
+        for body, color, label in zip(violins['bodies'], ['blue', 'orange'], labels):
+            body.set(facecolor=color, alpha=0.3, label=label)
+        ax.plot([0, 1], [np.median(confusing_values), np.median(not_confusing_values)], marker='o', color='black', label='Median')
+        # Optionally, a sample of the pairs - the largest rise and fall in every block of subjects, so the extremes are always drawn.
+        pairs = np.unique(minmax_downsample(not_confusing_values - confusing_values, 2 * max(decimate // 2, 1))[1]) if decimate else np.arange(0)
+
+    # A line connecting the same SubjectID watching the two types of videos - all the lines are one collection.
+    from matplotlib.collections import LineCollection
+    segments = np.zeros((len(pairs), 2, 2))
+    segments[:, 1, 0] = 1
+    segments[:, 0, 1] = confusing_values[pairs]
+    segments[:, 1, 1] = not_confusing_values[pairs]
+    if len(pairs):
+        ax.add_collection(LineCollection(segments, colors='gray', alpha=0.5 if not summary else 0.1, zorder=2))
+    if not summary:
+        # The line ends, marked like the points of a line plot.
+        ax.scatter(segments[:, :, 0].ravel(), segments[:, :, 1].ravel(), marker='o', color='gray', alpha=0.5, s=36, zorder=2)
+
+    # Adding title.
+    ax.set_title(f'Paired Comparison of {column} Values\n(t-stat={t_stat:.2f}, p={p_value:.3e})', fontsize=14)
+    # Adding label to y-axis.
+    ax.set_ylabel(column, fontsize=12)
+    # Chnaging font sizes.
+    ax.tick_params(axis='both', labelsize=12)
+    # Adding grid line.
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    # Add horizontal line for the average of each group.
+    ax.axhline(y=confusing_values.mean(), color='blue', linestyle='--', alpha=0.7, label=f'Confusing Mean: {confusing_values.mean():.2f}')
+    ax.axhline(y=not_confusing_values.mean(), color='orange', linestyle='--', alpha=0.7, label=f'Not Confusing Mean: {not_confusing_values.mean():.2f}')
+    # Adding legend.
+    ax.legend(fontsize=12)
+    # Making sure all the elements fit into the figure.
+    fig.tight_layout()
+    # Saving the plot.
+    fig.savefig(plt_path)
+    return fig
+
+# The drawing function and the name used in messages, for every kind of plot.
+PLOT_KINDS = {
+    'histogram': (_draw_histogram, 'histogram'),
+    'binned_histogram': (_draw_binned_histogram, 'histogram'),
+    'boxplot': (_draw_boxplot, 'box plot'),
+    'paired_lines': (_draw_paired_lines, 'paired line plot'),
+}
+
+def _code_version():
+    """
+    Version of the plotting code - a hash of the PLOT_CODE_FILES and the matplotlib version.
+    A change in any of them renders every cached plot again.
+    """
+    import matplotlib
+    digest = hashlib.sha256()
+    for code_file in PLOT_CODE_FILES:
+        with open(code_file, 'rb') as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+    return f"{digest.hexdigest()[:16]}-{matplotlib.__version__}"
+
+def _render_job(job):
+    """
+    Render one plot job, and measure how long it took.
+
+    Args:
+        job (tuple): The kind of plot and the keyword arguments of its drawing function.
+
+    Returns:
+        tuple: The path of the saved plot and the render time in seconds.
+    """
+    kind, kwargs = job
+    draw, _ = PLOT_KINDS[kind]
+    start = time.perf_counter()
+    draw(**kwargs)
+    return kwargs['plt_path'], time.perf_counter() - start
+
+@instrumented
+def render_plots(jobs, n_workers=1, manifest_path=None, max_age_days=30):
+    """
+    Render a batch of plots, optionally spread across a process pool.
+    Each job holds only the arrays its plot needs, so sending it to a worker is cheap.
+    With a manifest, every plot is keyed by a hash of its data, parameters and the plotting code,
+    and plots whose file already holds the same content are not rendered again.
+
+    Args:
+        jobs (list): (kind, kwargs) pairs - kind is a key of PLOT_KINDS, kwargs are the arguments of its drawing function.
+        n_workers (int): Number of worker processes. 1 renders in this process, None uses all CPUs.
+        manifest_path (str): Path of the plot manifest. None renders every plot.
+        max_age_days (float): Plots in the manifest that no run used for this many days are deleted.
+
+    Returns:
+        timings (dict): The render time in seconds of every rendered plot, by its path.
+    """
+    n_jobs = len(jobs)
+    if manifest_path is not None:
+        manifest = load_manifest(manifest_path)
+        code_version = _code_version()
+        keys = [plot_key(kind, kwargs, code_version) for kind, kwargs in jobs]
+        # Skipping the plots that are already up to date.
+        todo = []
+        for job, key in zip(jobs, keys):
+            kind, kwargs = job
+            if is_plot_cached(manifest, kwargs['plt_path'], key):
+                logger.debug("Skipped %s for %s - unchanged at %s", PLOT_KINDS[kind][1], kwargs['column'], kwargs['plt_path'])
+                mark_plot_used(manifest, kwargs['plt_path'], key)
+            else:
+                todo.append((job, key))
+        jobs = [job for job, _ in todo]
+
+    # Creating the directories for the plots if they don't exist.
+    for _, kwargs in jobs:
+        os.makedirs(os.path.dirname(kwargs['plt_path']) or '.', exist_ok=True)
+
+    if n_workers == 1 or len(jobs) <= 1:
+        outputs = [_render_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            outputs = list(pool.map(_render_job, jobs))
+
+    timings = {}
+    for (kind, kwargs), (plt_path, seconds) in zip(jobs, outputs):
+        logger.debug("Saved %s for %s to %s (%.2fs)", PLOT_KINDS[kind][1], kwargs['column'], plt_path, seconds)
+        timings[plt_path] = seconds
+
+    if manifest_path is not None:
+        for (_, kwargs), key in todo:
+            mark_plot_used(manifest, kwargs['plt_path'], key)
+        for plt_path in evict_stale_plots(manifest, max_age_days):
+            logger.info("Removed stale plot %s", plt_path)
+        save_manifest(manifest_path, manifest)
+    # One line for the whole batch - every plot is listed at DEBUG.
+    logger.info("Rendered %d plots (%.2fs), skipped %d unchanged", len(timings), sum(timings.values()), n_jobs - len(jobs))
+    return timings
+
+@instrumented
+def histogram_jobs(eeg_data, not_confusing, confusing, plot_dir, columns_to_exclude, upper_limits=None):
+    """
+    Build the render jobs of plot_histograms, without rendering them.
+    """
+    # We want to look only at the numeric columns, so we drop the columns we dont want, and make the othres in to a list.
+    numeric_cols = eeg_data.drop(columns=columns_to_exclude, axis=1,errors='ignore').columns.to_list()
+    # The 99th percentile of all the columns at once, for each group.
+    if upper_limits is None:
+        upper_limits = (not_confusing[numeric_cols].quantile(0.99), confusing[numeric_cols].quantile(0.99))
+    not_confusing_limits, confusing_limits = upper_limits
+
+    # One plot for every column - Confusing vs not Confusing.
+    # In the plots: the frequency of the values of the columns.
+    return [('histogram', {
+        'column': col,
+        'not_confusing_values': not_confusing[col].to_numpy(),
+        'confusing_values': confusing[col].to_numpy(),
+        'not_confusing_limit': not_confusing_limits[col],
+        'confusing_limit': confusing_limits[col],
+        # Joins the whole path for the file to be saved.
+        'plt_path': os.path.join(plot_dir, f"histogram_{col}.png"),
+    }) for col in numeric_cols]
+
+@instrumented
+def sketch_histogram_jobs(summary, label_col, plot_dir, columns=None, bins=50):
+    """
+    Build the render jobs of the histograms of one label from the sketches of summarize_table (src/sketches.py), instead of the rows.
+    The plots are the same as histogram_jobs - 50 bins from 0 to the 99th percentile of each group - but the percentile and
+    the counts come from the sketches, so the summaries of many chunks or recordings can be merged and plotted at once.
+
+    Args:
+        summary (dict): The sketches of summarize_table, with label_col as one of its grouping columns.
+        label_col (str): The label to plot by - its groups 0 (not confusing) and 1 (confusing).
+        plot_dir (str): Directory to save the histograms.
+        columns (list): The columns to plot. None plots every sketched column.
+        bins (int): Number of bins.
+
+    Returns:
+        jobs (list): (kind, kwargs) render jobs for render_plots. A column without a sketch in one of the groups
+                     (a label with only one class) has no histogram.
+    """
+    not_confusing, confusing = summary[label_col].get(0, {}), summary[label_col].get(1, {})
+    if columns is None:
+        columns = list(not_confusing) + [col for col in confusing if col not in not_confusing]
+    jobs = []
+    for col in columns:
+        if col not in not_confusing or col not in confusing:
+            logger.warning("No histogram of %s by %s - one of its groups has no values", col, label_col)
+            continue
+        # We take the data ranging from 0 to the 0.99 percentile to exlude extreme outliers, like in histogram_jobs.
+        not_confusing_counts, not_confusing_edges = sketch_histogram(not_confusing[col], bins, range=(0, sketch_quantile(not_confusing[col], 0.99)))
+        confusing_counts, confusing_edges = sketch_histogram(confusing[col], bins, range=(0, sketch_quantile(confusing[col], 0.99)))
+        jobs.append(('binned_histogram', {
+            'column': col,
+            'not_confusing_counts': not_confusing_counts,
+            'not_confusing_edges': not_confusing_edges,
+            'confusing_counts': confusing_counts,
+            'confusing_edges': confusing_edges,
+            'plt_path': os.path.join(plot_dir, f"histogram_{col}.png"),
+        }))
+    return jobs
+
+@instrumented
+def boxplot_job(confusing_sorted, not_confusing_sorted, column, t_stat, p_value, plot_dir):
+    """
+    Build the render job of plot_boxplot, without rendering it.
+    """
+    return ('boxplot', {
+        'column': column,
+        'confusing_values': confusing_sorted[column].to_numpy(),
+        'not_confusing_values': not_confusing_sorted[column].to_numpy(),
+        't_stat': t_stat,
+        'p_value': p_value,
+        'plt_path': os.path.join(plot_dir, f"boxplot_{column}.png"),
+    })
+
+@instrumented
+def paired_lines_job(confusing_sorted, not_confusing_sorted, column, t_stat, p_value, plot_dir, max_lines=5000, decimate=None):
+    """
+    Build the render job of plot_paired_lines, without rendering it.
+    """
+    return ('paired_lines', {
+        'column': column,
+        'confusing_values': confusing_sorted[column].to_numpy(),
+        'not_confusing_values': not_confusing_sorted[column].to_numpy(),
+        't_stat': t_stat,
+        'p_value': p_value,
+        'plt_path': os.path.join(plot_dir, f"paired_lines_{column}.png"),
+        'max_lines': max_lines,
+        'decimate': decimate,
+    })
 
 # Plot histograms for each column
-def plot_histograms(eeg_data, not_confusing, confusing, plot_dir, columns_to_exclude):
+@instrumented
+def plot_histograms(eeg_data, not_confusing, confusing, plot_dir, columns_to_exclude, upper_limits=None, n_workers=1):
     """
     Plot histograms for all numeric columns in the dataset, comparing not_confusing and confusing groups.
 
@@ -12,40 +341,17 @@ def plot_histograms(eeg_data, not_confusing, confusing, plot_dir, columns_to_exc
         confusing (DataFrame): Group where label=1.
         plot_dir (str): Directory to save histogram plots.
         columns_to_exclude (list): List of columns to exclude from histogram plots.
+        upper_limits (tuple): Optional 99th percentile of every column in not_confusing and in confusing (two Series).
+                              Computed here when not given.
+        n_workers (int): Number of worker processes to render the histograms with.
 
+    Returns:
+        timings (dict): The render time in seconds of every saved plot, by its path.
     """
-    # Creating the directory for histograms if it doesn't exist
-    os.makedirs(plot_dir, exist_ok=True)
-
-    # We want to look only at the numeric columns, so we drop the columns we dont want, and make the othres in to a list.
-    numeric_cols = eeg_data.drop(columns=columns_to_exclude, axis=1,errors='ignore').columns.to_list()
-    # Our for loop goes throgh all remaing columns and creates plots for each group - Confusing vs not Confusing.
-    # In the plots: the frequency of the values of the columns. 
-    for col in numeric_cols:
-        # Creating new figure for the plot. 
-        plt.figure(figsize=(7, 5))
-        # Histogram of the not confusing videos. 
-        # We take the data ranging from 0 to 0.99 percentile to exlude extreme outliers. 
-        plt.hist(not_confusing[col], alpha=0.5,range=(0,not_confusing[col].quantile(0.99)), label='Not Confusing Videos', bins=50)
-        # The same Histogram for the confusing videos.
-        plt.hist(confusing[col], alpha=0.5,range=(0,confusing[col].quantile(0.99)), label='Confusing Videos', bins=50)
-        # Adding title.
-        plt.title(f'Histogram of {col}')
-        # Adding title for x-axis.
-        plt.xlabel(col)
-        # Adding title for y-axis.
-        plt.ylabel('Frequency')
-        # Adding a legend to explain the labels.
-        plt.legend(loc='upper right')
-        
-        # Joins the whole path for the file to be saved.
-        plt_path = os.path.join(plot_dir, f"histogram_{col}.png")
-        # Saving the plot.
-        plt.savefig(plt_path)
-        print(f"Saved histogram for {col} to {plt_path}")
-        plt.close()
+    return render_plots(histogram_jobs(eeg_data, not_confusing, confusing, plot_dir, columns_to_exclude, upper_limits), n_workers)
 
 # Showing the t-test results in a box plot.
+@instrumented
 def plot_boxplot(confusing_sorted, not_confusing_sorted, column, t_stat, p_value, plot_dir):
     """
     Plot a box plot comparing the distribution of a specific column in confusing and not_confusing groups.
@@ -58,30 +364,14 @@ def plot_boxplot(confusing_sorted, not_confusing_sorted, column, t_stat, p_value
         p_value (float): P-value from the t-test.
         plot_dir (str): Directory to save box plot.
 
+    Returns:
+        timings (dict): The render time in seconds of the saved plot, by its path.
     """
-    # Creating the directory for box plots if it doesn't exist
-    os.makedirs(plot_dir, exist_ok=True)
-
-    # Creating new figure.
-    plt.figure(figsize=(7, 5))
-    # Creating box plot showing the distribution for each group.
-    plt.boxplot([confusing_sorted[column], not_confusing_sorted[column]],labels=['Confusing Videos', 'Not Confusing Videos'])
-    # Adding title.
-    plt.title(f'Distribution of {column} Between Groups (t-stat={t_stat:.2f}, p={p_value:.3f})')
-    # Adding title to y-axis.
-    plt.ylabel('Theta')
-    # Adding grid lines
-    plt.grid(axis='y')
-    
-    # Joins the whole path for the file to be saved.
-    plt_path = os.path.join(plot_dir, f"boxplot_{column}.png")
-    # Saving the plot.
-    plt.savefig(plt_path)
-    print(f"Saved box plot for {column} to {plt_path}")
-    plt.close()
+    return render_plots([boxplot_job(confusing_sorted, not_confusing_sorted, column, t_stat, p_value, plot_dir)])
 
 # Showing the t-test results in a paired line plot.
-def plot_paired_lines(confusing_sorted, not_confusing_sorted, column, t_stat, p_value, plot_dir):
+@instrumented
+def plot_paired_lines(confusing_sorted, not_confusing_sorted, column, t_stat, p_value, plot_dir, max_lines=5000, decimate=None):
     """
     Plot paired comparisons of a specific column between confusing and not_confusing groups.
 
@@ -92,42 +382,10 @@ def plot_paired_lines(confusing_sorted, not_confusing_sorted, column, t_stat, p_
         t_stat (float): T-statistic from the t-test.
         p_value (float): P-value from the t-test.
         plot_dir (str): Directory to save paired line plot.
+        max_lines (int): Largest number of pairs to draw one by one. Above it, the plot shows a summary of the groups.
+        decimate (int): In the summary, about how many pairs to draw on top - the largest rise and fall of every block of subjects. None draws no pairs.
 
+    Returns:
+        timings (dict): The render time in seconds of the saved plot, by its path.
     """
-
-    # Creating the directory for paired line plots if it doesn't exist.
-    os.makedirs(plot_dir, exist_ok=True)
-
-    # Creating the figure.
-    plt.figure(figsize=(10, 6))
-
-    # Going over all the rows in the data set and draws a line connecting the same SubjectID watching the two types of videos.
-    for i in range(len(confusing_sorted)):
-        plt.plot(['Confusing Videos', 'Not Confusing Videos'],[confusing_sorted[column].iloc[i], not_confusing_sorted[column].iloc[i]],marker='o',color='gray',alpha=0.5)
-    # Adding scatter points for both groups.
-    plt.scatter(['Confusing Videos'] * len(confusing_sorted), confusing_sorted[column], color='blue', label='Confusing Videos', alpha=0.7, s=50)
-    plt.scatter(['Not Confusing Videos'] * len(not_confusing_sorted), not_confusing_sorted[column], color='orange', label='Not Confusing Videos', alpha=0.7, s=50)
-    # Adding title.
-    plt.title(f'Paired Comparison of {column} Values\n(t-stat={t_stat:.2f}, p={p_value:.3e})', fontsize=14)
-    # Adding label to y-axis.
-    plt.ylabel(column, fontsize=12)
-    # Chnaging font sizes.
-    plt.xticks(fontsize=12)
-    plt.yticks(fontsize=12)
-    plt.legend(fontsize=12)
-    # Adding grid line.
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-    # Add horizontal line for the average of each group.
-    plt.axhline(y=confusing_sorted[column].mean(), color='blue', linestyle='--', alpha=0.7, label=f'Confusing Mean: {confusing_sorted[column].mean():.2f}')
-    plt.axhline(y=not_confusing_sorted[column].mean(), color='orange', linestyle='--', alpha=0.7, label=f'Not Confusing Mean: {not_confusing_sorted[column].mean():.2f}')
-    # Adding legend.
-    plt.legend(fontsize=12)
-    # Making sure all the elements fit into the figure.
-    plt.tight_layout()
-   
-    # Joins the whole path for the file to be saved.
-    plt_path = os.path.join(plot_dir, f"paired_lines_{column}.png")
-    # Saving the plot.
-    plt.savefig(plt_path)
-    print(f"Saved paired line plot for {column} to {plt_path}")
-    plt.close()
\ No newline at end of file
+    return render_plots([paired_lines_job(confusing_sorted, not_confusing_sorted, column, t_stat, p_value, plot_dir, max_lines, decimate)])
@@ -0,0 +1,110 @@
+import numpy as np
+
+def _extrema_mask(signal):
+    """
+    Mark the local maxima and minima of a signal in one pass over its differences.
+    A sample is an extremum when the signal rises into it and falls after it, or the other way round -
+    the same points as argrelextrema with np.greater and np.less.
+
+    Args:
+        signal (np.ndarray): The samples, along the last axis.
+
+    Returns:
+        np.ndarray: A mask of the inner samples (all but the first and the last), True for extrema.
+    """
+    steps = np.sign(np.diff(signal, axis=-1))
+    return steps[..., :-1] * steps[..., 1:] < 0
+
+def downsample(signal, down_factor=5):
+    """
+    Downsample a signal to every down_factor-th sample, and keep all its local extrema so no peak is lost.
+
+    Args:
+        signal (np.ndarray): The samples - one channel, or (channels x samples). Channels share the kept points.
+        down_factor (int): Keep one regular sample out of every down_factor.
+
+    Returns:
+        downsized_signal (np.ndarray): The kept samples.
+        points (np.ndarray): Their indices in the signal.
+    """
+    signal = np.asarray(signal)
+    keep = np.zeros(signal.shape[-1], dtype=bool)
+    # The regular samples.
+    keep[::down_factor] = True
+    # The extrema of any channel.
+    keep[1:-1] |= _extrema_mask(signal).any(axis=tuple(range(signal.ndim - 1)))
+    points = np.flatnonzero(keep)
+    return signal[..., points], points
+
+def downsample_chunks(chunks, down_factor=5):
+    """
+    Downsample a signal that arrives in chunks - the same points as downsample on the whole signal, in constant memory.
+    Whether the last sample of a chunk is an extremum depends on the next chunk, so the last two samples
+    are carried over and that sample is decided with the next chunk.
+
+    Args:
+        chunks (iterable): The consecutive pieces of the signal - one channel, or (channels x samples).
+        down_factor (int): Keep one regular sample out of every down_factor.
+
+    Yields:
+        tuple: The kept samples of the chunk and their indices in the whole signal.
+    """
+    tail = None
+    # Index of the first sample of the tail in the whole signal, and of the first sample not decided yet.
+    offset, undecided = 0, 0
+    for chunk in chunks:
+        chunk = np.asarray(chunk)
+        if chunk.shape[-1] == 0:
+            continue
+        window = chunk if tail is None else np.concatenate([tail, chunk], axis=-1)
+        n_window = window.shape[-1]
+        indices = offset + np.arange(n_window)
+
+        keep = indices % down_factor == 0
+        keep[1:-1] |= _extrema_mask(window).any(axis=tuple(range(window.ndim - 1)))
+        # Everything but the last sample is decided now.
+        decided = keep & (indices >= undecided) & (indices < indices[-1])
+        if decided.any():
+            yield window[..., decided], indices[decided]
+
+        undecided = max(undecided, indices[-1])
+        tail = window[..., -2:]
+        offset = indices[-1] + 1 - tail.shape[-1]
+
+    # The last sample of the signal is never an extremum - only a regular sample.
+    if tail is not None and undecided % down_factor == 0:
+        yield tail[..., -1:], np.array([undecided])
+
+def minmax_downsample(signal, n_out):
+    """
+    Downsample a signal to exactly n_out points - the minimum and maximum of each of n_out / 2 equal buckets, in time order.
+    Every peak and trough that would be visible in a plot n_out / 2 pixels wide is kept.
+
+    Args:
+        signal (np.ndarray): The samples - one channel, or (channels x samples). Each channel has its own points.
+        n_out (int): Number of points to keep. Must be even. Signals with at most n_out samples are returned whole.
+
+    Returns:
+        downsized_signal (np.ndarray): The kept samples.
+        points (np.ndarray): Their indices in the signal, with the same shape.
+    """
+    if n_out < 2 or n_out % 2:
+        raise ValueError("n_out must be an even number of at least 2.")
+    signal = np.asarray(signal)
+    n_samples = signal.shape[-1]
+    if n_samples <= n_out:
+        points = np.broadcast_to(np.arange(n_samples), signal.shape).copy()
+        return signal.copy(), points
+
+    # The buckets differ in size by at most one sample - shorter ones repeat their last sample, which changes no minimum or maximum.
+    edges = np.linspace(0, n_samples, n_out // 2 + 1).astype(np.int64)
+    width = np.diff(edges).max()
+    bucket_points = np.minimum(edges[:-1, None] + np.arange(width), edges[1:, None] - 1)
+    buckets = signal[..., bucket_points]
+    bucket_rows = np.arange(n_out // 2)
+    lowest = bucket_points[bucket_rows, buckets.argmin(axis=-1)]
+    highest = bucket_points[bucket_rows, buckets.argmax(axis=-1)]
+
+    # The two points of every bucket, earlier one first.
+    points = np.stack([np.minimum(lowest, highest), np.maximum(lowest, highest)], axis=-1).reshape(signal.shape[:-1] + (n_out,))
+    return np.take_along_axis(signal, points, axis=-1), points
@@ -0,0 +1,148 @@
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # No resource module on Windows - the peak RSS is not recorded there.
+    resource = None
+
+# The tracing state of this process. Tracing is off by default, and then every instrumented call costs one dict lookup.
+_trace = {'enabled': False, 'trace_memory': False, 'events': []}
+
+def enable_tracing(trace_memory=False):
+    """
+    Start recording every instrumented call. Earlier events are discarded.
+
+    Args:
+        trace_memory (bool): Also record how much memory every call allocated, with tracemalloc.
+                             Tracing allocations slows the code down, so the times are less accurate.
+    """
+    _trace['events'] = []
+    _trace['trace_memory'] = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _trace['enabled'] = True
+
+def disable_tracing():
+    """
+    Stop recording calls. The recorded events are kept until the next enable_tracing.
+    """
+    _trace['enabled'] = False
+    if _trace['trace_memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def tracing_enabled():
+    """
+    Whether calls are being recorded.
+    """
+    return _trace['enabled']
+
+def _count_rows(value):
+    """
+    Number of rows in a table or array - summed over a tuple or list of them. None for anything else.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        counts = [count for count in map(_count_rows, value) if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+def _max_rss_mb():
+    """
+    The peak resident memory of this process so far, in MB.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux and in bytes on macOS.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2 ** 20 if sys.platform == 'darwin' else max_rss / 2 ** 10
+
+@contextlib.contextmanager
+def trace_stage(name, category='stage', **details):
+    """
+    Record a block of code as one event - its wall time, CPU time and memory.
+    Events of the calls inside the block are nested under it in a trace viewer.
+
+    Args:
+        name (str): Name of the event.
+        category (str): Category of the event, for filtering in the trace viewer.
+        **details: More values to save with the event, for example the label column.
+
+    Yields:
+        dict: The values saved with the event - add to it inside the block, for example the number of rows.
+    """
+    if not _trace['enabled']:
+        yield {}
+        return
+    details = dict(details)
+    memory_before = tracemalloc.get_traced_memory()[0] if _trace['trace_memory'] else None
+    start = time.perf_counter_ns()
+    cpu_start = time.process_time_ns()
+    try:
+        yield details
+    finally:
+        duration = time.perf_counter_ns() - start
+        details['cpu_ms'] = (time.process_time_ns() - cpu_start) / 1e6
+        details['max_rss_mb'] = _max_rss_mb()
+        if memory_before is not None:
+            details['memory_delta_mb'] = (tracemalloc.get_traced_memory()[0] - memory_before) / 2 ** 20
+        # A complete ("X") event of the Chrome trace-event format, in microseconds.
+        _trace['events'].append({'name': name, 'cat': category, 'ph': 'X', 'ts': start / 1e3, 'dur': duration / 1e3,
+                                 'pid': os.getpid(), 'tid': threading.get_ident(), 'args': details})
+
+def instrumented(function):
+    """
+    Decorator that records every call of a function as an event, when tracing is enabled -
+    along with the number of rows of its table arguments and of its result.
+    """
+    name = function.__qualname__
+    category = function.__module__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _trace['enabled']:
+            return function(*args, **kwargs)
+        with trace_stage(name, category, rows_in=_count_rows(list(args) + list(kwargs.values()))) as details:
+            result = function(*args, **kwargs)
+            details['rows_out'] = _count_rows(result)
+        return result
+    return wrapper
+
+def save_trace(trace_path):
+    """
+    Save the recorded events as a Chrome trace-event JSON file - open it in chrome://tracing, Perfetto or speedscope.
+    Calls made in worker processes are recorded only as part of the call that started them.
+
+    Args:
+        trace_path (str): Path of the trace file.
+
+    Returns:
+        n_events (int): Number of saved events.
+    """
+    os.makedirs(os.path.dirname(trace_path) or '.', exist_ok=True)
+    with open(trace_path, 'w') as file:
+        json.dump({'traceEvents': _trace['events'], 'displayTimeUnit': 'ms'}, file)
+    return len(_trace['events'])
+
+def summarize_trace():
+    """
+    Sum the recorded events by name - how many calls, and their total wall and CPU time.
+    Times of nested calls are also part of the calls around them.
+
+    Returns:
+        summary (pd.DataFrame): One row per name, slowest first.
+    """
+    events = pd.DataFrame([{'name': event['name'], 'wall_ms': event['dur'] / 1e3, 'cpu_ms': event['args']['cpu_ms']} for event in _trace['events']],
+                          columns=['name', 'wall_ms', 'cpu_ms'])
+    summary = events.groupby('name').agg(calls=('wall_ms', 'size'), wall_ms=('wall_ms', 'sum'), cpu_ms=('cpu_ms', 'sum'))
+    return summary.sort_values('wall_ms', ascending=False)
@@ -0,0 +1,47 @@
+import logging
+import sys
+
+# The format of every message - time, level, module and the message.
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+class LazyTable:
+    """
+    A table for a log message, formatted only if the message is emitted.
+    Pass it as an argument of the message - logger.debug("Rows:\\n%s", LazyTable(frame)) -
+    so the to_string call is skipped when DEBUG is off.
+    """
+
+    def __init__(self, frame, **to_string_kwargs):
+        """
+        Args:
+            frame (DataFrame or Series): The table.
+            **to_string_kwargs: Arguments of its to_string method, for example index=False.
+        """
+        self.frame = frame
+        self.to_string_kwargs = to_string_kwargs
+
+    def __str__(self):
+        return self.frame.to_string(**self.to_string_kwargs)
+
+def configure_logging(level="INFO", log_file=None):
+    """
+    Set up the messages of the project - where they go, and from which level on.
+    The modules in src only log; the scripts that run them (main.py) call this once.
+    Without it, only warnings and errors are shown.
+
+    Args:
+        level (str or int): The lowest level to show - "DEBUG" for the tables and every plot, "INFO" for the
+                            progress and result summaries, "WARNING" for problems only.
+        log_file (str): Also write the messages to this file.
+
+    Returns:
+        logger (logging.Logger): The root logger.
+    """
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file is not None:
+        handlers.append(logging.FileHandler(log_file))
+    logging.basicConfig(level=level, format=LOG_FORMAT, handlers=handlers, force=True)
+    # The libraries we use log a lot at DEBUG - only their warnings are interesting here.
+    for library in ('matplotlib', 'PIL'):
+        logging.getLogger(library).setLevel(logging.WARNING)
+    return logging.getLogger()
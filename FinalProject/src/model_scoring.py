@@ -0,0 +1,156 @@
+import logging
+import os
+import pickle
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from src.instrumentation import instrumented
+
+# Version of the saved model files - a file of another version is refused, instead of being scored wrongly.
+MODEL_FORMAT = 1
+# Columns copied from the scored table to the predictions, when it has them - so every prediction can be traced to its event.
+KEY_COLUMNS = ['SubjectID', 'VideoID']
+
+logger = logging.getLogger(__name__)
+
+def feature_columns(data, target_col, columns_to_exclude):
+    """
+    The feature schema of a table - its columns in order, without the excluded columns and the target.
+    The same columns the decision tree is evaluated on.
+    """
+    return data.drop(columns=list(columns_to_exclude) + [target_col], errors='ignore').columns.to_list()
+
+@instrumented
+def train_final_model(data, target_col, columns_to_exclude, evaluation=None, random_state=0):
+    """
+    Train the decision tree on all the data, for scoring new sessions - the evaluation says how good it is,
+    this is the model to use. It is bundled with everything needed to score with it later.
+
+    Args:
+        data (DataFrame): Full clean dataset.
+        target_col (str): Name of the target column.
+        columns_to_exclude (list): Columns that are not features.
+        evaluation (dict): The results of cross_validate_decision_tree or train_and_evaluate_decision_tree, saved with the model.
+        random_state (int): Seed of the tree.
+
+    Returns:
+        bundle (dict): The fitted 'model', its 'features' in order, the 'target_col', the sklearn version,
+                       the number of training rows, when it was trained, and the mean and std of the 'evaluation'.
+    """
+    import sklearn
+    from sklearn.tree import DecisionTreeClassifier
+    features = feature_columns(data, target_col, columns_to_exclude)
+    # The same contiguous float32 matrix the evaluation trains on.
+    model = DecisionTreeClassifier(random_state=random_state)
+    model.fit(np.ascontiguousarray(data[features].to_numpy(dtype=np.float32)), data[target_col].to_numpy())
+    summary = {name: {'mean': float(evaluation[name]['mean']), 'std': float(evaluation[name]['std'])}
+               for name in ('accuracy', 'precision', 'recall') if name in evaluation} if evaluation else None
+    return {'format': MODEL_FORMAT, 'model': model, 'features': features, 'target_col': target_col,
+            'sklearn_version': sklearn.__version__, 'n_train_rows': len(data),
+            'trained_at': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'evaluation': summary}
+
+def save_model(bundle, model_path):
+    """
+    Save a model bundle. It is written to a temporary file first, so a scorer never loads half a model.
+    """
+    os.makedirs(os.path.dirname(model_path) or '.', exist_ok=True)
+    with open(model_path + '.tmp', 'wb') as file:
+        pickle.dump(bundle, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(model_path + '.tmp', model_path)
+    logger.info("Saved the %s model (%d features) to %s", bundle['target_col'], len(bundle['features']), model_path)
+
+def load_model(model_path):
+    """
+    Load a model bundle saved by save_model. Load it once, and score any number of tables with it.
+    Only load model files you trust - they are pickles.
+
+    Args:
+        model_path (str): Path of the model file.
+
+    Returns:
+        bundle (dict): The model bundle.
+    """
+    import sklearn
+    with open(model_path, 'rb') as file:
+        bundle = pickle.load(file)
+    if not isinstance(bundle, dict) or bundle.get('format') != MODEL_FORMAT:
+        raise ValueError(f"{model_path} is not a model file of format {MODEL_FORMAT}.")
+    if bundle['sklearn_version'] != sklearn.__version__:
+        logger.warning("%s was trained with scikit-learn %s, and is loaded with %s - retrain it if the predictions look wrong",
+                       model_path, bundle['sklearn_version'], sklearn.__version__)
+    return bundle
+
+def _feature_matrix(bundle, data):
+    """
+    The features of a table in the order of the model, as a contiguous float32 matrix. Extra columns are ignored.
+    """
+    missing = [column for column in bundle['features'] if column not in data.columns]
+    if missing:
+        raise ValueError(f"The table has no {missing} columns, which the {bundle['target_col']} model needs.")
+    return np.ascontiguousarray(data[bundle['features']].to_numpy(dtype=np.float32))
+
+def score_table(bundle, data):
+    """
+    Predict the label of every row of a cleaned EEG table.
+
+    Args:
+        bundle (dict): A model bundle from load_model or train_final_model.
+        data (DataFrame): The table. It needs the feature columns of the model, in any order.
+
+    Returns:
+        np.ndarray: The predicted label of every row.
+    """
+    features = _feature_matrix(bundle, data)
+    if len(features) == 0:
+        return np.empty(0, dtype=bundle['model'].classes_.dtype)
+    # The tree's leaf of every row, and the most common class in it - what predict does, without
+    # checking the input again on every call, since the matrix is already float32 and contiguous.
+    tree = bundle['model'].tree_
+    return bundle['model'].classes_[tree.value[tree.apply(features), 0].argmax(axis=1)]
+
+@instrumented
+def score_file(bundle, file_path, output_path=None, chunksize=100_000):
+    """
+    Predict the labels of a cleaned EEG table on disk, a chunk at a time, so tables of any size can be scored.
+    Only the feature and key columns are read.
+
+    Args:
+        bundle (dict): A model bundle from load_model.
+        file_path (str): Path of the CSV table.
+        output_path (str): Write the predictions to this CSV file, a chunk at a time. None returns them instead.
+        chunksize (int): Number of rows scored at a time.
+
+    Returns:
+        predictions (pd.DataFrame): The key columns of every row and its 'prediction' - None if they were written to output_path.
+        report (dict): The number of 'rows' and 'batches', the scoring time of every batch in 'latency_ms' (without reading it),
+                       and the 'rows_per_second' of the whole run.
+    """
+    needed = set(bundle['features']) | set(KEY_COLUMNS)
+    start = time.perf_counter()
+    latencies = []
+    parts = []
+    n_rows = 0
+    for batch, chunk in enumerate(pd.read_csv(file_path, chunksize=chunksize, usecols=lambda column: column in needed)):
+        batch_start = time.perf_counter()
+        labels = score_table(bundle, chunk)
+        latencies.append((time.perf_counter() - batch_start) * 1e3)
+        logger.debug("Scored batch %d - %d rows in %.2f ms", batch, len(chunk), latencies[-1])
+
+        predictions = chunk[[column for column in KEY_COLUMNS if column in chunk.columns]].copy()
+        predictions['prediction'] = labels
+        if output_path is None:
+            parts.append(predictions)
+        else:
+            predictions.to_csv(output_path, mode='w' if batch == 0 else 'a', header=batch == 0, index=False)
+        n_rows += len(chunk)
+
+    seconds = time.perf_counter() - start
+    latencies = np.array(latencies)
+    report = {'rows': n_rows, 'batches': len(latencies), 'latency_ms': latencies, 'rows_per_second': n_rows / seconds if seconds > 0 else float('inf')}
+    if len(latencies):
+        logger.info("Scored %d rows in %d batches - %.0f rows per second, batch latency median %.2f ms, max %.2f ms",
+                    n_rows, len(latencies), report['rows_per_second'], np.median(latencies), latencies.max())
+    if output_path is not None:
+        return None, report
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['prediction']), report
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+
+def plot_key(kind, kwargs, code_version):
+    """
+    Content hash of a plot job - the kind of plot, the data and parameters it is drawn from, and the plotting code.
+    Two jobs with the same key produce the same image, wherever it is saved.
+
+    Args:
+        kind (str): The kind of plot.
+        kwargs (dict): The arguments of its drawing function. The output path is not part of the key.
+        code_version (str): Version of the plotting code.
+
+    Returns:
+        str: The SHA-256 hex digest of the job.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{kind}|{code_version}".encode())
+    for name in sorted(kwargs):
+        if name == 'plt_path':
+            continue
+        value = kwargs[name]
+        digest.update(name.encode())
+        if isinstance(value, np.ndarray):
+            # The dtype and shape too, so equal bytes in a different layout don't collide.
+            digest.update(f"{value.dtype}{value.shape}".encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    """
+    Load the plot manifest - the key and last use time of every cached plot, by its path.
+    Returns an empty manifest if there is none yet.
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as file:
+        return json.load(file)
+
+def save_manifest(manifest_path, manifest):
+    """
+    Save the plot manifest atomically, so an interrupted run never leaves half a manifest.
+    """
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    with open(manifest_path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def is_plot_cached(manifest, plt_path, key):
+    """
+    Check whether the plot at plt_path was rendered from the same content and still exists.
+    """
+    entry = manifest.get(plt_path)
+    return entry is not None and entry['key'] == key and os.path.exists(plt_path)
+
+def mark_plot_used(manifest, plt_path, key):
+    """
+    Record that the plot at plt_path holds the content with this key, and was used now.
+    """
+    manifest[plt_path] = {'key': key, 'last_used': time.time()}
+
+def evict_stale_plots(manifest, max_age_days):
+    """
+    Remove the plots that no run has used in the last max_age_days days, and forget plots whose file is gone.
+
+    Args:
+        manifest (dict): The plot manifest. Changed in place.
+        max_age_days (float): How long an unused plot is kept.
+
+    Returns:
+        evicted (list): Paths of the removed plots.
+    """
+    oldest = time.time() - max_age_days * 24 * 60 * 60
+    evicted = []
+    for plt_path, entry in list(manifest.items()):
+        if entry['last_used'] < oldest and os.path.exists(plt_path):
+            os.remove(plt_path)
+            evicted.append(plt_path)
+        if entry['last_used'] < oldest or not os.path.exists(plt_path):
+            del manifest[plt_path]
+    return evicted
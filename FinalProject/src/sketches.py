@@ -0,0 +1,249 @@
+import math
+import numpy as np
+from src.instrumentation import instrumented
+
+# The most fine bins a histogram sketch keeps - above it, its bins are made twice as wide.
+HISTOGRAM_BINS = 2048
+# The size of the quantile sketch - its rank error is about 1.7 / KLL_K, whatever the number of values.
+KLL_K = 200
+
+# A sketch summarizes one column of one group in a fixed amount of memory, and two sketches of different
+# chunks (or machines) merge into the sketch of both:
+#   count, mean, m2, min, max - the moments, merged with Chan's parallel formula.
+#   histogram - counts of fixed-width bins. The bin width is a power of two, so histograms built separately
+#               can always be merged, by making the narrower bins as wide as the wider ones.
+#   quantiles - a KLL sketch: levels of sorted samples, where every value in level h stands for 2 ** h values.
+
+def _empty_sketch(k=KLL_K):
+    return {'count': 0, 'mean': 0.0, 'm2': 0.0, 'min': math.inf, 'max': -math.inf,
+            'histogram': {'exponent': None, 'index': np.empty(0, np.int64), 'counts': np.empty(0, np.int64)},
+            'quantiles': {'k': k, 'levels': []}}
+
+def _combine_bins(index, counts, exponent, max_bins):
+    """
+    Sum the counts of equal bins, then make the bins wider until there are at most max_bins of them.
+    """
+    while True:
+        index, inverse = np.unique(index, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts, minlength=len(index)).astype(np.int64)
+        if len(index) <= max_bins:
+            return {'exponent': exponent, 'index': index, 'counts': counts}
+        # Twice as wide - floor division keeps negative bins right.
+        index = index // 2
+        exponent += 1
+
+def _histogram(values, max_bins):
+    """
+    The histogram sketch of an array. The first bin width is the power of two that spreads the middle 98% of the values
+    over about a quarter of max_bins - only the bins that have values are kept, so a long tail of outliers costs a bin
+    per outlier at most, and later chunks with a wider range have room before the bins get wider.
+    """
+    low, high = np.percentile(values, [1, 99])
+    scale = high - low if high > low else max(abs(high), 1.0)
+    exponent = math.ceil(math.log2(scale / (max_bins / 4)))
+    index = np.floor(values / 2.0 ** exponent).astype(np.int64)
+    return _combine_bins(index, np.ones(len(index), np.int64), exponent, max_bins)
+
+def _merge_histograms(first, second, max_bins):
+    if first['exponent'] is None:
+        return second
+    if second['exponent'] is None:
+        return first
+    exponent = max(first['exponent'], second['exponent'])
+    index = np.concatenate([first['index'] // 2 ** (exponent - first['exponent']), second['index'] // 2 ** (exponent - second['exponent'])])
+    return _combine_bins(index, np.concatenate([first['counts'], second['counts']]), exponent, max_bins)
+
+def _capacity(level, n_levels, k):
+    """
+    How many values a level of a KLL sketch holds - k at the top level, and 2/3 as many at every level below it.
+    """
+    return max(2, math.ceil(k * (2 / 3) ** (n_levels - 1 - level)))
+
+def _compact(quantiles, seed):
+    """
+    Compact the full levels of a KLL sketch: a full level is sorted, and every second value (starting at a
+    random one of the first two) moves to the level above, where it stands for twice as many values.
+    """
+    levels = quantiles['levels']
+    rng = np.random.default_rng(seed)
+    level = 0
+    while level < len(levels):
+        if len(levels[level]) <= _capacity(level, len(levels), quantiles['k']):
+            level += 1
+            continue
+        values = np.sort(levels[level])
+        # An odd value out stays on its level.
+        kept, values = values[:len(values) % 2], values[len(values) % 2:]
+        promoted = values[rng.integers(2)::2]
+        if level + 1 == len(levels):
+            levels.append(promoted)
+        else:
+            levels[level + 1] = np.concatenate([levels[level + 1], promoted])
+        levels[level] = kept
+        # A new top level makes the levels below it smaller - checking them all again.
+        level = 0
+
+@instrumented
+def sketch_values(values, k=KLL_K, max_bins=HISTOGRAM_BINS):
+    """
+    Summarize an array of values in a sketch - its moments, a histogram and a quantile sketch. Missing values are skipped.
+
+    Args:
+        values (array-like): The values.
+        k (int): The size of the quantile sketch.
+        max_bins (int): The most fine bins of the histogram.
+
+    Returns:
+        sketch (dict): The sketch. Combine sketches of other chunks with merge_sketches.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    sketch = _empty_sketch(k)
+    if len(values) == 0:
+        return sketch
+    mean = values.mean()
+    sketch.update(count=len(values), mean=mean, m2=float(((values - mean) ** 2).sum()), min=values.min(), max=values.max(),
+                  histogram=_histogram(values, max_bins))
+    sketch['quantiles']['levels'] = [values.copy()]
+    _compact(sketch['quantiles'], seed=len(values))
+    return sketch
+
+def merge_sketches(first, second, max_bins=HISTOGRAM_BINS):
+    """
+    Merge the sketches of two chunks of a column into the sketch of both. Neither of them is changed.
+
+    Args:
+        first (dict): A sketch.
+        second (dict): A sketch of other values of the same column.
+        max_bins (int): The most fine bins of the merged histogram.
+
+    Returns:
+        sketch (dict): The merged sketch.
+    """
+    if first['count'] == 0:
+        return second
+    if second['count'] == 0:
+        return first
+    count = first['count'] + second['count']
+    delta = second['mean'] - first['mean']
+    merged = {
+        'count': count,
+        'mean': first['mean'] + delta * second['count'] / count,
+        'm2': first['m2'] + second['m2'] + delta ** 2 * first['count'] * second['count'] / count,
+        'min': min(first['min'], second['min']),
+        'max': max(first['max'], second['max']),
+        'histogram': _merge_histograms(first['histogram'], second['histogram'], max_bins),
+    }
+    first_levels, second_levels = first['quantiles']['levels'], second['quantiles']['levels']
+    levels = [np.concatenate([first_levels[level] if level < len(first_levels) else np.empty(0),
+                              second_levels[level] if level < len(second_levels) else np.empty(0)])
+              for level in range(max(len(first_levels), len(second_levels)))]
+    merged['quantiles'] = {'k': max(first['quantiles']['k'], second['quantiles']['k']), 'levels': levels}
+    _compact(merged['quantiles'], seed=count)
+    return merged
+
+def sketch_moments(sketch):
+    """
+    The count, mean, variance (with ddof=1, like pandas), min and max of the values of a sketch.
+    """
+    variance = sketch['m2'] / (sketch['count'] - 1) if sketch['count'] > 1 else math.nan
+    return {'count': sketch['count'], 'mean': sketch['mean'] if sketch['count'] else math.nan, 'var': variance,
+            'min': sketch['min'], 'max': sketch['max']}
+
+def sketch_quantile(sketch, q):
+    """
+    Estimate a quantile of the values of a sketch. While no level was compacted the sketch holds every value, and the
+    quantile is exact - interpolated between neighbouring values like np.quantile and Series.quantile. After that it is
+    the value at that rank, within about 1.7 / k in rank.
+
+    Args:
+        sketch (dict): The sketch.
+        q (float or array-like): The quantile, or several, between 0 and 1.
+
+    Returns:
+        float or np.ndarray: The value at every quantile. NaN for an empty sketch.
+    """
+    levels = sketch['quantiles']['levels']
+    if sketch['count'] == 0:
+        return np.full(np.shape(q), np.nan)[()]
+    if len(levels) == 1:
+        return np.quantile(levels[0], q)[()]
+    values = np.concatenate(levels)
+    weights = np.concatenate([np.full(len(level_values), 2 ** level, dtype=np.float64) for level, level_values in enumerate(levels)])
+    order = np.argsort(values, kind='stable')
+    values, ranks = values[order], np.cumsum(weights[order])
+    # The smallest value whose rank reaches q of all the values.
+    positions = np.searchsorted(ranks, np.asarray(q) * ranks[-1], side='left')
+    return values[np.minimum(positions, len(values) - 1)][()]
+
+def sketch_histogram(sketch, bins=50, range=None):
+    """
+    The histogram of a sketch in display bins - every fine bin of the sketch is counted in the display bin of its center.
+
+    Args:
+        sketch (dict): The sketch.
+        bins (int): Number of display bins.
+        range (tuple): The (low, high) of the display bins. None uses the min and max of the values.
+
+    Returns:
+        counts (np.ndarray): The count of every display bin - not whole numbers where a fine bin is split between two.
+        edges (np.ndarray): The bins edges, one more than the counts.
+    """
+    histogram = sketch['histogram']
+    if range is None:
+        range = (sketch['min'], sketch['max']) if sketch['count'] else (0, 1)
+    edges = np.linspace(range[0], range[1], bins + 1)
+    if histogram['exponent'] is None:
+        return np.zeros(bins), edges
+    # The values of every fine bin are taken as spread evenly over it (or over the part between the min and max),
+    # so the count below any point is a straight line between the bin edges - and the display bins get their share of every fine bin.
+    width = 2.0 ** histogram['exponent']
+    lefts = np.clip(histogram['index'] * width, sketch['min'], sketch['max'])
+    rights = np.clip((histogram['index'] + 1) * width, sketch['min'], sketch['max'])
+    totals = np.cumsum(histogram['counts'])
+    points = np.column_stack([lefts, rights]).ravel()
+    below = np.column_stack([totals - histogram['counts'], totals]).ravel()
+    cumulative = np.interp(edges, points, below)
+    # Like np.histogram, the last bin includes its right edge.
+    if edges[-1] >= sketch['max']:
+        cumulative[-1] = totals[-1]
+    return np.diff(cumulative), edges
+
+@instrumented
+def summarize_table(chunks, group_cols, columns, k=KLL_K, max_bins=HISTOGRAM_BINS):
+    """
+    Sketch every column for every group of every grouping column, in one pass over the chunks of a table -
+    such as pd.read_csv(..., chunksize=...) - so the table never has to be in memory at once.
+
+    Args:
+        chunks (iterable): DataFrames, or one DataFrame in a list.
+        group_cols (list): Columns to group by, one at a time - for example the label columns.
+        columns (list): Columns to sketch.
+        k (int): The size of the quantile sketches.
+        max_bins (int): The most fine bins of the histograms.
+
+    Returns:
+        summary (dict): summary[group_col][group value][column] is a sketch. Combine summaries of other chunks with merge_summaries.
+    """
+    summary = {}
+    for chunk in chunks:
+        chunk_summary = {group_col: {value: {column: sketch_values(group[column].to_numpy(), k, max_bins) for column in columns}
+                                     for value, group in chunk.groupby(group_col)}
+                         for group_col in group_cols}
+        summary = merge_summaries(summary, chunk_summary, max_bins)
+    return summary
+
+def merge_summaries(first, second, max_bins=HISTOGRAM_BINS):
+    """
+    Merge two summaries of summarize_table - of different chunks, files or machines - into the summary of both.
+    """
+    merged = {}
+    # dict.fromkeys keeps the order the groups and columns were first seen in.
+    for group_col in dict.fromkeys([*first, *second]):
+        first_groups, second_groups = first.get(group_col, {}), second.get(group_col, {})
+        merged[group_col] = {}
+        for value in dict.fromkeys([*first_groups, *second_groups]):
+            first_columns, second_columns = first_groups.get(value, {}), second_groups.get(value, {})
+            merged[group_col][value] = {column: merge_sketches(first_columns.get(column, _empty_sketch()), second_columns.get(column, _empty_sketch()), max_bins)
+                                        for column in dict.fromkeys([*first_columns, *second_columns])}
+    return merged
@@ -0,0 +1,289 @@
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import time
+from src.instrumentation import trace_stage
+
+# The default size limit of an artifact store - the least recently used artifacts are removed above it.
+DEFAULT_MAX_BYTES = 2 * 2 ** 30
+
+# Hashes of the source files of the modules and of the functions the stages depend on, computed once per process.
+_source_hashes = {}
+_function_hashes = {}
+
+logger = logging.getLogger(__name__)
+
+def add_stage(graph, name, function, inputs=(), params=None, file_params=(), output_params=(), options=None, code=(), persist=True):
+    """
+    Declare a stage of a graph - a function, the stages it takes as inputs, and its parameters.
+    The stage is called as function(*input_outputs, **params, **options).
+
+    Args:
+        graph (dict): The stages, by name. Changed in place.
+        name (str): Name of the stage.
+        function (callable): What the stage runs.
+        inputs (tuple): Names of the stages whose outputs are its positional arguments, in order.
+        params (dict): Its other arguments. They are part of the fingerprint, so changing one reruns the stage.
+        file_params (tuple): Names of the params that are paths of input files - the file content is part of the fingerprint, not only the path.
+        output_params (tuple): Names of the params that are paths of files the stage writes. Its saved output is only used while
+                               these files are as the stage left them - a missing or changed file runs the stage again.
+        options (dict): Arguments that don't change the output, such as the number of workers. Not part of the fingerprint.
+        code (tuple): Other functions or modules the stage depends on. The source of every function, and the whole source
+                      file of every module, are part of the fingerprint - as is the source of function itself, but not of
+                      its neighbours, so editing another function of its file doesn't rerun the stage.
+        persist (bool): Whether to save the output in the artifact store. Stages that are cheap to
+                        recompute from their inputs, or whose output is a side effect, are not saved.
+    """
+    missing = [input_name for input_name in inputs if input_name not in graph]
+    if missing:
+        raise ValueError(f"Stage {name} uses undeclared stages: {missing}")
+    graph[name] = {'function': function, 'inputs': tuple(inputs), 'params': dict(params or {}), 'file_params': tuple(file_params),
+                   'output_params': tuple(output_params), 'options': dict(options or {}), 'code': (function,) + tuple(code), 'persist': persist}
+
+def _source_hash(item):
+    """
+    Hash of the source of a function, or of the whole source file of a module - decorators are looked through, to the function they wrap.
+    """
+    if not inspect.ismodule(item):
+        if item not in _function_hashes:
+            _function_hashes[item] = hashlib.sha256(inspect.getsource(inspect.unwrap(item)).encode()).hexdigest()
+        return _function_hashes[item]
+    if item.__file__ not in _source_hashes:
+        with open(item.__file__, 'rb') as file:
+            _source_hashes[item.__file__] = hashlib.sha256(file.read()).hexdigest()
+    return _source_hashes[item.__file__]
+
+def _file_hash(file_path):
+    """
+    Hash of the content of an input file, read in chunks.
+    """
+    with open(file_path, 'rb') as file:
+        return hashlib.file_digest(file, 'sha256').hexdigest()
+
+def _output_signatures(file_paths):
+    """
+    The size and modification time of every output file of a stage, or None for a file that doesn't exist.
+    """
+    signatures = {}
+    for file_path in file_paths:
+        if os.path.exists(file_path):
+            stat = os.stat(file_path)
+            signatures[file_path] = [stat.st_size, stat.st_mtime_ns]
+        else:
+            signatures[file_path] = None
+    return signatures
+
+def stage_fingerprint(graph, name, fingerprints=None):
+    """
+    Fingerprint of a stage - a hash of its code, its parameters, the content of its input files, and the fingerprints
+    of its input stages. A change anywhere upstream changes the fingerprints of every stage below it, and only those.
+
+    Args:
+        graph (dict): The stages, by name.
+        name (str): Name of the stage.
+        fingerprints (dict): Fingerprints already computed in this run, by stage name. Filled in place.
+
+    Returns:
+        str: The SHA-256 hex digest of the stage.
+    """
+    fingerprints = {} if fingerprints is None else fingerprints
+    if name in fingerprints:
+        return fingerprints[name]
+    stage = graph[name]
+    digest = hashlib.sha256(name.encode())
+    for item in stage['code']:
+        digest.update(_source_hash(item).encode())
+    # Sorted keys, so the order the parameters were given in doesn't matter.
+    digest.update(json.dumps(stage['params'], sort_keys=True, default=repr).encode())
+    for param in stage['file_params']:
+        digest.update(_file_hash(stage['params'][param]).encode())
+    for input_name in stage['inputs']:
+        digest.update(stage_fingerprint(graph, input_name, fingerprints).encode())
+    fingerprints[name] = digest.hexdigest()
+    return fingerprints[name]
+
+def load_index(store_dir):
+    """
+    Load the index of an artifact store - the stage, size and last use time of every artifact, by its fingerprint.
+    Returns an empty index if there is none yet.
+    """
+    index_path = os.path.join(store_dir, 'index.json')
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path) as file:
+        return json.load(file)
+
+def save_index(store_dir, index):
+    """
+    Save the index of an artifact store atomically, so an interrupted run never leaves half an index.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    index_path = os.path.join(store_dir, 'index.json')
+    with open(index_path + '.tmp', 'w') as file:
+        json.dump(index, file, indent=2)
+    os.replace(index_path + '.tmp', index_path)
+
+def load_artifact(store_dir, index, key):
+    """
+    Load the output of a stage from the artifact store, and record that it was used now.
+
+    Args:
+        store_dir (str): Folder of the artifact store.
+        index (dict): Its index. Changed in place.
+        key (str): The fingerprint of the stage.
+
+    Returns:
+        found (bool): Whether the artifact is in the store.
+        value: The output of the stage, or None if it was not found.
+    """
+    artifact_path = os.path.join(store_dir, f"{key}.pkl")
+    if key not in index or not os.path.exists(artifact_path):
+        index.pop(key, None)
+        return False, None
+    try:
+        with open(artifact_path, 'rb') as file:
+            value = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        # A damaged artifact is computed again.
+        logger.warning("Could not read the artifact of %s - computing it again", index[key]['stage'])
+        del index[key]
+        return False, None
+    index[key]['last_used'] = time.time()
+    return True, value
+
+def save_artifact(store_dir, index, key, value, stage, output_files=()):
+    """
+    Save the output of a stage in the artifact store. It is written to a temporary file first, so a
+    run that is interrupted never leaves half an artifact.
+
+    Args:
+        store_dir (str): Folder of the artifact store.
+        index (dict): Its index. Changed in place.
+        key (str): The fingerprint of the stage.
+        value: The output of the stage.
+        stage (str): Name of the stage, for the index.
+        output_files (tuple): Paths of the files the stage wrote - their size and mtime are kept in the index, to check them before loading.
+
+    Returns:
+        bool: Whether it was saved - outputs that can't be pickled are not.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    artifact_path = os.path.join(store_dir, f"{key}.pkl")
+    try:
+        with open(artifact_path + '.tmp', 'wb') as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError) as error:
+        logger.warning("Could not save the output of %s: %s", stage, error)
+        os.remove(artifact_path + '.tmp')
+        return False
+    os.replace(artifact_path + '.tmp', artifact_path)
+    index[key] = {'stage': stage, 'size': os.path.getsize(artifact_path), 'last_used': time.time()}
+    if output_files:
+        index[key]['output_files'] = _output_signatures(output_files)
+    return True
+
+def evict_artifacts(store_dir, index, max_bytes, keep=()):
+    """
+    Remove the least recently used artifacts until the store fits in max_bytes.
+
+    Args:
+        store_dir (str): Folder of the artifact store.
+        index (dict): Its index. Changed in place.
+        max_bytes (int): The size limit of the store.
+        keep (iterable): Fingerprints that are never removed - the artifacts of the current run.
+
+    Returns:
+        evicted (list): The stage names of the removed artifacts.
+    """
+    keep = set(keep)
+    total = sum(entry['size'] for entry in index.values())
+    evicted = []
+    for key, entry in sorted(index.items(), key=lambda item: item[1]['last_used']):
+        if total <= max_bytes:
+            break
+        if key in keep:
+            continue
+        artifact_path = os.path.join(store_dir, f"{key}.pkl")
+        if os.path.exists(artifact_path):
+            os.remove(artifact_path)
+        total -= entry['size']
+        evicted.append(entry['stage'])
+        del index[key]
+    return evicted
+
+def run_stages(graph, targets, store_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Compute the outputs of some stages of a graph - loading every stage whose fingerprint is in the artifact store,
+    and running only the ones that changed. The inputs of a stage that is loaded are not even computed - unless
+    they write files (output_params) that were deleted or changed since, then they run again to write them.
+
+    Args:
+        graph (dict): The stages, by name.
+        targets (list): Names of the stages to compute.
+        store_dir (str): Folder of the artifact store. None runs every stage and saves nothing.
+        max_bytes (int): The size limit of the artifact store.
+
+    Returns:
+        outputs (dict): The output of every target, by name.
+        report (dict): The names of the stages that were 'computed' and 'loaded', in order, and of the artifacts 'evicted'.
+    """
+    index = load_index(store_dir) if store_dir is not None else {}
+    fingerprints = {}
+    values = {}
+    report = {'computed': [], 'loaded': [], 'evicted': []}
+
+    def resolve(name):
+        if name in values:
+            return values[name]
+        stage = graph[name]
+        key = stage_fingerprint(graph, name, fingerprints)
+        if store_dir is not None and stage['persist']:
+            # The saved output is only as good as the files the stage wrote with it - a deleted or changed one runs the stage again.
+            if not outputs_intact(name):
+                logger.info("The output files of %s are missing or changed - computing it again", name)
+                found, value = False, None
+            else:
+                found, value = load_artifact(store_dir, index, key)
+            if found:
+                logger.debug("Loaded %s from the artifact store", name)
+                report['loaded'].append(name)
+                values[name] = value
+                return value
+        # Computing the inputs first - each of them is loaded or computed the same way.
+        args = [resolve(input_name) for input_name in stage['inputs']]
+        logger.debug("Computing %s", name)
+        with trace_stage(f"stage {name}", category='stage_graph'):
+            value = stage['function'](*args, **stage['params'], **stage['options'])
+        if store_dir is not None and stage['persist']:
+            save_artifact(store_dir, index, key, value, name, [stage['params'][param] for param in stage['output_params']])
+        report['computed'].append(name)
+        values[name] = value
+        return value
+
+    def outputs_intact(name):
+        # Whether the files the stage wrote are as they were when its output was saved.
+        stage = graph[name]
+        output_files = [stage['params'][param] for param in stage['output_params']]
+        return not output_files or index.get(stage_fingerprint(graph, name, fingerprints), {}).get('output_files') == _output_signatures(output_files)
+
+    def upstream(name, seen):
+        for input_name in graph[name]['inputs']:
+            if input_name not in seen:
+                seen.add(input_name)
+                upstream(input_name, seen)
+        return seen
+
+    outputs = {name: resolve(name) for name in targets}
+    if store_dir is not None:
+        # Stages whose outputs were loaded never ran their inputs - but the files those inputs write must still be there.
+        for name in sorted(set().union(*(upstream(target, {target}) for target in targets))):
+            if name not in values and graph[name]['persist'] and not outputs_intact(name):
+                resolve(name)
+        used = [fingerprints[name] for name in values]
+        report['evicted'] = evict_artifacts(store_dir, index, max_bytes, keep=used)
+        save_index(store_dir, index)
+    logger.info("Stages computed: %d, loaded: %d, artifacts evicted: %d", len(report['computed']), len(report['loaded']), len(report['evicted']))
+    return outputs, report
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# The columns of EEG_data.csv and clean_eeg_data.csv, in their order.
+EEG_COLUMNS = ['VideoID', 'SubjectID', 'predefinedlabel', 'user-definedlabeln', 'Attention', 'Mediation', 'Raw',
+               'Delta', 'Theta', 'Alpha1', 'Alpha2', 'Beta1', 'Beta2', 'Gamma1', 'Gamma2']
+# The typical power of every band in the recordings (the median of clean_eeg_data.csv, rounded).
+BAND_SCALES = {'Delta': 600000, 'Theta': 160000, 'Alpha1': 40000, 'Alpha2': 32000,
+               'Beta1': 24000, 'Beta2': 36000, 'Gamma1': 28000, 'Gamma2': 14000}
+
+def generate_eeg_data(n_subjects=10, n_videos=10, rows_per_video=128, confusion_effect=0.2, seed=0):
+    """
+    Generate a synthetic EEG dataset with the schema of EEG_data.csv, at any size - for benchmarks and tests.
+    Every subject watches every video, and every video gives rows_per_video rows. As in the real data, the
+    second half of the videos is confusing by design, and every subject reports some videos as confusing.
+    Band powers are log-normal, and a bit higher (by confusion_effect, in log scale) in confusing videos.
+
+    Args:
+        n_subjects (int): Number of subjects.
+        n_videos (int): Number of videos per subject.
+        rows_per_video (int): Number of rows per subject and video. 1 gives a table like clean_eeg_data.csv.
+        confusion_effect (float): How much higher the band powers are in the videos a subject found confusing.
+        seed (int): Seed of the random values - the same arguments always give the same data.
+
+    Returns:
+        eeg_data (pd.DataFrame): The synthetic dataset. All the columns are floats, like the CSV files.
+    """
+    rng = np.random.default_rng(seed)
+    n_events = n_subjects * n_videos
+    n_rows = n_events * rows_per_video
+
+    # One event per subject and video, repeated for all its rows.
+    video_ids = np.tile(np.arange(n_videos), n_subjects)
+    subject_ids = np.repeat(np.arange(n_subjects), n_videos)
+    predefined = (video_ids >= n_videos // 2).astype(np.float64)
+    # Subjects mostly agree with the predefined label.
+    user_defined = np.where(rng.random(n_events) < 0.7, predefined, 1 - predefined)
+    events = np.repeat(np.arange(n_events), rows_per_video)
+
+    eeg_data = {
+        'VideoID': video_ids[events].astype(np.float64),
+        'SubjectID': subject_ids[events].astype(np.float64),
+        'predefinedlabel': predefined[events],
+        'user-definedlabeln': user_defined[events],
+        'Attention': np.clip(rng.normal(45, 20, n_rows).round(), 0, 100),
+        'Mediation': np.clip(rng.normal(50, 20, n_rows).round(), 0, 100),
+        'Raw': rng.normal(60, 150, n_rows).round(),
+    }
+    # Every subject has their own baseline, and confusion shifts all the bands.
+    subject_baseline = rng.normal(0, 0.3, n_subjects)[subject_ids[events]]
+    shift = subject_baseline + confusion_effect * user_defined[events]
+    for band, scale in BAND_SCALES.items():
+        eeg_data[band] = (scale * np.exp(shift + rng.normal(0, 0.8, n_rows))).round()
+    return pd.DataFrame(eeg_data, columns=EEG_COLUMNS)
+
+def write_eeg_data(file_path, chunk_subjects=1000, n_subjects=10, **kwargs):
+    """
+    Write a synthetic EEG dataset to a CSV file, generating it a block of subjects at a time, so large datasets never have to fit in memory.
+
+    Args:
+        file_path (str): Path of the CSV file.
+        chunk_subjects (int): Number of subjects generated at a time.
+        n_subjects (int): Number of subjects.
+        **kwargs: The other arguments of generate_eeg_data. Every block gets its own seed from seed.
+
+    Returns:
+        n_rows (int): Number of rows written.
+    """
+    seed = kwargs.pop('seed', 0)
+    n_rows = 0
+    for block, first in enumerate(range(0, n_subjects, chunk_subjects)):
+        chunk = generate_eeg_data(n_subjects=min(chunk_subjects, n_subjects - first), seed=(seed, block), **kwargs)
+        chunk['SubjectID'] += first
+        chunk.to_csv(file_path, mode='w' if block == 0 else 'a', header=block == 0, index=False)
+        n_rows += len(chunk)
+    return n_rows
@@ -1,8 +1,12 @@
 import unittest
+import numpy as np
 import pandas as pd
 import os
 import sys
-from src.data_analysis import load_and_prepare_data,check_normality, align_data, perform_t_tests,train_and_evaluate_decision_tree
+from scipy.stats import shapiro, ttest_rel
+from src.data_analysis import load_and_prepare_data,check_normality, align_data, perform_t_tests,train_and_evaluate_decision_tree, batched_normality, paired_t_tests, align_positions, group_folds, cross_validate_decision_tree
+from src.data_analysis import check_normality_by_label, align_label_positions, perform_t_tests_by_label
+from src.synthetic_data import generate_eeg_data
 
 
 class test_data_analysis(unittest.TestCase):
@@ -58,6 +62,27 @@ class test_data_analysis(unittest.TestCase):
         self.assertIn('Theta', normal_columns)
         self.assertIn('Alpha1', normal_columns)
 
+    def test_batched_statistics_match_scipy(self):
+        """
+        Testing that batched_normality and paired_t_tests from data_analysis.py give the same results as testing column by column.
+        """
+        eeg_data, not_confusing, confusing = load_and_prepare_data(self.test_file_path, 'user-definedlabeln')
+        not_confusing, confusing = align_data(not_confusing, confusing)
+        columns = ['Theta', 'Alpha1']
+
+        normality = batched_normality(not_confusing, confusing, columns, n_workers=2)
+        t_tests = paired_t_tests(not_confusing, confusing, columns)
+
+        for col in columns:
+            # Shapiro-Wilk for both groups.
+            row = normality[(normality['column'] == col) & (normality['group'] == 'confusing')].iloc[0]
+            self.assertAlmostEqual(row['p_value'], shapiro(confusing[col]).pvalue)
+            # Paired t-test.
+            row = t_tests[t_tests['column'] == col].iloc[0]
+            expected = ttest_rel(confusing[col], not_confusing[col])
+            self.assertAlmostEqual(row['t_stat'], expected.statistic)
+            self.assertAlmostEqual(row['p_value'], expected.pvalue)
+
     def test_align_data(self):
         """
         Testing the align_data function from data_analysis.py to ensure it aligns the datasets correctly.
@@ -87,6 +112,63 @@ class test_data_analysis(unittest.TestCase):
         self.assertTrue((not_confusing_aligned['SubjectID'] == confusing_aligned['SubjectID']).all())
 
 
+    def test_align_positions_pairs_by_sequence(self):
+        """
+        Testing that align_positions from data_analysis.py pairs the n-th video of a subject in one group with its n-th video in the other.
+        """
+        not_confusing = pd.DataFrame({'SubjectID': [2, 1, 2, 1, 3], 'VideoID': [10, 11, 12, 13, 14]})
+        confusing = pd.DataFrame({'SubjectID': [1, 2, 2, 2, 1], 'VideoID': [20, 21, 22, 23, 24]})
+
+        not_confusing_positions, confusing_positions = align_positions(not_confusing, confusing)
+
+        # Subject 1 and 2 keep two pairs each, subject 3 has no pair.
+        self.assertEqual(list(not_confusing['VideoID'].take(not_confusing_positions)), [11, 13, 10, 12])
+        self.assertEqual(list(confusing['VideoID'].take(confusing_positions)), [20, 24, 21, 22])
+
+    def test_statistics_by_label_match_per_label(self):
+        """
+        Testing that the batched statistics of several labels give the same results as analyzing one label at a time.
+        """
+        data = generate_eeg_data(n_subjects=10, n_videos=10, rows_per_video=1, seed=3)
+        label_cols = ['predefinedlabel', 'user-definedlabeln']
+        columns = ['Attention', 'Mediation', 'Raw', 'Theta', 'Alpha1']
+        excluded = [column for column in data.columns if column not in columns]
+
+        normal_columns = check_normality_by_label(data, label_cols, columns)
+        pairs = align_label_positions(data, label_cols)
+        t_test_results = perform_t_tests_by_label(data, pairs, {label_col: columns for label_col in label_cols})
+        for label_col in label_cols:
+            not_confusing, confusing = data[data[label_col] == 0], data[data[label_col] == 1]
+            self.assertEqual(normal_columns[label_col], check_normality(not_confusing, confusing, columns_to_exclude=excluded))
+            # The same pairs, as rows of the whole table.
+            not_confusing_positions, confusing_positions = align_positions(not_confusing, confusing)
+            np.testing.assert_array_equal(pairs[label_col][0], np.flatnonzero(data[label_col] == 0)[not_confusing_positions])
+            np.testing.assert_array_equal(pairs[label_col][1], np.flatnonzero(data[label_col] == 1)[confusing_positions])
+            for column in columns:
+                expected = ttest_rel(confusing[column].to_numpy()[confusing_positions], not_confusing[column].to_numpy()[not_confusing_positions])
+                self.assertAlmostEqual(t_test_results[label_col][column]['t_stat'], expected.statistic, places=10)
+                self.assertAlmostEqual(t_test_results[label_col][column]['p_value'], expected.pvalue, places=10)
+
+    def test_align_missing_subject(self):
+        """
+        Testing that rows without a SubjectID are left out of the pairs, instead of failing the alignment.
+        """
+        not_confusing = pd.DataFrame({'SubjectID': [1, np.nan, 2, 3], 'Theta': [1.0, 2.0, 3.0, 4.0]})
+        confusing = pd.DataFrame({'SubjectID': [np.nan, 2, 1], 'Theta': [5.0, 6.0, 7.0]})
+
+        not_confusing_positions, confusing_positions = align_positions(not_confusing, confusing)
+        self.assertEqual(list(not_confusing_positions), [0, 2])
+        self.assertEqual(list(confusing_positions), [2, 1])
+
+        # Only the asked columns are taken.
+        not_confusing_aligned, confusing_aligned = align_data(not_confusing, confusing, columns=['Theta'])
+        self.assertEqual(list(not_confusing_aligned['Theta']), [1.0, 3.0])
+        self.assertEqual(list(confusing_aligned.columns), ['Theta'])
+
+        data = pd.concat([not_confusing.assign(label=0), confusing.assign(label=1)], ignore_index=True)
+        pairs = align_label_positions(data, ['label'])
+        self.assertEqual(list(data['Theta'].take(pairs['label'][1])), [7.0, 6.0])
+
     def test_perform_t_tests(self):
         """
         Testing the perform_t_tests function from data_analysis.py to ensure it runs paired t-tests correctly.
@@ -125,6 +207,66 @@ class test_data_analysis(unittest.TestCase):
         except Exception as e:
             self.fail(f"Decision tree training and evaluation failed: {e}")
 
+    def test_decision_tree_results_are_reproducible(self):
+        """
+        Testing that train_and_evaluate_decision_tree returns the same results for a given seed, with or without a process pool.
+        """
+        data, not_confusing, confusing = load_and_prepare_data(self.test_file_path, 'predefinedlabel')
+        columns_to_exclude = ['VideoID', 'SubjectID', 'user-definedlabeln']
+
+        serial = train_and_evaluate_decision_tree(data, 'predefinedlabel', columns_to_exclude, n_experiments=20, random_state=7)
+        parallel = train_and_evaluate_decision_tree(data, 'predefinedlabel', columns_to_exclude, n_experiments=20, n_workers=2, random_state=7)
+
+        # Checking the structure of the results.
+        for metric in ['accuracy', 'precision', 'recall']:
+            self.assertEqual(len(serial[metric]['per_experiment']), 20)
+            self.assertAlmostEqual(serial[metric]['mean'], serial[metric]['per_experiment'].mean())
+            self.assertTrue(np.array_equal(serial[metric]['per_experiment'], parallel[metric]['per_experiment']))
+
+    def test_group_folds(self):
+        """
+        Testing that group_folds never puts a subject in two folds, and gives the same folds for the same seed.
+        """
+        folds = group_folds(self.sample_data['SubjectID'], n_splits=5, n_repeats=3, random_state=0)
+        self.assertEqual(folds.shape, (3, 20))
+        for repeat in folds:
+            # Every subject is in one fold, and every fold has two subjects.
+            self.assertTrue((pd.Series(repeat).groupby(self.sample_data['SubjectID'].to_numpy()).nunique() == 1).all())
+            self.assertEqual(np.bincount(repeat).tolist(), [4, 4, 4, 4, 4])
+        np.testing.assert_array_equal(folds, group_folds(self.sample_data['SubjectID'].to_numpy(), n_splits=5, n_repeats=3, random_state=0))
+
+        # Group-shuffle splits - 30% of the subjects are tested, the rest is only trained on.
+        shuffle_folds = group_folds(self.sample_data['SubjectID'], n_repeats=4, test_size=0.3, random_state=0)
+        self.assertEqual((shuffle_folds == 0).sum(axis=1).tolist(), [6, 6, 6, 6])
+
+    def test_folds_without_subject(self):
+        """
+        Testing that a row without a SubjectID is never given another subject's fold - group_folds rejects it,
+        and the cross-validation leaves it out.
+        """
+        data = self.sample_data.copy()
+        data.loc[[0, 7], 'SubjectID'] = np.nan
+        with self.assertRaises(ValueError):
+            group_folds(data['SubjectID'], n_splits=2, random_state=0)
+        with self.assertLogs('src.data_analysis', level='WARNING') as logs:
+            results = cross_validate_decision_tree(data, 'predefinedlabel', ['VideoID', 'user-definedlabeln'], n_splits=2, random_state=0)
+        self.assertIn("Leaving out 2 rows", logs.output[0])
+        expected = cross_validate_decision_tree(data.drop(index=[0, 7]), 'predefinedlabel', ['VideoID', 'user-definedlabeln'], n_splits=2, random_state=0)
+        np.testing.assert_array_equal(results['accuracy']['per_fold'], expected['accuracy']['per_fold'])
+
+    def test_cross_validate_decision_tree(self):
+        """
+        Testing that the subject-grouped cross-validation reports every fold, the same for any number of workers.
+        """
+        columns_to_exclude = ['VideoID', 'user-definedlabeln']
+        serial = cross_validate_decision_tree(self.sample_data, 'predefinedlabel', columns_to_exclude, n_splits=5, n_repeats=2, random_state=3)
+        parallel = cross_validate_decision_tree(self.sample_data, 'predefinedlabel', columns_to_exclude, n_splits=5, n_repeats=2, n_workers=2, random_state=3)
+        self.assertEqual(len(serial['splits']), 10)
+        for metric in ['accuracy', 'precision', 'recall']:
+            self.assertEqual(len(serial[metric]['per_fold']), 10)
+            self.assertAlmostEqual(serial[metric]['var'], serial[metric]['per_fold'].var())
+            np.testing.assert_array_equal(serial[metric]['per_fold'], parallel[metric]['per_fold'])
+
 if __name__ == "__main__":
     # Add the project root directory to sys.path
     project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
@@ -0,0 +1,59 @@
+import unittest
+import os
+import sys
+import numpy as np
+from scipy.signal import welch
+from src.band_power import BAND_EDGES, band_powers, band_power_table
+
+class test_band_power(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. 20 seconds of a 10.5 Hz (Alpha2) rhythm in noise, at the headset's sampling rate.
+        """
+        self.fs = 512
+        time = np.arange(20 * self.fs) / self.fs
+        rng = np.random.default_rng(0)
+        self.signal = 3 * np.sin(2 * np.pi * 10.5 * time) + rng.normal(0, 1, len(time))
+
+    def test_matches_welch(self):
+        """
+        Testing that band_powers gives the band powers of scipy's Welch PSD, for every window.
+        """
+        powers = band_powers(self.signal, self.fs, window_seconds=2, step_seconds=0.5, dtype=np.float64)
+        self.assertEqual(powers.shape, (37, len(BAND_EDGES)))
+        for window in (0, 3, 36):
+            start = window * self.fs // 2
+            freqs, psd = welch(self.signal[start:start + 2 * self.fs], self.fs, nperseg=self.fs)
+            expected = [psd[(freqs >= low) & (freqs <= high)].sum() * (freqs[1] - freqs[0]) for low, high in BAND_EDGES.values()]
+            np.testing.assert_allclose(powers[window], expected, rtol=1e-6)
+
+    def test_channels_and_float32(self):
+        """
+        Testing that several channels are computed like one channel each, and that float32 stays close to float64.
+        """
+        channels = np.stack([self.signal, 2 * self.signal])
+        powers = band_powers(channels, self.fs)
+        self.assertEqual(powers.dtype, np.float32)
+        self.assertEqual(powers.shape, (2, 20, len(BAND_EDGES)))
+        np.testing.assert_allclose(powers[0], band_powers(self.signal, self.fs), rtol=1e-5)
+        # Twice the amplitude is four times the power.
+        np.testing.assert_allclose(powers[1], 4 * powers[0], rtol=1e-4)
+        np.testing.assert_allclose(powers[0], band_powers(self.signal, self.fs, dtype=np.float64), rtol=1e-3)
+
+    def test_band_power_table(self):
+        """
+        Testing that band_power_table has the columns of the EEG data, and that the rhythm is in its band.
+        """
+        table = band_power_table(self.signal, self.fs)
+        self.assertEqual(list(table.columns), ['Time'] + list(BAND_EDGES))
+        self.assertEqual(len(table), 20)
+        self.assertTrue((table[list(BAND_EDGES)].idxmax(axis=1) == 'Alpha2').all())
+        # A signal shorter than a window has no rows.
+        self.assertEqual(len(band_power_table(self.signal[:100], self.fs)), 0)
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
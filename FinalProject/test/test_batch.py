@@ -0,0 +1,121 @@
+import unittest
+import json
+import os
+import shutil
+import sys
+import tempfile
+import pandas as pd
+from src.synthetic_data import write_eeg_data
+from src.batch import find_recordings, load_batch_manifest, run_batch
+
+class test_batch(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. Two small synthetic recordings and a file that can't be cleaned.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.temp_dir, "incoming")
+        self.output_dir = os.path.join(self.temp_dir, "output")
+        os.makedirs(self.input_dir)
+        for session in range(2):
+            write_eeg_data(os.path.join(self.input_dir, f"session_{session}.csv"), n_subjects=5, n_videos=4, rows_per_video=3, seed=session)
+        with open(os.path.join(self.input_dir, "broken.csv"), 'w') as file:
+            file.write("a,b\n1,2\n")
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary folder.
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_find_recordings(self):
+        """
+        Testing that find_recordings takes both a folder and a glob pattern.
+        """
+        self.assertEqual(len(find_recordings(self.input_dir)), 3)
+        self.assertEqual([os.path.basename(path) for path in find_recordings(os.path.join(self.input_dir, "session_*.csv"))], ["session_0.csv", "session_1.csv"])
+
+    def test_run_batch_and_resume(self):
+        """
+        Testing that run_batch processes every recording into its own folder, merges them, and skips them in the next run.
+        """
+        with self.assertLogs('src.batch', level='ERROR'):
+            report = run_batch(self.input_dir, self.output_dir, ['predefinedlabel'], stages=('stats',), n_workers=1)
+        self.assertEqual(len(report['processed']), 2)
+        self.assertEqual([os.path.basename(path) for path in report['failed']], ["broken.csv"])
+        self.assertIn('t_test_results', report['cohort_results']['predefinedlabel'])
+
+        # Every finished recording has its cleaned table and results, and is in the manifest.
+        manifest = load_batch_manifest(self.output_dir)
+        self.assertEqual(len(manifest), 2)
+        for entry in manifest.values():
+            self.assertEqual(entry['events'], 20)
+            with open(os.path.join(self.output_dir, entry['output_dir'], "results.json")) as file:
+                self.assertIn('predefinedlabel', json.load(file))
+        # The cohort table has the events of both recordings, with the output folder of each as its session.
+        cohort = pd.read_csv(os.path.join(self.output_dir, "cohort_eeg_data.csv"))
+        self.assertEqual(len(cohort), 40)
+        self.assertEqual(sorted(cohort['Session'].unique()), sorted(entry['output_dir'] for entry in manifest.values()))
+
+        # The next run only tries the recording that failed.
+        with self.assertLogs('src.batch', level='ERROR'):
+            report = run_batch(self.input_dir, self.output_dir, ['predefinedlabel'], stages=('stats',), n_workers=1, merge=False)
+        self.assertEqual((len(report['processed']), len(report['skipped']), len(report['failed'])), (0, 2, 1))
+
+    def test_recordings_with_few_subjects(self):
+        """
+        Testing that recordings of one or two subjects are finished and merged, with the parts of the analysis they can't run
+        reported per stage instead of failing the recording.
+        """
+        few_dir = os.path.join(self.temp_dir, "few")
+        os.makedirs(few_dir)
+        for n_subjects in (1, 2):
+            write_eeg_data(os.path.join(few_dir, f"subjects_{n_subjects}.csv"), n_subjects=n_subjects, n_videos=4, rows_per_video=3, seed=n_subjects)
+        with self.assertLogs('src.batch', level='WARNING') as logs:
+            report = run_batch(few_dir, self.output_dir, ['predefinedlabel'], stages=('stats', 'model'), n_workers=1, n_repeats=1)
+        self.assertEqual((len(report['processed']), report['failed']), (2, []))
+        self.assertIn("Too few subjects", "\n".join(logs.output))
+
+        # One subject has no folds - two subjects get two folds, instead of failing to make five.
+        failed_stages = {os.path.basename(path): stages for path, stages in report['failed_stages'].items()}
+        self.assertIn('model', failed_stages['subjects_1.csv'])
+        self.assertNotIn('model', failed_stages.get('subjects_2.csv', {}))
+        manifest = load_batch_manifest(self.output_dir)
+        for entry in manifest.values():
+            with open(os.path.join(self.output_dir, entry['output_dir'], "results.json")) as file:
+                results = json.load(file)['predefinedlabel']
+            self.assertEqual('model_results' in results, entry['events'] == 8)
+        self.assertEqual(len(pd.read_csv(os.path.join(self.output_dir, "cohort_eeg_data.csv"))), 12)
+
+        # They are finished - the next run doesn't try them again.
+        report = run_batch(few_dir, self.output_dir, ['predefinedlabel'], stages=('stats', 'model'), n_workers=1, merge=False)
+        self.assertEqual(len(report['skipped']), 2)
+
+    def test_cohort_is_the_batch(self):
+        """
+        Testing that a new recording doesn't change the sessions of the others, and that only the recordings of the source are merged.
+        """
+        cohort_path = os.path.join(self.output_dir, "cohort_eeg_data.csv")
+        run_batch(os.path.join(self.input_dir, "session_1.csv"), self.output_dir, ['predefinedlabel'], stages=(), n_workers=1)
+        sessions = pd.read_csv(cohort_path)['Session']
+        self.assertEqual(sessions.nunique(), 1)
+
+        # session_0 sorts before session_1, but session_1 keeps its session.
+        run_batch(os.path.join(self.input_dir, "session_*.csv"), self.output_dir, ['predefinedlabel'], stages=(), n_workers=1)
+        cohort = pd.read_csv(cohort_path)
+        self.assertEqual(cohort['Session'].nunique(), 2)
+        self.assertEqual((cohort['Session'] == sessions[0]).sum(), 20)
+
+        # A batch of session_0 alone merges only session_0, although the manifest has both.
+        run_batch(os.path.join(self.input_dir, "session_0.csv"), self.output_dir, ['predefinedlabel'], stages=(), n_workers=1)
+        cohort = pd.read_csv(cohort_path)
+        self.assertEqual(len(load_batch_manifest(self.output_dir)), 2)
+        self.assertEqual(len(cohort), 20)
+        self.assertNotIn(sessions[0], set(cohort['Session']))
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
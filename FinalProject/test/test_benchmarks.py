@@ -0,0 +1,48 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+from benchmarks.run_benchmarks import run_benchmarks, append_history, load_history, compare_with_baseline
+
+class test_benchmarks(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. Creating a temporary folder for the data, the plots and the history.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.history_path = os.path.join(self.temp_dir, "history.jsonl")
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary folder.
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_run_benchmarks(self):
+        """
+        Testing that every stage is benchmarked, saved to the history, and compared with the previous run.
+        """
+        size = {'n_subjects': 5, 'n_videos': 4, 'rows_per_video': 3}
+        records = run_benchmarks(size, repeat=1, n_experiments=2, work_dir=self.temp_dir)
+        self.assertEqual([record['stage'] for record in records], [
+            'load_and_check_data', 'clean_and_save_data', 'check_normality', 'align_data', 'perform_t_tests',
+            'train_and_evaluate_decision_tree', 'cross_validate_decision_tree', 'plot_histograms', 'plot_boxplot', 'plot_paired_lines'])
+        self.assertEqual(records[0]['n_raw_rows'], 60)
+        self.assertTrue(all(record['seconds_min'] > 0 and record['peak_mb'] > 0 for record in records))
+
+        append_history(records, self.history_path)
+        self.assertEqual(load_history(self.history_path), records)
+
+        # A run twice as slow is a regression.
+        slower = [dict(record, run_id='next', seconds_min=2 * record['seconds_min'] + 1) for record in records]
+        comparison = compare_with_baseline(slower, load_history(self.history_path))
+        self.assertEqual(len(comparison), len(records))
+        self.assertTrue(comparison['regression'].all())
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
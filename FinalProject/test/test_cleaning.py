@@ -1,8 +1,9 @@
 import unittest
+import numpy as np
 import pandas as pd
 import os
 import sys
-from src.data_cleaning import load_and_check_data, clean_and_save_data
+from src.data_cleaning import load_and_check_data, clean_and_save_data, stream_clean_and_save_data
 
 class test_data_cleaning(unittest.TestCase):
 
@@ -67,6 +68,49 @@ class test_data_cleaning(unittest.TestCase):
         grouped = loaded_data.groupby(['VideoID', 'SubjectID', 'predefinedlabel', 'user-definedlabeln']).mean().reset_index()
         pd.testing.assert_frame_equal(cleaned_data, grouped)
 
+    def test_stream_clean_and_save_data(self):
+        """
+        Testing the stream_clean_and_save_data function from data_cleaning.py to ensure reading in chunks gives the same cleaned data.
+        """
+        # Adding a duplicate row and a missing value, and spreading the events over several chunks.
+        raw_data = pd.concat([self.sample_data, self.sample_data.iloc[[0]], self.sample_data.iloc[::-1]], ignore_index=True).astype(float)
+        raw_data.loc[3, 'Theta'] = None
+        raw_data.to_csv(self.test_file_path, index=False)
+
+        # Calling the function, with small chunks.
+        with self.assertLogs('src.data_cleaning', level='WARNING') as logs:
+            streamed = stream_clean_and_save_data(self.test_file_path, self.output_file_path, chunksize=4)
+        self.assertIn(f"Number of duplicate rows: {raw_data.duplicated().sum()}", "\n".join(logs.output))
+
+        # Checking the streamed data is the same as the in-memory cleaning.
+        expected = raw_data.groupby(['VideoID', 'SubjectID', 'predefinedlabel', 'user-definedlabeln']).mean().reset_index()
+        pd.testing.assert_frame_equal(streamed, expected, check_exact=True)
+        pd.testing.assert_frame_equal(pd.read_csv(self.output_file_path), expected)
+
+    def test_stream_clean_is_exact(self):
+        """
+        Testing that streaming a larger file, in chunks that split the events, saves exactly the file clean_and_save_data saves,
+        and counts duplicates with only a few fingerprints in memory at a time.
+        """
+        rng = np.random.default_rng(0)
+        raw_data = pd.DataFrame({'VideoID': rng.integers(0, 10, 5000), 'SubjectID': rng.integers(0, 10, 5000),
+                                 'predefinedlabel': 0, 'user-definedlabeln': 1,
+                                 'Theta': rng.lognormal(10, 2, 5000), 'Alpha1': rng.normal(0, 1e6, 5000)})
+        raw_data['predefinedlabel'] = raw_data['VideoID'] % 2
+        # 300 duplicate rows, far apart from their originals.
+        raw_data = pd.concat([raw_data, raw_data.iloc[:300]], ignore_index=True)
+        raw_data.to_csv(self.test_file_path, index=False)
+        expected_path = "test_expected_eeg_data.csv"
+        self.addCleanup(os.remove, expected_path)
+
+        expected = clean_and_save_data(pd.read_csv(self.test_file_path), expected_path)
+        with self.assertLogs('src.data_cleaning', level='WARNING') as logs:
+            streamed = stream_clean_and_save_data(self.test_file_path, self.output_file_path, chunksize=97)
+        self.assertIn("Number of duplicate rows: 300", "\n".join(logs.output))
+        pd.testing.assert_frame_equal(streamed, expected, check_exact=True)
+        with open(self.output_file_path, 'rb') as streamed_file, open(expected_path, 'rb') as expected_file:
+            self.assertEqual(streamed_file.read(), expected_file.read())
+
 if __name__ == "__main__":
     # Add the project root directory to sys.path
     project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
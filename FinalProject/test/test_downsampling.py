@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+import os
+import sys
+from scipy.signal import argrelextrema
+from src.downsampling import downsample, downsample_chunks, minmax_downsample
+
+class test_downsampling(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. Creating a noisy signal, rounded so it has flat steps too.
+        """
+        self.signal = np.round(np.random.default_rng(0).normal(size=1001), 1)
+
+    def test_downsample(self):
+        """
+        Testing that downsample keeps the regular samples and the same extrema as argrelextrema.
+        """
+        maxima = argrelextrema(self.signal, np.greater)[0]
+        minima = argrelextrema(self.signal, np.less)[0]
+        expected = np.unique(np.concatenate((np.arange(0, len(self.signal), 5), maxima, minima)))
+
+        downsized_signal, points = downsample(self.signal, down_factor=5)
+        np.testing.assert_array_equal(points, expected)
+        np.testing.assert_array_equal(downsized_signal, self.signal[expected])
+
+    def test_downsample_chunks(self):
+        """
+        Testing that downsampling in chunks keeps the same points as the whole signal, also for extrema on the chunk edges.
+        """
+        _, expected = downsample(self.signal, down_factor=5)
+        for chunk_size in [1, 2, 3, 64]:
+            chunks = [self.signal[i:i + chunk_size] for i in range(0, len(self.signal), chunk_size)]
+            points = np.concatenate([chunk_points for _, chunk_points in downsample_chunks(chunks, down_factor=5)])
+            np.testing.assert_array_equal(points, expected)
+
+        # Several channels share the kept points.
+        channels = np.stack([self.signal, -self.signal[::-1]])
+        downsized, points = downsample(channels, down_factor=5)
+        pieces = list(downsample_chunks([channels[:, i:i + 100] for i in range(0, channels.shape[1], 100)], down_factor=5))
+        np.testing.assert_array_equal(np.concatenate([chunk_points for _, chunk_points in pieces]), points)
+        np.testing.assert_array_equal(np.concatenate([values for values, _ in pieces], axis=1), downsized)
+
+    def test_minmax_downsample(self):
+        """
+        Testing that minmax_downsample returns exactly n_out points in time order, with the minimum and maximum of the signal.
+        """
+        channels = np.stack([self.signal, self.signal ** 2])
+        downsized, points = minmax_downsample(channels, 50)
+        self.assertEqual(downsized.shape, (2, 50))
+        self.assertTrue((np.diff(points, axis=1) >= 0).all())
+        np.testing.assert_array_equal(downsized.max(axis=1), channels.max(axis=1))
+        np.testing.assert_array_equal(downsized.min(axis=1), channels.min(axis=1))
+
+        with self.assertRaises(ValueError):
+            minmax_downsample(self.signal, 7)
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
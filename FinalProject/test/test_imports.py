@@ -0,0 +1,44 @@
+import unittest
+import os
+import subprocess
+import sys
+
+# The project folder, where main.py and src are.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+# How long importing the entry point and the pipeline may take, in seconds - numpy and pandas only.
+IMPORT_BUDGET_SECONDS = 2.0
+HEAVY_MODULES = ['scipy', 'sklearn', 'matplotlib']
+
+class test_imports(unittest.TestCase):
+
+    def run_python(self, code):
+        """
+        Run Python code in a new interpreter in the project folder, and return its output.
+        """
+        result = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+        return result.stdout.split()
+
+    def test_heavy_modules_are_lazy(self):
+        """
+        Testing that importing the entry point and the pipeline modules loads none of scipy, sklearn and matplotlib.
+        """
+        loaded = self.run_python(
+            "import sys, main, src.data_cleaning, src.data_analysis, src.data_visualisation, src.analysis_pipeline\n"
+            f"print(' '.join(name for name in {HEAVY_MODULES} if name in sys.modules))")
+        self.assertEqual(loaded, [])
+
+    def test_import_budget(self):
+        """
+        Testing that importing the entry point and the pipeline fits in the import budget.
+        """
+        seconds = float(self.run_python(
+            "import time\n"
+            "start = time.perf_counter()\n"
+            "import main, src.data_cleaning, src.analysis_pipeline\n"
+            "print(time.perf_counter() - start)")[0])
+        self.assertLess(seconds, IMPORT_BUDGET_SECONDS)
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    sys.path.append(PROJECT_ROOT)
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import json
+import os
+import shutil
+import sys
+import tempfile
+import pandas as pd
+from src.instrumentation import enable_tracing, disable_tracing, save_trace, summarize_trace, trace_stage
+from src.data_analysis import align_data
+
+class test_instrumentation(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. Creating two groups of events and a temporary folder for the trace.
+        """
+        self.not_confusing = pd.DataFrame({'SubjectID': [101, 102, 103], 'Theta': [1.0, 2.0, 3.0]})
+        self.confusing = pd.DataFrame({'SubjectID': [101, 102], 'Theta': [4.0, 5.0]})
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Stopping the tracing and removing the temporary folder.
+        """
+        disable_tracing()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_calls_are_traced(self):
+        """
+        Testing that instrumented calls are saved as nested trace events, with their row counts.
+        """
+        enable_tracing(trace_memory=True)
+        with trace_stage("analysis", label_col='predefinedlabel'):
+            align_data(self.not_confusing, self.confusing)
+        disable_tracing()
+
+        trace_path = os.path.join(self.temp_dir, "trace.json")
+        self.assertEqual(save_trace(trace_path), 3)
+        with open(trace_path) as file:
+            events = {event['name']: event for event in json.load(file)['traceEvents']}
+        self.assertEqual(set(events), {'analysis', 'align_data', 'align_positions'})
+
+        # align_data gets 5 rows and returns the 2 pairs of rows.
+        self.assertEqual(events['align_data']['args']['rows_in'], 5)
+        self.assertEqual(events['align_data']['args']['rows_out'], 4)
+        self.assertIn('memory_delta_mb', events['align_data']['args'])
+        # The stage starts before the call and ends after it.
+        self.assertEqual(events['analysis']['ph'], 'X')
+        self.assertLessEqual(events['analysis']['ts'], events['align_data']['ts'])
+        self.assertGreaterEqual(events['analysis']['ts'] + events['analysis']['dur'], events['align_data']['ts'] + events['align_data']['dur'])
+        self.assertEqual(summarize_trace().loc['align_data', 'calls'], 1)
+
+    def test_disabled_tracing(self):
+        """
+        Testing that nothing is recorded when tracing is off.
+        """
+        enable_tracing()
+        disable_tracing()
+        align_data(self.not_confusing, self.confusing)
+        self.assertEqual(save_trace(os.path.join(self.temp_dir, "trace.json")), 0)
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
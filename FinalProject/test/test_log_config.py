@@ -0,0 +1,65 @@
+import unittest
+import logging
+import os
+import sys
+import tempfile
+import shutil
+import pandas as pd
+from src.log_config import LazyTable
+from src.data_cleaning import load_and_check_data
+
+class test_log_config(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. Creating a dataset with a duplicate row and saving it to a temporary CSV file.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file_path = os.path.join(self.temp_dir, "test_log_data.csv")
+        pd.DataFrame({'SubjectID': [101, 101, 102], 'Theta': [1.0, 1.0, 2.0]}).to_csv(self.test_file_path, index=False)
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary folder.
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_duplicates_summary(self):
+        """
+        Testing that load_and_check_data logs only the number of duplicate rows, and the rows themselves only at DEBUG.
+        """
+        with self.assertLogs('src.data_cleaning', level='INFO') as logs:
+            load_and_check_data(self.test_file_path)
+        self.assertIn("WARNING:src.data_cleaning:Number of duplicate rows: 1", logs.output)
+        self.assertFalse(any("Duplicate rows:" in line for line in logs.output))
+
+        with self.assertLogs('src.data_cleaning', level='DEBUG') as logs:
+            load_and_check_data(self.test_file_path)
+        self.assertTrue(any("Duplicate rows:" in line for line in logs.output))
+
+    def test_lazy_table(self):
+        """
+        Testing that a LazyTable is formatted only when its message is shown.
+        """
+        class counting_frame(pd.DataFrame):
+            calls = 0
+            def to_string(self, *args, **kwargs):
+                counting_frame.calls += 1
+                return super().to_string(*args, **kwargs)
+
+        logger = logging.getLogger('test_log_config')
+        logger.setLevel(logging.INFO)
+        logger.debug("Rows:\n%s", LazyTable(counting_frame({'Theta': [1.0]})))
+        self.assertEqual(counting_frame.calls, 0)
+
+        frame = counting_frame({'Theta': [1.0]})
+        with self.assertLogs(logger, level='INFO') as logs:
+            logger.info("Rows:\n%s", LazyTable(frame, index=False))
+        self.assertEqual(counting_frame.calls, 1)
+        self.assertEqual(logs.output, ["INFO:test_log_config:Rows:\n" + pd.DataFrame(frame).to_string(index=False)])
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
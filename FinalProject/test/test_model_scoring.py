@@ -0,0 +1,103 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from src.synthetic_data import generate_eeg_data
+from src.model_scoring import train_final_model, save_model, load_model, score_table, score_file
+from src.analysis_pipeline import run_label_analyses
+from main import main
+
+COLUMNS_TO_EXCLUDE = ['VideoID', 'SubjectID', 'user-definedlabeln']
+
+class test_model_scoring(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. A synthetic training table, new sessions to score, and a temporary folder.
+        """
+        self.train = generate_eeg_data(n_subjects=10, n_videos=10, rows_per_video=1)
+        self.new = generate_eeg_data(n_subjects=5, n_videos=10, rows_per_video=2, seed=1)
+        self.temp_dir = tempfile.mkdtemp()
+        self.model_path = os.path.join(self.temp_dir, "models", "decision_tree.pkl")
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary folder.
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_save_and_score(self):
+        """
+        Testing that a saved model keeps its feature schema, and scores like sklearn's predict - whatever the column order.
+        """
+        bundle = train_final_model(self.train, 'predefinedlabel', COLUMNS_TO_EXCLUDE, evaluation={'accuracy': {'mean': 0.5, 'std': 0.1}})
+        save_model(bundle, self.model_path)
+        loaded = load_model(self.model_path)
+        self.assertEqual(loaded['features'], ['Attention', 'Mediation', 'Raw', 'Delta', 'Theta', 'Alpha1', 'Alpha2', 'Beta1', 'Beta2', 'Gamma1', 'Gamma2'])
+        self.assertEqual(loaded['evaluation'], {'accuracy': {'mean': 0.5, 'std': 0.1}})
+
+        expected = loaded['model'].predict(self.new[loaded['features']].to_numpy(dtype=np.float32))
+        np.testing.assert_array_equal(score_table(loaded, self.new), expected)
+        np.testing.assert_array_equal(score_table(loaded, self.new[self.new.columns[::-1]]), expected)
+        with self.assertRaises(ValueError):
+            score_table(loaded, self.new.drop(columns=['Theta']))
+
+    def test_score_file(self):
+        """
+        Testing that score_file scores a table in chunks, and returns or writes the same predictions.
+        """
+        bundle = train_final_model(self.train, 'predefinedlabel', COLUMNS_TO_EXCLUDE)
+        file_path = os.path.join(self.temp_dir, "new_sessions.csv")
+        self.new.to_csv(file_path, index=False)
+
+        predictions, report = score_file(bundle, file_path, chunksize=30)
+        self.assertEqual((report['rows'], report['batches'], len(report['latency_ms'])), (100, 4, 4))
+        self.assertEqual(list(predictions.columns), ['SubjectID', 'VideoID', 'prediction'])
+        np.testing.assert_array_equal(predictions['prediction'], score_table(bundle, self.new))
+
+        output_path = os.path.join(self.temp_dir, "predictions.csv")
+        self.assertIsNone(score_file(bundle, file_path, output_path=output_path, chunksize=30)[0])
+        pd.testing.assert_frame_equal(pd.read_csv(output_path), predictions, check_dtype=False)
+
+    def test_score_command_outputs(self):
+        """
+        Testing that the score command saves the predictions of several tables in the --output folder, one file each, and of one table in the --output file.
+        """
+        save_model(train_final_model(self.train, 'predefinedlabel', COLUMNS_TO_EXCLUDE), self.model_path)
+        tables = []
+        for session in range(2):
+            tables.append(os.path.join(self.temp_dir, f"session_{session}.csv"))
+            self.new.iloc[session::2].to_csv(tables[-1], index=False)
+
+        output_dir = os.path.join(self.temp_dir, "predictions")
+        main(['score', *tables, '--model', self.model_path, '--output', output_dir])
+        for session, table in enumerate(tables):
+            predictions = pd.read_csv(os.path.join(output_dir, f"session_{session}_predictions.csv"))
+            self.assertEqual(len(predictions), 50)
+            np.testing.assert_array_equal(predictions['prediction'], score_table(load_model(self.model_path), pd.read_csv(table)))
+
+        output_path = os.path.join(self.temp_dir, "session_0_scored.csv")
+        main(['score', tables[0], '--model', self.model_path, '--output', output_path])
+        pd.testing.assert_frame_equal(pd.read_csv(output_path), pd.read_csv(os.path.join(output_dir, "session_0_predictions.csv")))
+
+    def test_pipeline_saves_models(self):
+        """
+        Testing that run_label_analyses saves the final model of every label with the model stage.
+        """
+        file_path = os.path.join(self.temp_dir, "clean.csv")
+        self.train.to_csv(file_path, index=False)
+        model_dir = os.path.join(self.temp_dir, "models")
+        run_label_analyses(file_path, ['predefinedlabel', 'user-definedlabeln'], n_repeats=1, stages=('model',), model_dir=model_dir)
+        self.assertEqual(sorted(os.listdir(model_dir)), ['decision_tree_predefined.pkl', 'decision_tree_user_defined.pkl'])
+        bundle = load_model(os.path.join(model_dir, 'decision_tree_predefined.pkl'))
+        self.assertNotIn('user-definedlabeln', bundle['features'])
+        self.assertIn('accuracy', bundle['evaluation'])
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import pandas as pd
+import os
+import shutil
+import sys
+import tempfile
+from src.analysis_pipeline import run_label_analyses
+
+class test_analysis_pipeline(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. Creating a sample dataset and a temporary folder for the plots.
+        """
+        self.sample_data = pd.DataFrame({
+        'VideoID': [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20],
+        'SubjectID': [101, 101, 102, 102, 103, 103, 104, 104, 105, 105, 106, 106, 107, 107, 108, 108, 109, 109, 110, 110],
+        'predefinedlabel': [0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1],
+        'user-definedlabeln': [1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0],
+        'Theta': [100, 300, 500, 700, 900, 1100, 1300, 1500, 1700, 1900, 2100, 2300, 2500, 2700, 2900, 3100, 3300, 3500, 3700, 3900],
+        'Alpha1': [50, 70, 90, 110, 130, 150, 170, 190, 210, 230, 250, 270, 290, 310, 330, 350, 370, 390, 410, 430]
+    })
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file_path = os.path.join(self.temp_dir, "test_pipeline_data.csv")
+        self.sample_data.to_csv(self.test_file_path, index=False)
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary folder.
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_run_label_analyses(self):
+        """
+        Testing the run_label_analyses function from analysis_pipeline.py to ensure every label is analyzed and plotted.
+        """
+        plot_root = os.path.join(self.temp_dir, "plots")
+        label_cols = ['predefinedlabel', 'user-definedlabeln']
+        results = run_label_analyses(self.test_file_path, label_cols, plot_root=plot_root, n_experiments=5)
+
+        # Every label has its own results.
+        self.assertEqual(list(results), label_cols)
+        for label_col in label_cols:
+            self.assertIn('Theta', results[label_col]['t_test_results'])
+            self.assertIn('accuracy', results[label_col]['model_results'])
+
+        # The plots are saved in the folder of each label.
+        self.assertTrue(os.path.exists(os.path.join(plot_root, "predefined", "histograms", "histogram_Theta.png")))
+        self.assertTrue(os.path.exists(os.path.join(plot_root, "user_defined", "paired_lines", "paired_lines_Theta.png")))
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+from src.data_visualisation import render_plots
+from src.plot_cache import load_manifest, save_manifest
+
+class test_plot_cache(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. Creating a temporary folder and a box plot job.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.temp_dir, "manifest.json")
+        self.plt_path = os.path.join(self.temp_dir, "boxplots", "boxplot_Theta.png")
+        self.kwargs = {'column': 'Theta', 'confusing_values': np.array([1.0, 2.0, 3.0]), 'not_confusing_values': np.array([2.0, 3.0, 4.0]), 't_stat': -1.5, 'p_value': 0.2, 'plt_path': self.plt_path}
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary folder.
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_unchanged_plots_are_skipped(self):
+        """
+        Testing that render_plots renders a plot again only when its data changes.
+        """
+        # The first run renders the plot.
+        self.assertIn(self.plt_path, render_plots([('boxplot', self.kwargs)], manifest_path=self.manifest_path))
+        # The same data again - nothing is rendered.
+        self.assertEqual(render_plots([('boxplot', dict(self.kwargs))], manifest_path=self.manifest_path), {})
+        # A new t-statistic - the plot is rendered again.
+        changed = dict(self.kwargs, t_stat=2.5)
+        self.assertIn(self.plt_path, render_plots([('boxplot', changed)], manifest_path=self.manifest_path))
+
+    def test_stale_plots_are_evicted(self):
+        """
+        Testing that render_plots removes plots that were not used for longer than max_age_days.
+        """
+        render_plots([('boxplot', self.kwargs)], manifest_path=self.manifest_path)
+
+        # Making the plot look like it was last used 100 days ago.
+        manifest = load_manifest(self.manifest_path)
+        manifest[self.plt_path]['last_used'] -= 100 * 24 * 60 * 60
+        save_manifest(self.manifest_path, manifest)
+
+        render_plots([], manifest_path=self.manifest_path, max_age_days=30)
+        self.assertFalse(os.path.exists(self.plt_path))
+        self.assertEqual(load_manifest(self.manifest_path), {})
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import os
+import sys
+import numpy as np
+import pandas as pd
+from src.sketches import sketch_values, merge_sketches, sketch_moments, sketch_quantile, sketch_histogram, summarize_table
+from src.data_visualisation import sketch_histogram_jobs
+
+class test_sketches(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. Skewed values like the band powers, in 20 chunks.
+        """
+        rng = np.random.default_rng(0)
+        self.values = rng.lognormal(10, 1, 200_000)
+        self.chunks = np.array_split(self.values, 20)
+
+    def merged_sketch(self):
+        sketch = sketch_values(self.chunks[0])
+        for chunk in self.chunks[1:]:
+            sketch = merge_sketches(sketch, sketch_values(chunk))
+        return sketch
+
+    def test_moments(self):
+        """
+        Testing that the merged moments are the moments of all the values.
+        """
+        moments = sketch_moments(self.merged_sketch())
+        self.assertEqual(moments['count'], len(self.values))
+        self.assertAlmostEqual(moments['mean'], self.values.mean(), delta=1e-6 * self.values.mean())
+        self.assertAlmostEqual(moments['var'], self.values.var(ddof=1), delta=1e-6 * self.values.var())
+        self.assertEqual((moments['min'], moments['max']), (self.values.min(), self.values.max()))
+
+    def test_quantiles(self):
+        """
+        Testing that the quantiles are exact for few values, and close in rank for many - merged or not.
+        """
+        few = self.values[:100]
+        # Interpolated like the Series.quantile clip of the row-based histograms.
+        self.assertEqual(sketch_quantile(sketch_values(few), 0.99), np.quantile(few, 0.99))
+        self.assertEqual(sketch_quantile(sketch_values(few), 0.99), pd.Series(few).quantile(0.99))
+        np.testing.assert_array_equal(sketch_quantile(merge_sketches(sketch_values(few[:40]), sketch_values(few[40:])), [0.1, 0.5, 0.99]),
+                                      np.quantile(few, [0.1, 0.5, 0.99]))
+        for sketch in (sketch_values(self.values), self.merged_sketch()):
+            estimates = sketch_quantile(sketch, [0.01, 0.5, 0.99])
+            ranks = [(self.values <= estimate).mean() for estimate in estimates]
+            np.testing.assert_allclose(ranks, [0.01, 0.5, 0.99], atol=0.01)
+
+    def test_histogram(self):
+        """
+        Testing that the histogram of the merged sketch counts every value, and is close to the histogram of the rows.
+        """
+        sketch = self.merged_sketch()
+        self.assertLessEqual(len(sketch['histogram']['index']), 2048)
+        self.assertEqual(sketch_histogram(sketch)[0].sum(), len(self.values))
+        limit = np.quantile(self.values, 0.99)
+        counts, edges = sketch_histogram(sketch, bins=50, range=(0, limit))
+        expected, expected_edges = np.histogram(self.values, bins=50, range=(0, limit))
+        np.testing.assert_allclose(edges, expected_edges)
+        self.assertLess(np.abs(counts - expected).sum() / expected.sum(), 0.02)
+
+    def test_summarize_table(self):
+        """
+        Testing that summarize_table sketches every group of every label column, and that its sketches make histogram jobs.
+        """
+        data = pd.DataFrame({'label': np.tile([0, 1], 50), 'other': np.repeat([0, 1], 50), 'Theta': np.arange(100.0)})
+        summary = summarize_table([data.iloc[:30], data.iloc[30:]], ['label', 'other'], ['Theta'])
+        self.assertEqual(summary['label'][1]['Theta']['count'], 50)
+        self.assertEqual(summary['other'][0]['Theta']['max'], 49)
+        jobs = sketch_histogram_jobs(summary, 'label', plot_dir="plots")
+        self.assertEqual(len(jobs), 1)
+        # The bins of the histograms of the rows - clipped at the interpolated 99th percentile of each group - and about their counts.
+        for group, name in ((0, 'not_confusing'), (1, 'confusing')):
+            values = data.loc[data['label'] == group, 'Theta']
+            expected, expected_edges = np.histogram(values, bins=50, range=(0, values.quantile(0.99)))
+            np.testing.assert_allclose(jobs[0][1][f'{name}_edges'], expected_edges)
+            self.assertAlmostEqual(jobs[0][1][f'{name}_counts'].sum(), expected.sum(), delta=1)
+
+    def test_label_with_one_class(self):
+        """
+        Testing that a label with only one class has no histogram jobs, and a warning instead of an error.
+        """
+        data = pd.DataFrame({'label': np.zeros(20, dtype=int), 'Theta': np.arange(20.0)})
+        summary = summarize_table([data], ['label'], ['Theta'])
+        self.assertNotIn(1, summary['label'])
+        with self.assertLogs('src.data_visualisation', level='WARNING') as logs:
+            self.assertEqual(sketch_histogram_jobs(summary, 'label', plot_dir="plots"), [])
+        self.assertIn("Theta", logs.output[0])
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+from src.stage_graph import add_stage, run_stages, load_index, stage_fingerprint
+from src.synthetic_data import write_eeg_data
+from src.analysis_pipeline import run_incremental_analysis
+
+def _read_number(file_path):
+    with open(file_path) as file:
+        return int(file.read())
+
+def _add(number, amount):
+    return number + amount
+
+class test_stage_graph(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. A temporary folder for the input file and the artifact store.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.temp_dir, "artifacts")
+        self.input_path = os.path.join(self.temp_dir, "number.txt")
+        with open(self.input_path, 'w') as file:
+            file.write("1")
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary folder.
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def build_graph(self, amount):
+        graph = {}
+        add_stage(graph, 'read', _read_number, params={'file_path': self.input_path}, file_params=('file_path',))
+        add_stage(graph, 'add', _add, inputs=('read',), params={'amount': amount})
+        return graph
+
+    def test_only_changed_stages_rerun(self):
+        """
+        Testing that run_stages loads unchanged stages, and reruns only the stages downstream of a change.
+        """
+        outputs, report = run_stages(self.build_graph(amount=1), ['add'], store_dir=self.store_dir)
+        self.assertEqual(outputs['add'], 2)
+        self.assertEqual(report['computed'], ['read', 'add'])
+
+        # Nothing changed - the target is loaded, without even loading its input.
+        outputs, report = run_stages(self.build_graph(amount=1), ['add'], store_dir=self.store_dir)
+        self.assertEqual(outputs['add'], 2)
+        self.assertEqual((report['computed'], report['loaded']), ([], ['add']))
+
+        # A new parameter reruns only its stage.
+        outputs, report = run_stages(self.build_graph(amount=5), ['add'], store_dir=self.store_dir)
+        self.assertEqual(outputs['add'], 6)
+        self.assertEqual((report['computed'], report['loaded']), (['add'], ['read']))
+
+        # A new input file reruns everything below it.
+        with open(self.input_path, 'w') as file:
+            file.write("10")
+        outputs, report = run_stages(self.build_graph(amount=5), ['add'], store_dir=self.store_dir)
+        self.assertEqual(outputs['add'], 15)
+        self.assertEqual(report['computed'], ['read', 'add'])
+
+    def test_lru_eviction(self):
+        """
+        Testing that the least recently used artifacts are removed when the store is over its size limit.
+        """
+        for amount in range(3):
+            run_stages(self.build_graph(amount), ['add'], store_dir=self.store_dir)
+        self.assertEqual(len(load_index(self.store_dir)), 4)
+
+        # A limit of one byte keeps only the artifacts of the current run.
+        _, report = run_stages(self.build_graph(amount=0), ['add'], store_dir=self.store_dir, max_bytes=1)
+        self.assertEqual(sorted(report['evicted']), ['add', 'add', 'read'])
+        self.assertEqual([entry['stage'] for entry in load_index(self.store_dir).values()], ['add'])
+        self.assertEqual(len([name for name in os.listdir(self.store_dir) if name.endswith('.pkl')]), 1)
+
+    def load_stages(self, version, source):
+        # A new module for every version, so its functions are new objects - as in a new run.
+        module_path = os.path.join(self.temp_dir, f"stages_{version}.py")
+        with open(module_path, 'w') as file:
+            file.write(source)
+        spec = importlib.util.spec_from_file_location(f"stages_{version}", module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def test_only_the_stage_function_is_hashed(self):
+        """
+        Testing that editing another function in the file of a stage function doesn't change its fingerprint, but editing it does.
+        """
+        def fingerprint(module):
+            graph = {}
+            add_stage(graph, 'double', module.double, code=(module.helper,))
+            return stage_fingerprint(graph, 'double')
+
+        original = fingerprint(self.load_stages(0, "def double(x):\n    return 2 * x\n\ndef helper(x):\n    return x\n\ndef other(x):\n    return x\n"))
+        # Only the unrelated function changed.
+        self.assertEqual(original, fingerprint(self.load_stages(1, "def double(x):\n    return 2 * x\n\ndef helper(x):\n    return x\n\ndef other(x):\n    return x + 1\n")))
+        # The stage function, or a function it lists as code, changed.
+        self.assertNotEqual(original, fingerprint(self.load_stages(2, "def double(x):\n    return x + x\n\ndef helper(x):\n    return x\n\ndef other(x):\n    return x\n")))
+        self.assertNotEqual(original, fingerprint(self.load_stages(3, "def double(x):\n    return 2 * x\n\ndef helper(x):\n    return -x\n\ndef other(x):\n    return x\n")))
+
+    def test_exclusions_do_not_reclean(self):
+        """
+        Testing that run_incremental_analysis doesn't clean the raw data again when only the columns to exclude change.
+        """
+        raw_path = os.path.join(self.temp_dir, "EEG_data.csv")
+        write_eeg_data(raw_path, n_subjects=6, n_videos=4, rows_per_video=3)
+        kwargs = {'raw_file_path': raw_path, 'clean_file_path': os.path.join(self.temp_dir, "clean.csv"), 'label_cols': ['predefinedlabel'],
+                  'stages': ('stats', 'model'), 'n_repeats': 1, 'artifact_dir': self.store_dir}
+
+        results, report = run_incremental_analysis(**kwargs)
+        self.assertIn('clean', report['computed'])
+        self.assertIn('Raw', results['predefinedlabel']['t_test_results'])
+
+        results, report = run_incremental_analysis(extra_exclude=['Raw'], **kwargs)
+        self.assertIn('clean', report['loaded'])
+        self.assertIn('model predefinedlabel', report['computed'])
+        self.assertNotIn('Raw', results['predefinedlabel']['t_test_results'])
+
+    def test_deleted_output_file_is_written_again(self):
+        """
+        Testing that a stage whose output file was deleted runs again instead of being loaded, so the file is back.
+        """
+        raw_path = os.path.join(self.temp_dir, "EEG_data.csv")
+        clean_path = os.path.join(self.temp_dir, "clean.csv")
+        write_eeg_data(raw_path, n_subjects=6, n_videos=4, rows_per_video=3)
+        kwargs = {'raw_file_path': raw_path, 'clean_file_path': clean_path, 'label_cols': ['predefinedlabel'],
+                  'stages': ('stats',), 'artifact_dir': self.store_dir}
+        run_incremental_analysis(**kwargs)
+        with open(clean_path, 'rb') as file:
+            cleaned = file.read()
+
+        # Nothing changed - the cleaning isn't even loaded.
+        _, report = run_incremental_analysis(**kwargs)
+        self.assertNotIn('clean', report['computed'])
+
+        os.remove(clean_path)
+        _, report = run_incremental_analysis(**kwargs)
+        self.assertIn('clean', report['computed'])
+        with open(clean_path, 'rb') as file:
+            self.assertEqual(file.read(), cleaned)
+
+        # A changed file is written again too.
+        with open(clean_path, 'a') as file:
+            file.write("1,2,3\n")
+        _, report = run_incremental_analysis(**kwargs)
+        self.assertIn('clean', report['computed'])
+        with open(clean_path, 'rb') as file:
+            self.assertEqual(file.read(), cleaned)
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
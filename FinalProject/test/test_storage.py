@@ -0,0 +1,101 @@
+import unittest
+import numpy as np
+import pandas as pd
+import os
+import shutil
+import sys
+from src.data_storage import load_table, write_table_cache, _loaded_tables
+from src.data_cleaning import clean_and_save_data
+
+class test_data_storage(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. Creating a sample dataset and saving it to a temporary CSV file.
+        """
+        self.sample_data = pd.DataFrame({'VideoID': [1.0, 1.0, 2.0, 2.0],'SubjectID': [101.0, 101.0, 102.0, 102.0],'predefinedlabel': [0.0, 0.0, 1.0, 1.0],'user-definedlabeln': [1.0, 1.0, 0.0, 0.0],'Theta': [100.5, 200.5, 300.5, 400.5]})
+
+        self.test_file_path = "test_storage_data.csv"
+        self.cache_dir = "test_storage_cache"
+        self.sample_data.to_csv(self.test_file_path, index=False)
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary file and cache.
+        """
+        if os.path.exists(self.test_file_path):
+            os.remove(self.test_file_path)
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_load_table_from_cache(self):
+        """
+        Testing that load_table returns the same values and dtypes as the CSV file, with shared memory.
+        """
+        first = load_table(self.test_file_path, self.cache_dir)
+        second = load_table(self.test_file_path, self.cache_dir)
+
+        # The values are the same as in the CSV file.
+        pd.testing.assert_frame_equal(first, self.sample_data)
+        # Both loads share the same memory-mapped columns.
+        self.assertTrue(np.shares_memory(first['Theta'].to_numpy(), second['Theta'].to_numpy()))
+
+    def test_cache_is_invalidated_when_source_changes(self):
+        """
+        Testing that load_table notices a changed source file.
+        """
+        load_table(self.test_file_path, self.cache_dir)
+
+        # Changing the data, and the file size with it.
+        changed = self.sample_data.copy()
+        changed['Theta'] = changed['Theta'] * 1000
+        changed.to_csv(self.test_file_path, index=False)
+
+        reloaded = load_table(self.test_file_path, self.cache_dir)
+        self.assertEqual(list(reloaded['Theta']), list(changed['Theta']))
+
+    def test_cached_dtypes_match_read_csv(self):
+        """
+        Testing that the cached and the uncached loads of a table have the same dtypes - for a table loaded through the
+        cache, and for one cached by clean_and_save_data when it is saved.
+        """
+        with_ints = self.sample_data.assign(Count=[1, 2, 3, 4], Note=['a', 'b', 'c', 'd'])
+        with_ints.to_csv(self.test_file_path, index=False)
+        pd.testing.assert_frame_equal(load_table(self.test_file_path, self.cache_dir), load_table(self.test_file_path))
+
+        clean_path = "test_storage_clean.csv"
+        clean_and_save_data(pd.read_csv(self.test_file_path).drop(columns=['Note']), clean_path, cache_dir=self.cache_dir)
+        self.addCleanup(os.remove, clean_path)
+        pd.testing.assert_frame_equal(load_table(clean_path, self.cache_dir), load_table(clean_path))
+
+    def test_rewrite_is_atomic(self):
+        """
+        Testing that rewriting a cache replaces the whole folder, leaves no temporary folders, and keeps the tables mapped from the old one.
+        """
+        old = load_table(self.test_file_path, self.cache_dir)
+        folder = write_table_cache(self.sample_data.assign(Theta=0.0), self.test_file_path, self.cache_dir)
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(folder)])
+        self.assertEqual(list(old['Theta']), list(self.sample_data['Theta']))
+        _loaded_tables.clear()
+        self.assertEqual(list(load_table(self.test_file_path, self.cache_dir)['Theta']), [0.0] * 4)
+
+    def test_missing_text_values(self):
+        """
+        Testing that a missing value in a text column is still missing when the table is loaded from the cache.
+        """
+        with_text = self.sample_data.assign(Note=['a', None, 'b', 'c'])
+        with_text.to_csv(self.test_file_path, index=False)
+
+        from_csv = pd.read_csv(self.test_file_path)
+        cached = load_table(self.test_file_path, self.cache_dir)
+        # Again in a new process - the cache that the first load wrote is mapped.
+        _loaded_tables.clear()
+        reloaded = load_table(self.test_file_path, self.cache_dir)
+        for table in (cached, reloaded):
+            self.assertEqual(table.isnull().sum().to_dict(), from_csv.isnull().sum().to_dict())
+            self.assertEqual(list(table['Note'].dropna()), ['a', 'b', 'c'])
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
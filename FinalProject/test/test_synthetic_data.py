@@ -0,0 +1,51 @@
+import unittest
+import pandas as pd
+import os
+import sys
+import tempfile
+import shutil
+from src.synthetic_data import generate_eeg_data, write_eeg_data
+
+class test_synthetic_data(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. Creating a temporary folder.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary folder.
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_generate_eeg_data(self):
+        """
+        Testing that generate_eeg_data has the schema of the real dataset, the requested size, and is reproducible.
+        """
+        data = generate_eeg_data(n_subjects=6, n_videos=4, rows_per_video=3, seed=1)
+        self.assertEqual(data.columns.to_list(), pd.read_csv("clean_eeg_data.csv", nrows=1).columns.to_list())
+        self.assertEqual(len(data), 6 * 4 * 3)
+        # Every subject watched every video.
+        self.assertEqual(data.groupby(['SubjectID', 'VideoID']).size().to_list(), [3] * 24)
+        # The second half of the videos is confusing by design.
+        self.assertEqual(data.groupby('VideoID')['predefinedlabel'].first().to_list(), [0, 0, 1, 1])
+        pd.testing.assert_frame_equal(data, generate_eeg_data(n_subjects=6, n_videos=4, rows_per_video=3, seed=1))
+
+    def test_write_eeg_data(self):
+        """
+        Testing that write_eeg_data writes all the subjects, a block at a time, with unique subject ids.
+        """
+        file_path = os.path.join(self.temp_dir, "EEG_data.csv")
+        n_rows = write_eeg_data(file_path, chunk_subjects=4, n_subjects=10, n_videos=2, rows_per_video=5)
+        data = pd.read_csv(file_path)
+        self.assertEqual(n_rows, len(data))
+        self.assertEqual(len(data), 10 * 2 * 5)
+        self.assertEqual(sorted(data['SubjectID'].unique()), list(range(10)))
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
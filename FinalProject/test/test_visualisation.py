@@ -0,0 +1,91 @@
+import unittest
+from unittest import mock
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+from matplotlib.collections import LineCollection, PathCollection, PolyCollection
+from src import data_visualisation
+from src.data_visualisation import _code_version, _draw_paired_lines
+
+class test_data_visualisation(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. A temporary folder, and the paired values of 200 subjects.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.plt_path = os.path.join(self.temp_dir, "paired_lines_Theta.png")
+        rng = np.random.default_rng(0)
+        self.confusing = rng.normal(100, 10, 200)
+        self.not_confusing = self.confusing + rng.normal(5, 3, 200)
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary folder.
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def line_collections(self, fig):
+        return [collection for collection in fig.axes[0].collections if isinstance(collection, LineCollection)]
+
+    def test_pairs_are_one_line_collection(self):
+        """
+        Testing that every pair is a segment of one LineCollection, from the confusing value to the not confusing one.
+        """
+        fig = _draw_paired_lines('Theta', self.confusing, self.not_confusing, t_stat=-3.0, p_value=0.01, plt_path=self.plt_path)
+        self.assertTrue(os.path.exists(self.plt_path))
+        lines = self.line_collections(fig)
+        self.assertEqual(len(lines), 1)
+        segments = lines[0].get_segments()
+        self.assertEqual(len(segments), 200)
+        np.testing.assert_allclose([segment[:, 1] for segment in segments], np.column_stack([self.confusing, self.not_confusing]))
+        # The points of both groups are drawn too.
+        self.assertTrue(any(isinstance(collection, PathCollection) and len(collection.get_offsets()) == 200 for collection in fig.axes[0].collections))
+
+    def test_summary_above_max_lines(self):
+        """
+        Testing that more pairs than max_lines switch to the summary - the distributions, without a line or point per pair.
+        """
+        fig = _draw_paired_lines('Theta', self.confusing, self.not_confusing, t_stat=-3.0, p_value=0.01, plt_path=self.plt_path, max_lines=100)
+        collections = fig.axes[0].collections
+        self.assertEqual(self.line_collections(fig), [])
+        self.assertEqual(sum(isinstance(collection, PolyCollection) for collection in collections), 2)
+        self.assertFalse(any(isinstance(collection, PathCollection) and len(collection.get_offsets()) == 200 for collection in collections))
+
+    def test_decimate_bounds_the_pairs(self):
+        """
+        Testing that decimate draws a bounded sample of the pairs on top of the summary, including the largest rise and fall.
+        """
+        fig = _draw_paired_lines('Theta', self.confusing, self.not_confusing, t_stat=-3.0, p_value=0.01, plt_path=self.plt_path, max_lines=100, decimate=20)
+        lines = self.line_collections(fig)
+        self.assertEqual(len(lines), 1)
+        segments = np.array(lines[0].get_segments())
+        self.assertLessEqual(len(segments), 20)
+        self.assertGreater(len(segments), 0)
+        rises = segments[:, 1, 1] - segments[:, 0, 1]
+        differences = self.not_confusing - self.confusing
+        self.assertAlmostEqual(rises.max(), differences.max())
+        self.assertAlmostEqual(rises.min(), differences.min())
+
+    def test_code_version_covers_the_helpers(self):
+        """
+        Testing that the plots depend on the downsampling and the sketches too - a change in any of the files renders the plots again.
+        """
+        self.assertIn(data_visualisation.downsampling.__file__, data_visualisation.PLOT_CODE_FILES)
+        self.assertIn(data_visualisation.sketches.__file__, data_visualisation.PLOT_CODE_FILES)
+        helper_path = os.path.join(self.temp_dir, "downsampling.py")
+        versions = []
+        for source in ("x = 1\n", "x = 2\n"):
+            with open(helper_path, 'w') as file:
+                file.write(source)
+            with mock.patch.object(data_visualisation, 'PLOT_CODE_FILES', [data_visualisation.__file__, helper_path]):
+                versions.append(_code_version())
+        self.assertNotEqual(versions[0], versions[1])
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
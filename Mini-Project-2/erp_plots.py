@@ -0,0 +1,78 @@
+# Imports.
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+COLORS = ['deepskyblue', 'seagreen', 'r', 'darkcyan', 'hotpink']
+
+def _draw_erp_figure(time, erps, finger_numbers, plot_path, dpi):
+    """
+    Draw and save one ERP figure, with a line for each of the given fingers.
+
+    Args:
+        time (np.ndarray): Time of every sample, relative to the movement onset.
+        erps (np.ndarray): The mean ERP of each finger to draw, one row per finger.
+        finger_numbers (list): The number (1 to n) of each finger to draw.
+        plot_path (str): Path of the saved figure. Its extension sets the format.
+        dpi (int): Resolution of the saved figure.
+
+    Returns:
+        plot_path (str): Path of the saved figure.
+    """
+    # Creating the figure, with its own Agg canvas - no pyplot state.
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    for erp, finger in zip(erps, finger_numbers):
+        # Plots the mean erp per finger.
+        ax.plot(time, erp, color=COLORS[(finger - 1) % len(COLORS)], label=f'Finger {finger}')
+    # Adding a line at t=0.
+    ax.axvline(0, color='k', linestyle='--', label='Movement Onset')
+    # Adding title.
+    ax.set_title('Average Event-Related Potentials by Finger')
+    ax.set_xlabel('Time from Movement Onset (ms)')
+    ax.set_ylabel('ECoG Amplitude (μV)')
+    ax.legend()
+    ax.grid(True)
+    fig.savefig(plot_path, dpi=dpi)
+    return plot_path
+
+def _draw_erp_job(job):
+    """
+    Draw one ERP figure job - the arguments of _draw_erp_figure.
+    """
+    return _draw_erp_figure(*job)
+
+def render_erp_plots(fingers_erp_mean, output_folder="./plots", pre=200, post=1000, dpi=300, fmt='png', n_workers=1, channel=0):
+    """
+    Render the ERP figures of all the fingers in one batch - a figure per finger and one with all the fingers.
+
+    Args:
+        fingers_erp_mean (np.ndarray): The fingers x samples matrix from compute_mean_erp, or channels x fingers x samples.
+        output_folder (str): Folder to save the figures to.
+        pre (int): Number of samples before the movement onset in every epoch.
+        post (int): Number of samples after the movement onset in every epoch.
+        dpi (int): Resolution of the saved figures.
+        fmt (str): File format of the figures, for example 'png', 'svg' or 'pdf'.
+        n_workers (int): Number of worker processes. 1 renders in this process.
+        channel (int): Channel to plot, for a multi-channel matrix.
+
+    Returns:
+        plot_paths (list): Paths of the saved figures.
+    """
+    erps = fingers_erp_mean if fingers_erp_mean.ndim == 2 else fingers_erp_mean[channel]
+    # Creating a time vector from -pre to post, with one point per sample.
+    time = np.linspace(-pre, post, pre + post + 1)
+
+    # Create folder if it doesn't exist
+    os.makedirs(output_folder, exist_ok=True)
+    fingers = list(range(1, len(erps) + 1))
+    jobs = [(time, erps[[finger - 1]], [finger], os.path.join(output_folder, f"average_erp_finger_{finger}.{fmt}"), dpi) for finger in fingers]
+    jobs.append((time, erps, fingers, os.path.join(output_folder, f"average_erp_all_fingers.{fmt}"), dpi))
+
+    if n_workers == 1:
+        return [_draw_erp_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(_draw_erp_job, jobs))
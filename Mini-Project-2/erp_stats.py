@@ -0,0 +1,226 @@
+# Imports.
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Per-process copy of the epochs, sent to each worker once instead of with every task.
+_worker_epochs = {}
+
+def _init_worker(epochs):
+    """
+    Store the epoch matrix in the worker process.
+    """
+    _worker_epochs['epochs'] = epochs
+
+def _resample_counts(rng, n_resamples, n_trials):
+    """
+    Draw bootstrap resamples as a (resamples x trials) matrix of how many times each trial was drawn.
+    Multiplying it by the epochs gives the sum of every resample in one matrix product.
+    """
+    draws = rng.integers(0, n_trials, size=(n_resamples, n_trials))
+    # Counting the draws of every row in one bincount, with each row offset by its number.
+    offsets = np.arange(n_resamples)[:, None] * n_trials
+    return np.bincount((draws + offsets).ravel(), minlength=n_resamples * n_trials).reshape(n_resamples, n_trials)
+
+def _bootstrap_task(task):
+    """
+    Compute the resampled mean ERPs of one finger, for one chunk of bootstrap resamples.
+
+    Args:
+        task (tuple): Row positions of the finger's epochs, the number of resamples, and the chunk's seed.
+
+    Returns:
+        np.ndarray: (resamples x samples) bootstrap means.
+    """
+    rows, n_resamples, seed = task
+    epochs = _worker_epochs['epochs'][rows]
+    counts = _resample_counts(np.random.default_rng(seed), n_resamples, len(rows))
+    return counts @ epochs / len(rows)
+
+def _t_values(group_sums, total_sum, total_ss, n_a, n_b):
+    """
+    Two-sample t-statistics (pooled variance) at every time point, from the sums of group A, the sum of both groups
+    and the sum of squared deviations of both groups from their mean. The group sums may hold many rows - one per permutation.
+    The within-group sum of squares is the total one minus the between-group one, so no large squares are subtracted.
+    """
+    grand_mean = total_sum / (n_a + n_b)
+    mean_a = group_sums / n_a
+    mean_b = (total_sum - group_sums) / n_b
+    between = n_a * (mean_a - grand_mean) ** 2 + n_b * (mean_b - grand_mean) ** 2
+    # Rounding can leave a tiny negative sum when the groups don't overlap at all.
+    pooled = np.maximum(total_ss - between, 0) / (n_a + n_b - 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (mean_a - mean_b) / np.sqrt(pooled * (1 / n_a + 1 / n_b))
+
+def _cluster_runs(t_values, threshold):
+    """
+    Find the clusters of every row - runs of neighbouring time points where |t| is above the threshold, with the same sign.
+
+    Args:
+        t_values (np.ndarray): (rows x time points) t-statistics.
+        threshold (float): The cluster-forming threshold.
+
+    Returns:
+        tuple: Row, first time point, last time point + 1 and mass (sum of t) of every cluster.
+    """
+    n_rows, n_times = t_values.shape
+    rows, starts, stops, masses = [], [], [], []
+    for sign in (1, -1):
+        # A column of False after every row, so runs never continue into the next row.
+        above = np.zeros((n_rows, n_times + 1), dtype=bool)
+        above[:, :n_times] = sign * t_values > threshold
+        flat = above.ravel()
+        # Where every run starts and stops in the flattened rows.
+        edges = np.diff(np.r_[False, flat].astype(np.int8))
+        run_starts = np.flatnonzero(edges == 1)
+        run_stops = np.flatnonzero(edges == -1)
+        # The mass of every run - one cumulative sum for all the runs of all the rows.
+        values = np.zeros((n_rows, n_times + 1))
+        values[:, :n_times] = np.nan_to_num(t_values)
+        cumulative = np.r_[0, np.cumsum(values.ravel())]
+        rows.append(run_starts // (n_times + 1))
+        starts.append(run_starts % (n_times + 1))
+        stops.append(run_stops % (n_times + 1))
+        masses.append(cumulative[run_stops] - cumulative[run_starts])
+    return np.concatenate(rows), np.concatenate(starts), np.concatenate(stops), np.concatenate(masses)
+
+def _max_cluster_mass(t_values, threshold):
+    """
+    The largest absolute cluster mass of every row (0 for rows without clusters).
+    """
+    rows, _, _, masses = _cluster_runs(t_values, threshold)
+    largest = np.zeros(len(t_values))
+    np.maximum.at(largest, rows, np.abs(masses))
+    return largest
+
+def _permutation_task(task):
+    """
+    Compute the null distribution of the largest cluster mass, for one chunk of label permutations.
+
+    Args:
+        task (tuple): Number of epochs in group A, number of permutations, cluster-forming threshold and the chunk's seed.
+                      The epochs in the worker are centred on their mean.
+
+    Returns:
+        np.ndarray: The largest absolute cluster mass of every permutation.
+    """
+    n_a, n_permutations, threshold, seed = task
+    epochs = _worker_epochs['epochs']
+    n_total = len(epochs)
+    # Every row is one permutation - a random choice of which epochs form group A.
+    rng = np.random.default_rng(seed)
+    order = rng.permuted(np.tile(np.arange(n_total), (n_permutations, 1)), axis=1)
+    membership = np.zeros((n_permutations, n_total))
+    np.put_along_axis(membership, order[:, :n_a], 1, axis=1)
+    # The sums of group A for all the permutations in one matrix product.
+    t_values = _t_values(membership @ epochs, epochs.sum(axis=0), (epochs ** 2).sum(axis=0), n_a, n_total - n_a)
+    return _max_cluster_mass(t_values, threshold)
+
+def _chunks(n_total, chunk_size):
+    """
+    Split n_total resamples into chunks of chunk_size (the last one may be smaller).
+    """
+    return [min(chunk_size, n_total - first) for first in range(0, n_total, chunk_size)]
+
+def _run_tasks(function, tasks, epochs, n_workers):
+    """
+    Run the tasks in this process or across a process pool, with the epochs shared by every worker.
+    """
+    if n_workers == 1:
+        _init_worker(epochs)
+        return [function(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(epochs,)) as pool:
+        return list(pool.map(function, tasks))
+
+def bootstrap_erp_ci(epochs, finger_ids, n_fingers=5, n_resamples=2000, ci=0.95, n_workers=1, seed=0, chunk_size=100):
+    """
+    Bootstrap confidence bands of every finger's mean ERP.
+    Each chunk of resamples is one (resamples x trials) count matrix times the epoch matrix,
+    and the chunks are spread across a process pool. Every chunk has its own seed from seed,
+    so the results are the same for any number of workers.
+
+    Args:
+        epochs (np.ndarray): A (trials x samples) matrix of epochs - see main.load_epochs.
+        finger_ids (np.ndarray): The finger (1 to n_fingers) of every epoch.
+        n_fingers (int): Number of fingers.
+        n_resamples (int): Number of bootstrap resamples per finger.
+        ci (float): Coverage of the confidence band.
+        n_workers (int): Number of worker processes. 1 runs in this process.
+        seed (int): Seed of the resampling.
+        chunk_size (int): Number of resamples per task.
+
+    Returns:
+        results (dict): 'mean', 'lower' and 'upper' - (n_fingers x samples) matrices. Fingers without epochs are NaN.
+    """
+    epochs = np.ascontiguousarray(epochs, dtype=np.float64)
+    chunks = _chunks(n_resamples, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_fingers * len(chunks))
+
+    # One task per finger and chunk.
+    tasks, task_fingers = [], []
+    for finger in range(1, n_fingers + 1):
+        rows = np.flatnonzero(finger_ids == finger)
+        if len(rows) == 0:
+            continue
+        for i, size in enumerate(chunks):
+            tasks.append((rows, size, seeds[(finger - 1) * len(chunks) + i]))
+            task_fingers.append(finger)
+    outputs = _run_tasks(_bootstrap_task, tasks, epochs, n_workers)
+
+    results = {name: np.full((n_fingers, epochs.shape[1]), np.nan) for name in ('mean', 'lower', 'upper')}
+    task_fingers = np.array(task_fingers)
+    for finger in np.unique(task_fingers):
+        means = np.concatenate([output for output, task_finger in zip(outputs, task_fingers) if task_finger == finger])
+        results['mean'][finger - 1] = epochs[finger_ids == finger].mean(axis=0)
+        results['lower'][finger - 1], results['upper'][finger - 1] = np.quantile(means, [(1 - ci) / 2, (1 + ci) / 2], axis=0)
+    return results
+
+def cluster_permutation_test(epochs, finger_ids, finger_a, finger_b, n_permutations=1000, threshold=2.0, n_workers=1, seed=0, chunk_size=100):
+    """
+    Cluster-based permutation test of the difference between the ERPs of two fingers.
+    Clusters are runs of time points where the two-sample t-statistic is beyond the threshold, and a cluster's
+    mass is the sum of its t-values. Its p-value is the share of label permutations whose largest cluster mass
+    is at least as large. Each chunk of permutations is computed with matrix products, and the chunks are
+    spread across a process pool with their own seeds.
+
+    Args:
+        epochs (np.ndarray): A (trials x samples) matrix of epochs - see main.load_epochs.
+        finger_ids (np.ndarray): The finger of every epoch.
+        finger_a (int): The first finger.
+        finger_b (int): The second finger.
+        n_permutations (int): Number of label permutations.
+        threshold (float): The cluster-forming |t| threshold. 2.0 is about p < 0.05 (two-sided) for 60 or more epochs.
+        n_workers (int): Number of worker processes. 1 runs in this process.
+        seed (int): Seed of the permutations.
+        chunk_size (int): Number of permutations per task.
+
+    Returns:
+        results (dict): 't_values' - the observed t-statistics, 'clusters' - a list of clusters with their
+                        'start', 'stop' (sample indices in the epoch), 'mass' and 'p_value',
+                        and 'null_distribution' - the largest cluster mass of every permutation.
+    """
+    # Group A first, then group B.
+    epochs = np.ascontiguousarray(np.concatenate([epochs[finger_ids == finger_a], epochs[finger_ids == finger_b]]), dtype=np.float64)
+    n_a = int((finger_ids == finger_a).sum())
+    n_b = len(epochs) - n_a
+    if n_a < 2 or n_b < 2:
+        raise ValueError("Both fingers need at least two epochs.")
+
+    # Centring every time point, so the sums of squares are of deviations and not of the (possibly large) raw values.
+    epochs -= epochs.mean(axis=0)
+
+    # The observed statistic - group A is the first n_a epochs.
+    total_sum, total_ss = epochs.sum(axis=0), (epochs ** 2).sum(axis=0)
+    t_values = _t_values(epochs[:n_a].sum(axis=0), total_sum, total_ss, n_a, n_b)
+    _, starts, stops, masses = _cluster_runs(t_values[None, :], threshold)
+
+    # The null distribution of the largest cluster mass.
+    chunks = _chunks(n_permutations, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    tasks = [(n_a, size, threshold, chunk_seed) for size, chunk_seed in zip(chunks, seeds)]
+    null_distribution = np.concatenate(_run_tasks(_permutation_task, tasks, epochs, n_workers))
+
+    clusters = []
+    for start, stop, mass in sorted(zip(starts, stops, masses)):
+        p_value = (1 + np.sum(null_distribution >= abs(mass))) / (1 + n_permutations)
+        clusters.append({'start': int(start), 'stop': int(stop), 'mass': float(mass), 'p_value': float(p_value)})
+    return {'t_values': t_values, 'clusters': clusters, 'null_distribution': null_distribution}
@@ -1,88 +1,165 @@
 # Imports. 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import os
+from numpy.lib.stride_tricks import sliding_window_view
+from signal_store import STORE_SUFFIX, open_store
 
-def calc_mean_erp(trial_points, ecog_data):
+def extract_epochs(ecog_data, starting_points, pre=200, post=1000):
     """
-    Calculate the mean Event-Related Potentials (ERP) for finger movements from ecog data.
+    Extract the epoch around every starting point at once.
 
     Args:
-        trial_points (str): Path to a CSV file containing information about finger movement events.    
-        ecog_data (str): Path to a CSV file containing ecog data.
+        ecog_data (np.ndarray): The ecog signal - samples, or (channels x samples).
+        starting_points (np.ndarray): Sample index of every trial's movement onset.
+        pre (int): Number of samples before the onset.
+        post (int): Number of samples after the onset.
 
     Returns:
-        fingers_erp_mean (np.ndarray): A 5x1201 matrix containing the averaged ERP signals per finger.
+        epochs (np.ndarray): A (valid trials x pre+post+1) matrix of epochs - (channels x valid trials x pre+post+1) for several channels.
+        valid (np.ndarray): Boolean mask of the trials whose whole epoch is inside the recording.
+    """
+    window = pre + post + 1
+    n_samples = ecog_data.shape[-1]
+    # Validate boundaries - the whole window must be inside the recording.
+    valid = (starting_points - pre >= 0) & (starting_points + post + 1 <= n_samples)
+    if n_samples < window:
+        # A recording shorter than one epoch has no valid trials - and no windows to take.
+        return np.empty(ecog_data.shape[:-1] + (0, window), dtype=ecog_data.dtype), np.zeros(len(starting_points), dtype=bool)
+    # Every possible window of the signal, as a view - nothing is copied here.
+    windows = sliding_window_view(ecog_data, window, axis=-1)
+    # Taking the windows of the valid trials - the window starting at start - pre.
+    epochs = windows[..., starting_points[valid] - pre, :]
+    return epochs, valid
 
+def average_epochs(epochs, finger_ids, n_fingers=5):
     """
+    Average the epochs of every finger in one grouped reduction.
+
+    Args:
+        epochs (np.ndarray): A (trials x samples) matrix of epochs, or (channels x trials x samples).
+        finger_ids (np.ndarray): The finger (1 to n_fingers) of every epoch.
+        n_fingers (int): Number of fingers.
+
+    Returns:
+        fingers_erp_mean (np.ndarray): A (n_fingers x samples) matrix of the mean epoch per finger - (channels x n_fingers x samples) for several channels.
+                                       Fingers without trials are left as zeros.
+    """
+    if len(finger_ids) and (finger_ids.min() < 1 or finger_ids.max() > n_fingers):
+        raise ValueError(f"Finger ids must be between 1 and {n_fingers}.")
+    # Summing the epochs of every finger, and counting them. The trials are moved to the first axis for the grouped sum.
+    sums = np.zeros((n_fingers,) + epochs.shape[:-2] + epochs.shape[-1:])
+    np.add.at(sums, finger_ids - 1, np.moveaxis(epochs, -2, 0))
+    counts = np.bincount(finger_ids - 1, minlength=n_fingers).reshape((n_fingers,) + (1,) * (sums.ndim - 1))
+    # The mean per finger - fingers without trials stay zero.
+    means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    return np.moveaxis(means, 0, -2)
+
+def load_trial_points(trial_points):
+    """
+    Load the finger movement events.
+
+    Args:
+        trial_points (str): Path to a CSV file containing information about finger movement events.
 
+    Returns:
+        trial_points (DataFrame): The 'starting_point', 'peak_point' and 'finger_id' of every event, as ints.
+    """
     # Load trial points data and give the columns names.
     trial_points = pd.read_csv(trial_points, header=None, names=['starting_point', 'peak_point', 'finger_id'])
     # Ensure all values are ints
-    trial_points = trial_points.astype(int) 
-
-    # Load ecog data, assumong one columsm, and making a numpy array.
-    ecog_data = pd.read_csv(ecog_data, header=None).iloc[:, 0].values
-
-    # Initialize the matrix for finger epochs. 
-    # 5 rows for fingers, 1201 columns for the signal window. 
-    fingers_matrix = {1: [], 2: [], 3: [], 4: [], 5: []}
-    
-    # Extract epochs for each trial
-    for _, row in trial_points.iterrows():
-        # Get the starting point.
-        start_idx = row['starting_point']
-        # Get finger id.
-        finger = row['finger_id']
-
-        # Calculate epoch boundaries. 
-        epoch_start = start_idx - 200
-        epoch_end = start_idx + 1000 + 1 
-
-        # Validate boundaries - exactly 1201.
-        if epoch_start >= 0 and epoch_end <= len(ecog_data):
-            epoch = ecog_data[epoch_start:epoch_end]
-            # Adding the epoch to the fingers list.
-            if len(epoch) == 1201:
-                fingers_matrix[finger].append(epoch)
-
-    # Calculate mean erp per finger.
-    # Creating the matrix.
-    fingers_erp_mean = np.zeros((5, 1201))
-    # Going over all the fingers.
-    for finger in range(1, 6):
-        if fingers_matrix[finger]:
-            fingers_erp_mean[finger-1] = np.mean(fingers_matrix[finger], axis=0)
-
-    # Plot results.
-    # Creating the figure.
-    plt.figure(figsize=(12, 6))
-    # Creating a time vector from -200 to 1000, with 1201 points.
-    time = np.linspace(-200, 1000, 1201)
-    colors = ['deepskyblue', 'seagreen', 'r', 'darkcyan', 'hotpink']
-
-    # For each finger. 
-    for i in range(5):
-        # Plots the mean erp per finger.
-        plt.plot(time, fingers_erp_mean[i], color=colors[i], label=f'Finger {i+1}')
-        # Adding a line at t=0.
-        plt.axvline(0, color='k', linestyle='--', label='Movement Onset')
-        # Adding title.
-        plt.title('Average Event-Related Potentials by Finger')
-        plt.xlabel('Time from Movement Onset (ms)')
-        plt.ylabel('ECoG Amplitude (μV)')
-        plt.legend()
-        plt.grid(True)
-
-        # Save the plot to a folder
-        output_folder = "./plots"
-        # Create folder if it doesn't exist
-        os.makedirs(output_folder, exist_ok=True) 
-        plot_path = os.path.join(output_folder, f"average_erp_finger_{i+1}.png")
-        plt.savefig(plot_path, dpi=300)
-        plt.close() 
-    
+    return trial_points.astype(int)
+
+def load_epochs(trial_points, ecog_data, pre=200, post=1000, channel=0):
+    """
+    Load the epoch matrix of one channel - the input of the ERP and of its resampling statistics (erp_stats.py).
+
+    Args:
+        trial_points (str): Path to a CSV file containing information about finger movement events.
+        ecog_data (str): Path to a CSV file containing ecog data from one channel, or to a signal store (.ecog).
+        pre (int): Number of samples before the movement onset in every epoch.
+        post (int): Number of samples after the movement onset in every epoch.
+        channel (int): Channel of a signal store to take the epochs from.
+
+    Returns:
+        epochs (np.ndarray): A (valid trials x pre+post+1) matrix of epochs.
+        finger_ids (np.ndarray): The finger of every epoch.
+    """
+    trial_points = load_trial_points(trial_points)
+    if ecog_data.endswith(STORE_SUFFIX):
+        signal = open_store(ecog_data)[0][channel]
+    else:
+        signal = pd.read_csv(ecog_data, header=None).iloc[:, 0].values
+    epochs, valid = extract_epochs(signal, trial_points['starting_point'].to_numpy(), pre, post)
+    return epochs, trial_points['finger_id'].to_numpy()[valid]
+
+def compute_mean_erp(trial_points, ecog_data, pre=200, post=1000, n_fingers=5, channel_block=16):
+    """
+    Calculate the mean Event-Related Potentials (ERP) for finger movements from ecog data.
+    Only computes - nothing is plotted or saved.
+
+    Args:
+        trial_points (str): Path to a CSV file containing information about finger movement events.    
+        ecog_data (str): Path to a CSV file containing ecog data from one channel,
+                         or to a signal store (.ecog, see signal_store.py) with any number of channels.
+        pre (int): Number of samples before the movement onset in every epoch.
+        post (int): Number of samples after the movement onset in every epoch.
+        n_fingers (int): Number of fingers.
+        channel_block (int): Number of store channels to epoch at a time - bounds the memory of the epochs.
+
+    Returns:
+        fingers_erp_mean (np.ndarray): A n_fingers x (pre+post+1) matrix containing the averaged ERP signals per finger.
+                                       With the defaults - 5x1201. For a signal store - channels x n_fingers x (pre+post+1).
+
+    """
+
+    trial_points = load_trial_points(trial_points)
+    starting_points = trial_points['starting_point'].to_numpy()
+    finger_ids = trial_points['finger_id'].to_numpy()
+
+    if ecog_data.endswith(STORE_SUFFIX):
+        # Map the store - the samples are read from disk block by block, as the channels are epoched.
+        signal, _ = open_store(ecog_data)
+        fingers_erp_mean = np.zeros((signal.shape[0], n_fingers, pre + post + 1))
+        for first in range(0, signal.shape[0], channel_block):
+            block = slice(first, first + channel_block)
+            epochs, valid = extract_epochs(signal[block], starting_points, pre, post)
+            fingers_erp_mean[block] = average_epochs(epochs, finger_ids[valid], n_fingers)
+    else:
+        # Load ecog data, assumong one columsm, and making a numpy array.
+        ecog_data = pd.read_csv(ecog_data, header=None).iloc[:, 0].values
+
+        # Extract the epochs of all the trials at once, dropping trials too close to the edges of the recording.
+        epochs, valid = extract_epochs(ecog_data, starting_points, pre, post)
+
+        # Calculate mean erp per finger.
+        fingers_erp_mean = average_epochs(epochs, finger_ids[valid], n_fingers)
+
+    return fingers_erp_mean
+
+def calc_mean_erp(trial_points, ecog_data, pre=200, post=1000, n_fingers=5, channel_block=16, plot=True, output_folder="./plots", dpi=300, fmt='png'):
+    """
+    Calculate the mean Event-Related Potentials (ERP) for finger movements from ecog data, and plot them.
+
+    Args:
+        trial_points (str): Path to a CSV file containing information about finger movement events.
+        ecog_data (str): Path to a CSV file containing ecog data from one channel, or to a signal store (.ecog).
+        pre (int): Number of samples before the movement onset in every epoch.
+        post (int): Number of samples after the movement onset in every epoch.
+        n_fingers (int): Number of fingers.
+        channel_block (int): Number of store channels to epoch at a time.
+        plot (bool): Whether to save the ERP figures. Without plots, matplotlib is never imported.
+        output_folder (str): Folder to save the figures to.
+        dpi (int): Resolution of the saved figures.
+        fmt (str): File format of the figures.
+
+    Returns:
+        fingers_erp_mean (np.ndarray): The averaged ERP signals per finger - see compute_mean_erp.
+    """
+    fingers_erp_mean = compute_mean_erp(trial_points, ecog_data, pre, post, n_fingers, channel_block)
+    if plot:
+        # Imported only here - runs that need just the numbers don't pay for matplotlib.
+        from erp_plots import render_erp_plots
+        render_erp_plots(fingers_erp_mean, output_folder, pre, post, dpi, fmt)
     return fingers_erp_mean
 
 def main():
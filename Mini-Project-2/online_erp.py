@@ -0,0 +1,161 @@
+# Imports.
+import numpy as np
+import pandas as pd
+from signal_store import STORE_SUFFIX, open_store
+
+class OnlineERPAccumulator:
+    """
+    Incremental mean ERP per finger, for ecog samples and event markers that arrive while recording.
+
+    The last samples are kept in a ring buffer of twice the epoch window, and every event waits until
+    the sample at start + post has arrived. Then its epoch is taken from the ring buffer and merged into
+    running per-finger counts, means and sums of squared deviations (Welford / Chan et al.).
+    Memory stays the same however long the recording is.
+    """
+
+    def __init__(self, pre=200, post=1000, n_fingers=5, n_channels=1):
+        """
+        Args:
+            pre (int): Number of samples before the movement onset in every epoch.
+            post (int): Number of samples after the movement onset in every epoch.
+            n_fingers (int): Number of fingers.
+            n_channels (int): Number of ecog channels.
+        """
+        self.pre = pre
+        self.post = post
+        self.n_fingers = n_fingers
+        self.n_channels = n_channels
+        self.window = pre + post + 1
+        # Samples are written in pieces of at most one window, so a window that ends in the
+        # newest piece always starts inside a buffer of two windows.
+        self.capacity = 2 * self.window
+        self.buffer = np.zeros((n_channels, self.capacity))
+        # Total number of samples received so far.
+        self.n_samples = 0
+        # Events waiting for the end of their epoch - (starting point, finger id).
+        self.pending = np.empty((0, 2), dtype=np.int64)
+        # Events dropped because their epoch was not (or no longer) inside the buffer.
+        self.n_dropped = 0
+        self.counts = np.zeros(n_fingers, dtype=np.int64)
+        self.means = np.zeros((n_fingers, n_channels, self.window))
+        self.m2 = np.zeros((n_fingers, n_channels, self.window))
+
+    def update(self, samples, events=None):
+        """
+        Add a chunk of ecog samples and the event markers that arrived with it.
+        The events are added first, so an epoch that ends inside this chunk is taken before it leaves the buffer.
+
+        Args:
+            samples (np.ndarray): The new samples - samples, or (channels x samples).
+            events (np.ndarray): The new events - (starting_point, peak_point, finger_id) rows.
+        """
+        if events is not None:
+            self.add_events(events)
+        self.add_samples(samples)
+
+    def add_events(self, events):
+        """
+        Add event markers. An event must be added before the samples after its epoch's end
+        push its first sample out of the buffer - otherwise it is dropped.
+
+        Args:
+            events (np.ndarray): One row per event - (starting_point, peak_point, finger_id), as in events_file_ordered.csv.
+        """
+        events = np.asarray(events, dtype=np.int64).reshape(-1, 3)
+        if len(events) and (events[:, 2].min() < 1 or events[:, 2].max() > self.n_fingers):
+            raise ValueError(f"Finger ids must be between 1 and {self.n_fingers}.")
+        self.pending = np.concatenate([self.pending, events[:, [0, 2]]])
+        # Events that arrive after their epoch already ended are completed right away.
+        self._complete_epochs()
+
+    def add_samples(self, samples):
+        """
+        Add the next ecog samples.
+
+        Args:
+            samples (np.ndarray): The new samples - samples, or (channels x samples).
+        """
+        samples = np.asarray(samples, dtype=np.float64).reshape(self.n_channels, -1)
+        for first in range(0, samples.shape[1], self.window):
+            piece = samples[:, first:first + self.window]
+            # Writing the piece into the ring buffer, wrapping around its end.
+            positions = (self.n_samples + np.arange(piece.shape[1])) % self.capacity
+            self.buffer[:, positions] = piece
+            self.n_samples += piece.shape[1]
+            self._complete_epochs()
+
+    def _complete_epochs(self):
+        """
+        Merge the epochs of all the events whose last sample has arrived.
+        """
+        epoch_starts = self.pending[:, 0] - self.pre
+        ready = self.pending[:, 0] + self.post < self.n_samples
+        if not ready.any():
+            return
+        # Epochs that start before the recording, or before the oldest sample in the buffer, can't be taken.
+        in_buffer = ready & (epoch_starts >= 0) & (epoch_starts >= self.n_samples - self.capacity)
+        self.n_dropped += int((ready & ~in_buffer).sum())
+
+        # Taking all the ready epochs from the ring buffer at once - (events x channels x window).
+        positions = (epoch_starts[in_buffer, None] + np.arange(self.window)) % self.capacity
+        epochs = self.buffer[:, positions].transpose(1, 0, 2)
+        fingers = self.pending[in_buffer, 1] - 1
+        self.pending = self.pending[~ready]
+
+        # Merging the new epochs of every finger into its running mean and sum of squares.
+        for finger in np.unique(fingers):
+            new = epochs[fingers == finger]
+            n_old, n_new = self.counts[finger], len(new)
+            new_mean = new.mean(axis=0)
+            delta = new_mean - self.means[finger]
+            total = n_old + n_new
+            self.means[finger] += delta * n_new / total
+            self.m2[finger] += ((new - new_mean) ** 2).sum(axis=0) + delta ** 2 * n_old * n_new / total
+            self.counts[finger] = total
+
+    def _shape(self, values):
+        """
+        The per-finger matrix in the layout of compute_mean_erp - fingers x samples for one channel,
+        channels x fingers x samples for several.
+        """
+        return values[:, 0] if self.n_channels == 1 else values.transpose(1, 0, 2)
+
+    def mean_erp(self):
+        """
+        The mean ERP of every finger so far. Fingers without epochs are zeros.
+        """
+        return self._shape(self.means.copy())
+
+    def variance_erp(self):
+        """
+        The sample variance of every finger's epochs so far. NaN for fingers with fewer than two epochs.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = self.m2 / (self.counts - 1)[:, None, None]
+        variance[self.counts < 2] = np.nan
+        return self._shape(variance)
+
+def replay_recording(trial_points, ecog_data, chunk_size=500):
+    """
+    Replay a recorded session as if it were live - the local source for testing OnlineERPAccumulator.
+    The samples come in chunks, and every event comes with the chunk that holds its starting point.
+
+    Args:
+        trial_points (str): Path to a CSV file containing information about finger movement events.
+        ecog_data (str): Path to a CSV file containing ecog data from one channel, or to a signal store (.ecog).
+        chunk_size (int): Number of samples per chunk.
+
+    Yields:
+        tuple: The samples of the chunk (channels x samples) and the events that arrived with it.
+    """
+    events = pd.read_csv(trial_points, header=None).to_numpy(dtype=np.int64)
+    if ecog_data.endswith(STORE_SUFFIX):
+        # The store is mapped, so every chunk is read from disk only when it is replayed.
+        signal, _ = open_store(ecog_data)
+    else:
+        signal = pd.read_csv(ecog_data, header=None).iloc[:, 0].to_numpy()[None, :]
+
+    for first in range(0, signal.shape[1], chunk_size):
+        last = first + chunk_size
+        arrived = (events[:, 0] >= first) & (events[:, 0] < last)
+        yield np.asarray(signal[:, first:last]), events[arrived]
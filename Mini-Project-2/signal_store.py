@@ -0,0 +1,109 @@
+# Imports.
+import json
+import os
+import struct
+import numpy as np
+import pandas as pd
+
+# Signal store files start with this marker, then the header length and a JSON header.
+# The samples follow as one (channels x samples) array, so every channel is contiguous on disk.
+STORE_MAGIC = b'ECOGSTR1'
+STORE_SUFFIX = '.ecog'
+# The samples start at a multiple of this many bytes.
+DATA_ALIGNMENT = 64
+
+def _count_rows(csv_path, chunksize):
+    """
+    Count the rows of a CSV file the way read_csv reads them - blank lines aren't samples.
+    Only the first column is kept, so the file is never in memory at once.
+    """
+    return sum(len(chunk) for chunk in pd.read_csv(csv_path, header=None, usecols=[0], chunksize=chunksize))
+
+def create_store(store_path, n_channels, n_samples, sampling_rate, dtype='float32'):
+    """
+    Create an empty signal store and map it for writing.
+
+    Args:
+        store_path (str): Path of the new store file.
+        n_channels (int): Number of channels (electrodes).
+        n_samples (int): Number of samples per channel.
+        sampling_rate (float): Sampling rate in Hz.
+        dtype (str): Type of the stored samples.
+
+    Returns:
+        signal (np.memmap): The writable (channels x samples) array.
+    """
+    header = json.dumps({'dtype': np.dtype(dtype).str, 'n_channels': n_channels, 'n_samples': n_samples, 'sampling_rate': sampling_rate}).encode()
+    # Padding the header, so the samples start at an aligned offset.
+    offset = len(STORE_MAGIC) + 4 + len(header)
+    header += b' ' * (-offset % DATA_ALIGNMENT)
+    with open(store_path, 'wb') as file:
+        file.write(STORE_MAGIC + struct.pack('<I', len(header)) + header)
+        data_offset = file.tell()
+    return np.memmap(store_path, dtype=dtype, mode='r+', offset=data_offset, shape=(n_channels, n_samples))
+
+def open_store(store_path):
+    """
+    Map a signal store for reading. No samples are read until they are used.
+
+    Args:
+        store_path (str): Path of the store file.
+
+    Returns:
+        signal (np.memmap): The read-only (channels x samples) array.
+        metadata (dict): The sampling rate, dtype and shape of the recording.
+    """
+    with open(store_path, 'rb') as file:
+        if file.read(len(STORE_MAGIC)) != STORE_MAGIC:
+            raise ValueError(f"{store_path} is not a signal store file.")
+        header_length = struct.unpack('<I', file.read(4))[0]
+        metadata = json.loads(file.read(header_length))
+        data_offset = file.tell()
+    signal = np.memmap(store_path, dtype=np.dtype(metadata['dtype']), mode='r', offset=data_offset, shape=(metadata['n_channels'], metadata['n_samples']))
+    return signal, metadata
+
+def convert_csv_to_store(csv_paths, store_path, sampling_rate, dtype='float32', chunksize=1_000_000):
+    """
+    Convert ecog recordings from CSV to a signal store - once, so later runs don't parse text again.
+    The CSV files are read in chunks, so the recording never has to fit in memory.
+
+    Args:
+        csv_paths (str or list): One CSV file with a column per channel, or a list of single-channel CSV files (one per channel).
+        store_path (str): Path of the new store file.
+        sampling_rate (float): Sampling rate in Hz.
+        dtype (str): Type of the stored samples.
+        chunksize (int): Number of CSV rows to read at a time.
+
+    Returns:
+        metadata (dict): The sampling rate, dtype and shape of the stored recording.
+    """
+    if isinstance(csv_paths, str):
+        # One file - its columns are the channels.
+        n_channels = pd.read_csv(csv_paths, header=None, nrows=1).shape[1]
+        sources = [(csv_paths, slice(0, n_channels))]
+        n_samples = _count_rows(csv_paths, chunksize)
+    else:
+        # One file per channel, all of the same length.
+        n_channels = len(csv_paths)
+        sources = [(path, slice(i, i + 1)) for i, path in enumerate(csv_paths)]
+        n_samples = _count_rows(csv_paths[0], chunksize)
+
+    signal = create_store(store_path, n_channels, n_samples, sampling_rate, dtype)
+    try:
+        for path, channels in sources:
+            position = 0
+            for chunk in pd.read_csv(path, header=None, chunksize=chunksize):
+                values = chunk.to_numpy(dtype=dtype)
+                if position + len(values) > n_samples or values.shape[1] != channels.stop - channels.start:
+                    raise ValueError(f"{path} does not match the shape of the recording ({n_channels} channels x {n_samples} samples).")
+                signal[channels, position:position + len(values)] = values.T
+                position += len(values)
+            if position != n_samples:
+                raise ValueError(f"{path} has {position} samples, expected {n_samples}.")
+        signal.flush()
+    except BaseException:
+        # Not leaving a half-written store behind, that would open as a valid recording.
+        del signal
+        os.remove(store_path)
+        raise
+    return open_store(store_path)[1]
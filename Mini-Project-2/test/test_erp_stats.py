@@ -0,0 +1,97 @@
+import unittest
+import numpy as np
+import os
+import sys
+from erp_stats import _t_values, bootstrap_erp_ci, cluster_permutation_test
+
+class test_erp_stats(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. Random epochs of two fingers, and a bump in finger 2's ERP between samples 40 and 60.
+        """
+        rng = np.random.default_rng(0)
+        self.finger_ids = np.repeat([1, 2], 40)
+        self.epochs = rng.normal(0, 1, (80, 100))
+        self.epochs[self.finger_ids == 2, 40:60] += 1.5
+
+    def test_t_values_of_large_offsets(self):
+        """
+        Testing that the t-statistics are those of the textbook formula, and don't change when the signal has a large offset.
+        """
+        a, b = self.epochs[:40], self.epochs[40:]
+        pooled = (((a - a.mean(axis=0)) ** 2).sum(axis=0) + ((b - b.mean(axis=0)) ** 2).sum(axis=0)) / 78
+        expected = (a.mean(axis=0) - b.mean(axis=0)) / np.sqrt(pooled * (1 / 40 + 1 / 40))
+        for offset in (0, 1e8):
+            epochs = self.epochs + offset
+            centred = epochs - epochs.mean(axis=0)
+            t_values = _t_values(centred[:40].sum(axis=0), centred.sum(axis=0), (centred ** 2).sum(axis=0), 40, 40)
+            np.testing.assert_allclose(t_values, expected, rtol=1e-6)
+
+        # With the offset, the observed statistic of the test is the same too.
+        results = cluster_permutation_test(self.epochs + 1e8, self.finger_ids, 1, 2, n_permutations=10)
+        np.testing.assert_allclose(results['t_values'], expected, rtol=1e-6)
+
+    def test_bootstrap_ci(self):
+        """
+        Testing that the bootstrap band contains the sample mean of every finger, is NaN for fingers without epochs, and narrows with more epochs.
+        """
+        results = bootstrap_erp_ci(self.epochs, self.finger_ids, n_resamples=500)
+        for finger in (1, 2):
+            mean = self.epochs[self.finger_ids == finger].mean(axis=0)
+            np.testing.assert_allclose(results['mean'][finger - 1], mean)
+            self.assertTrue(np.all(results['lower'][finger - 1] <= mean))
+            self.assertTrue(np.all(mean <= results['upper'][finger - 1]))
+        self.assertTrue(np.isnan(results['mean'][2:]).all())
+
+        rng = np.random.default_rng(1)
+        widths = []
+        for n_epochs in (20, 320):
+            epochs = rng.normal(0, 1, (n_epochs, 50))
+            results = bootstrap_erp_ci(epochs, np.ones(n_epochs, dtype=int), n_fingers=1, n_resamples=500)
+            widths.append(np.mean(results['upper'] - results['lower']))
+        # 16 times the epochs - about a quarter of the width.
+        self.assertAlmostEqual(widths[1] / widths[0], 0.25, delta=0.05)
+
+    def test_planted_cluster(self):
+        """
+        Testing that the time window of the planted effect is found as a significant negative cluster.
+        """
+        results = cluster_permutation_test(self.epochs, self.finger_ids, 1, 2, n_permutations=200)
+        significant = [cluster for cluster in results['clusters'] if cluster['p_value'] < 0.05]
+        self.assertEqual(len(significant), 1)
+        self.assertLess(significant[0]['mass'], 0)
+        self.assertLessEqual(abs(significant[0]['start'] - 40), 3)
+        self.assertLessEqual(abs(significant[0]['stop'] - 60), 3)
+        self.assertEqual(len(results['null_distribution']), 200)
+        with self.assertRaises(ValueError):
+            cluster_permutation_test(self.epochs, self.finger_ids, 1, 3)
+
+    def test_shuffled_labels_are_null(self):
+        """
+        Testing that after shuffling the finger labels, no cluster is significant.
+        """
+        rng = np.random.default_rng(2)
+        for _ in range(3):
+            results = cluster_permutation_test(self.epochs, rng.permutation(self.finger_ids), 1, 2, n_permutations=200, seed=int(rng.integers(1000)))
+            self.assertTrue(all(cluster['p_value'] > 0.05 for cluster in results['clusters']))
+
+    def test_same_results_for_any_number_of_workers(self):
+        """
+        Testing that the bootstrap bands and the permutation p-values are the same in one process and in two.
+        """
+        single = bootstrap_erp_ci(self.epochs, self.finger_ids, n_resamples=300, n_workers=1)
+        pooled = bootstrap_erp_ci(self.epochs, self.finger_ids, n_resamples=300, n_workers=2)
+        for name in ('mean', 'lower', 'upper'):
+            np.testing.assert_array_equal(single[name], pooled[name])
+
+        single = cluster_permutation_test(self.epochs, self.finger_ids, 1, 2, n_permutations=300, n_workers=1)
+        pooled = cluster_permutation_test(self.epochs, self.finger_ids, 1, 2, n_permutations=300, n_workers=2)
+        np.testing.assert_array_equal(single['null_distribution'], pooled['null_distribution'])
+        self.assertEqual(single['clusters'], pooled['clusters'])
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
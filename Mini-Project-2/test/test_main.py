@@ -0,0 +1,66 @@
+import unittest
+import numpy as np
+import os
+import sys
+from main import extract_epochs, average_epochs
+
+class test_main(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. A random recording, and trials of every finger - two of them too close to its edges.
+        """
+        rng = np.random.default_rng(0)
+        self.signal = rng.normal(0, 50, 5000)
+        self.starting_points = np.array([100, 300, 1200, 1800, 2500, 3100, 3600, 3999, 4500])
+        self.finger_ids = np.array([1, 2, 3, 1, 2, 3, 1, 2, 4])
+
+    def test_epochs_are_the_signal_slices(self):
+        """
+        Testing that every epoch is the slice of the signal around its onset, and that trials outside the recording are masked out.
+        """
+        epochs, valid = extract_epochs(self.signal, self.starting_points)
+        # 100 is too close to the start, 4500 too close to the end.
+        np.testing.assert_array_equal(valid, [False, True, True, True, True, True, True, True, False])
+        self.assertEqual(epochs.shape, (7, 1201))
+        for epoch, start in zip(epochs, self.starting_points[valid]):
+            np.testing.assert_array_equal(epoch, self.signal[start - 200:start + 1001])
+
+        # Several channels - every channel is epoched the same way.
+        channels = np.stack([self.signal, -self.signal])
+        channel_epochs, channel_valid = extract_epochs(channels, self.starting_points, pre=50, post=100)
+        self.assertEqual(channel_epochs.shape, (2, channel_valid.sum(), 151))
+        np.testing.assert_array_equal(channel_epochs[1], -extract_epochs(self.signal, self.starting_points, pre=50, post=100)[0])
+
+    def test_recording_shorter_than_an_epoch(self):
+        """
+        Testing that a recording shorter than one epoch gives no epochs and masks every trial, instead of failing.
+        """
+        epochs, valid = extract_epochs(self.signal[:1000], self.starting_points)
+        self.assertEqual(epochs.shape, (0, 1201))
+        self.assertFalse(valid.any())
+        epochs, valid = extract_epochs(np.stack([self.signal[:1000]] * 3), self.starting_points)
+        self.assertEqual(epochs.shape, (3, 0, 1201))
+        # ...and every finger's ERP is zeros.
+        np.testing.assert_array_equal(average_epochs(epochs, self.finger_ids[valid]), np.zeros((3, 5, 1201)))
+
+    def test_finger_means(self):
+        """
+        Testing that the ERP of every finger is the mean of its epochs, and zeros for a finger without trials.
+        """
+        epochs, valid = extract_epochs(self.signal, self.starting_points)
+        finger_ids = self.finger_ids[valid]
+        means = average_epochs(epochs, finger_ids)
+        self.assertEqual(means.shape, (5, 1201))
+        for finger in range(1, 4):
+            np.testing.assert_allclose(means[finger - 1], np.mean(epochs[finger_ids == finger], axis=0), rtol=1e-12)
+        # Finger 4's only trial is out of the recording, and finger 5 has none.
+        np.testing.assert_array_equal(means[3:], 0)
+        with self.assertRaises(ValueError):
+            average_epochs(epochs, finger_ids + 5)
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
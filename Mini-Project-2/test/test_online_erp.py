@@ -0,0 +1,90 @@
+import unittest
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+from main import extract_epochs, average_epochs
+from online_erp import OnlineERPAccumulator, replay_recording
+
+class test_online_erp(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. A temporary folder with a random recording and its events - two of them too close to its edges.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.signal = rng.normal(0, 50, 20000)
+        starting_points = np.sort(np.concatenate([[50, 19500], rng.choice(np.arange(300, 18900), 60, replace=False)]))
+        finger_ids = rng.integers(1, 6, len(starting_points))
+        self.events = np.column_stack([starting_points, starting_points + 100, finger_ids])
+        self.ecog_path = os.path.join(self.temp_dir, "brain_data_channel_one.csv")
+        self.events_path = os.path.join(self.temp_dir, "events_file_ordered.csv")
+        np.savetxt(self.ecog_path, self.signal, delimiter=",", fmt="%.17g")
+        np.savetxt(self.events_path, self.events, delimiter=",", fmt="%d")
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary folder.
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def expected_epochs(self):
+        epochs, valid = extract_epochs(self.signal, self.events[:, 0])
+        return epochs, self.events[valid, 2]
+
+    def test_replay_matches_offline_erp(self):
+        """
+        Testing that replaying the recording in chunks that don't divide the window - shorter and longer than it - gives the offline ERP.
+        """
+        epochs, finger_ids = self.expected_epochs()
+        expected = average_epochs(epochs, finger_ids)
+        for chunk_size in (333, 1000, 2 * 1201 + 7):
+            accumulator = OnlineERPAccumulator()
+            for samples, events in replay_recording(self.events_path, self.ecog_path, chunk_size=chunk_size):
+                accumulator.update(samples, events)
+            np.testing.assert_allclose(accumulator.mean_erp(), expected, rtol=1e-9, atol=1e-9)
+            np.testing.assert_array_equal(accumulator.counts, np.bincount(finger_ids - 1, minlength=5))
+            # The event too close to the start is dropped, and the one too close to the end never completes.
+            self.assertEqual(accumulator.n_dropped, 1)
+            self.assertEqual(len(accumulator.pending), 1)
+
+    def test_variance_matches_numpy(self):
+        """
+        Testing that the running variance of every finger is the sample variance of its epochs, and NaN below two epochs.
+        """
+        epochs, finger_ids = self.expected_epochs()
+        accumulator = OnlineERPAccumulator()
+        for samples, events in replay_recording(self.events_path, self.ecog_path, chunk_size=777):
+            accumulator.update(samples, events)
+        variance = accumulator.variance_erp()
+        for finger in range(1, 6):
+            np.testing.assert_allclose(variance[finger - 1], np.var(epochs[finger_ids == finger], axis=0, ddof=1), rtol=1e-9)
+
+        # A finger with one epoch has no variance yet.
+        accumulator = OnlineERPAccumulator()
+        accumulator.update(self.signal[:2000], [[500, 600, 2]])
+        self.assertEqual(accumulator.counts[1], 1)
+        self.assertTrue(np.isnan(accumulator.variance_erp()).all())
+
+    def test_several_channels(self):
+        """
+        Testing that every channel of a multi-channel recording is accumulated like the offline ERP, in the layout of compute_mean_erp.
+        """
+        channels = np.stack([self.signal, 2 * self.signal[::-1]])
+        epochs, valid = extract_epochs(channels, self.events[:, 0])
+        accumulator = OnlineERPAccumulator(n_channels=2)
+        accumulator.add_events(self.events)
+        for first in range(0, channels.shape[1], 450):
+            accumulator.add_samples(channels[:, first:first + 450])
+        # Events added before their samples wait for them - every epoch is taken as soon as it ends.
+        np.testing.assert_allclose(accumulator.mean_erp(), average_epochs(epochs, self.events[valid, 2]), rtol=1e-9, atol=1e-9)
+        with self.assertRaises(ValueError):
+            accumulator.add_events([[100, 200, 6]])
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()
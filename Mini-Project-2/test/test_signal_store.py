@@ -0,0 +1,99 @@
+import unittest
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+from signal_store import DATA_ALIGNMENT, STORE_MAGIC, convert_csv_to_store, create_store, open_store
+
+class test_signal_store(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Setting up the test environment. A temporary folder, and a random recording of 3 channels.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.temp_dir, "recording.ecog")
+        rng = np.random.default_rng(0)
+        self.signal = rng.normal(0, 50, (3, 5002)).astype('float32')
+
+    def tearDown(self):
+        """
+        Cleaning up after the tests. Removing the temporary folder.
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write_csv(self, name, values, ending=""):
+        path = os.path.join(self.temp_dir, name)
+        np.savetxt(path, values, delimiter=",", fmt="%.9g")
+        with open(path, "a") as file:
+            file.write(ending)
+        return path
+
+    def test_round_trip_one_file(self):
+        """
+        Testing that a CSV file with a column per channel is stored as (channels x samples), read in chunks that don't divide it.
+        Trailing blank lines aren't samples.
+        """
+        csv_path = self.write_csv("channels.csv", self.signal.T, ending="\n\n")
+        metadata = convert_csv_to_store(csv_path, self.store_path, sampling_rate=1000, chunksize=777)
+        self.assertEqual((metadata['n_channels'], metadata['n_samples'], metadata['sampling_rate']), (3, 5002, 1000))
+        signal, _ = open_store(self.store_path)
+        np.testing.assert_array_equal(signal, self.signal)
+
+    def test_round_trip_file_per_channel(self):
+        """
+        Testing that a list of single-channel CSV files is stored as one channel per file, in order.
+        """
+        csv_paths = [self.write_csv(f"channel_{i}.csv", channel) for i, channel in enumerate(self.signal)]
+        convert_csv_to_store(csv_paths, self.store_path, sampling_rate=512, dtype='float64', chunksize=1000)
+        signal, metadata = open_store(self.store_path)
+        self.assertEqual(signal.dtype, np.float64)
+        self.assertEqual(metadata['sampling_rate'], 512)
+        np.testing.assert_allclose(signal, self.signal, rtol=1e-7)
+
+    def test_header_and_alignment(self):
+        """
+        Testing that the store starts with its marker, that the samples start at an aligned offset, and that other files are refused.
+        """
+        for n_channels in (1, 3, 64):
+            signal = create_store(self.store_path, n_channels, 10, sampling_rate=1000)
+            self.assertEqual(signal.offset % DATA_ALIGNMENT, 0)
+            signal[:] = np.arange(10)
+            signal.flush()
+            del signal
+            signal, metadata = open_store(self.store_path)
+            self.assertEqual(signal.shape, (n_channels, 10))
+            self.assertEqual(metadata['dtype'], np.dtype('float32').str)
+            np.testing.assert_array_equal(signal[-1], np.arange(10))
+            del signal
+        with open(self.store_path, 'rb') as file:
+            self.assertEqual(file.read(len(STORE_MAGIC)), STORE_MAGIC)
+        csv_path = self.write_csv("channels.csv", self.signal.T)
+        with self.assertRaises(ValueError):
+            open_store(csv_path)
+
+    def test_mismatch_errors(self):
+        """
+        Testing that channel files of different lengths, or rows with a different number of channels, raise an error and leave no store behind.
+        """
+        csv_paths = [self.write_csv("channel_0.csv", self.signal[0]), self.write_csv("channel_1.csv", self.signal[1, :-10])]
+        with self.assertRaisesRegex(ValueError, "has 4992 samples, expected 5002"):
+            convert_csv_to_store(csv_paths, self.store_path, sampling_rate=1000)
+        self.assertFalse(os.path.exists(self.store_path))
+
+        csv_paths = [self.write_csv("channel_0.csv", self.signal[0, :-10]), self.write_csv("channel_1.csv", self.signal[1])]
+        with self.assertRaisesRegex(ValueError, "does not match the shape"):
+            convert_csv_to_store(csv_paths, self.store_path, sampling_rate=1000, chunksize=1000)
+        self.assertFalse(os.path.exists(self.store_path))
+
+        csv_paths = [self.write_csv("channel_0.csv", self.signal[0]), self.write_csv("channel_1.csv", self.signal[:2].T)]
+        with self.assertRaisesRegex(ValueError, "does not match the shape"):
+            convert_csv_to_store(csv_paths, self.store_path, sampling_rate=1000)
+        self.assertFalse(os.path.exists(self.store_path))
+
+if __name__ == "__main__":
+    # Add the project root directory to sys.path
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+    sys.path.append(project_root)
+    unittest.main()